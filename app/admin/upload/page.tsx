@@ -3,6 +3,7 @@
 import { useState, useCallback, useRef } from 'react'
 import { useRouter } from 'next/navigation'
 import { createClient } from '@/lib/supabase/client'
+import { processAudioUpload } from '@/lib/audio/processing'
 import type { LicenseType, VocalistType } from '@/lib/types/database'
 
 /* --- Constants --- */
@@ -312,23 +313,17 @@ export default function AdminUploadPage() {
           )
           processFormData.append('track_id', trackId)
 
-          const processRes = await fetch(`${fastapiUrl}/process/upload`, {
-            method: 'POST',
-            body: processFormData,
-          })
-
-          if (processRes.ok) {
-            const processData = await processRes.json()
-            waveformData = processData.waveform_data ?? null
-            previewClipUrl = processData.preview_clip_url ?? null
-            fullPreviewUrl = processData.full_preview_url ?? null
-          } else {
-            console.warn('Audio processing failed, continuing without previews.')
-          }
-        } catch {
-          console.warn(
-            'Could not reach audio processing service, continuing without previews.'
+          const processData = await processAudioUpload(
+            fastapiUrl,
+            processFormData,
+            setUploadProgress
           )
+          waveformData = processData.waveform_data ?? null
+          previewClipUrl = processData.preview_clip_url ?? null
+          fullPreviewUrl = processData.full_preview_url ?? null
+        } catch (err) {
+          // Non-fatal: track can still be created without processed audio
+          console.warn('Audio processing failed, continuing without previews.', err)
         }
       }
 
@@ -2,6 +2,7 @@ import { NextRequest, NextResponse } from 'next/server'
 import { createClient } from '@/lib/supabase/server'
 import { createAdminClient } from '@/lib/supabase/admin'
 import { sendTrackApprovedEmail } from '@/lib/email'
+import { invalidateChatCatalogue } from '@/lib/chat/catalogue'
 
 export async function PATCH(
   request: NextRequest,
@@ -50,6 +51,9 @@ export async function PATCH(
       )
     }
 
+    // Refresh the chat search catalogue (fire-and-forget)
+    invalidateChatCatalogue([id])
+
     // Fetch creator info and send approval email (fire-and-forget)
     const { data: track } = await adminClient
       .from('tracks')
@@ -1,6 +1,7 @@
 import { NextRequest, NextResponse } from 'next/server'
 import { createClient } from '@/lib/supabase/server'
 import { createAdminClient } from '@/lib/supabase/admin'
+import { invalidateChatCatalogue } from '@/lib/chat/catalogue'
 
 export async function PATCH(
   request: NextRequest,
@@ -46,6 +47,9 @@ export async function PATCH(
       )
     }
 
+    // Refresh the chat search catalogue (fire-and-forget)
+    invalidateChatCatalogue([id])
+
     return NextResponse.json({ success: true })
   } catch (err) {
     console.error('Remove track error:', err)
@@ -1,6 +1,7 @@
 import { NextRequest, NextResponse } from 'next/server'
 import { createClient } from '@/lib/supabase/server'
 import { createAdminClient } from '@/lib/supabase/admin'
+import { invalidateChatCatalogue } from '@/lib/chat/catalogue'
 
 // GET: Fetch a single track for editing (admin only)
 export async function GET(
@@ -154,6 +155,9 @@ export async function PATCH(
       )
     }
 
+    // Refresh the chat search catalogue (fire-and-forget)
+    invalidateChatCatalogue([id])
+
     return NextResponse.json({ success: true })
   } catch (err) {
     console.error('Update track error:', err)
@@ -0,0 +1,491 @@
+"""Batch reprocessing of audio files from the command line.
+
+Runs the upload pipeline (watermarked previews, clip preview, waveform and
+peak pyramid) over a whole directory or manifest of audio files across a
+process pool, for catalogue-wide refreshes after the voice tag, preview
+interval or waveform settings change::
+
+    python -m app.batch /data/listening-files --output /data/previews
+    python -m app.batch tracks.jsonl --output /data/previews --workers 8
+
+The source is either a directory (searched recursively for supported audio
+files) or a manifest: a ``.jsonl`` file of ``{"path": ..., "id": ...,
+"preview_clip_start": ...}`` objects (only ``path`` is required) or a text
+file with one path per line.
+
+Each item's outputs are written to ``<output>/<id>/``: one file (or HLS
+directory) per rendition and ``waveform.json`` with ``waveform_data`` and
+``waveform_peaks``. Every finished item is appended to
+``<output>/results.jsonl``, which doubles as the checkpoint: a rerun skips
+items that already succeeded with the same input file and settings and
+retries the rest. ``<output>/manifest.json`` summarises the latest result
+of every item when the run ends.
+
+A failure only affects its own item; it is recorded with its error and
+the run carries on. That includes a worker crash (e.g. out of memory),
+which breaks the pool for every item in flight: those items are retried
+one at a time in a new pool, and only the one that crashes on its own is
+recorded as failed. Progress, throughput and an ETA are reported on
+stderr.
+"""
+
+import argparse
+import collections
+import hashlib
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Iterator, NamedTuple
+
+from app.services.audio import SUPPORTED_FORMATS, probe_audio
+from app.services.cache import CACHE_FORMAT_VERSION
+from app.services.executor import AUDIO_POOL_WORKERS
+from app.services.peaks import PEAK_LEVELS
+from app.services.pipeline import process_upload_audio
+from app.services.watermark import (
+    CLIP_PREVIEW_RENDITIONS,
+    FULL_PREVIEW_INTERVAL,
+    FULL_PREVIEW_RENDITIONS,
+    VOICE_TAG_PATH,
+    voice_tag_fingerprint,
+)
+
+RESULTS_FILE = "results.jsonl"
+MANIFEST_FILE = "manifest.json"
+
+# Seconds between progress lines on stderr.
+REPORT_INTERVAL = 5.0
+
+
+class BatchItem(NamedTuple):
+    """One input file of a batch run."""
+
+    id: str
+    path: str
+    preview_clip_start: int = 0
+
+
+# ---------------------------------------------------------------------------
+# Inputs
+# ---------------------------------------------------------------------------
+
+def _item_id(relative_path: str) -> str:
+    return os.path.splitext(relative_path)[0].replace(os.sep, "/")
+
+
+def scan_directory(root: str) -> list[BatchItem]:
+    """Return every supported audio file below *root*, in path order."""
+    items: list[BatchItem] = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            if os.path.splitext(filename)[1].lower().lstrip(".") in SUPPORTED_FORMATS:
+                path = os.path.join(dirpath, filename)
+                items.append(BatchItem(_item_id(os.path.relpath(path, root)), path))
+    return items
+
+
+def read_manifest(manifest_path: str) -> list[BatchItem]:
+    """Read a ``.jsonl`` or plain-text manifest.
+
+    Relative paths are resolved against the manifest's directory.
+
+    Raises:
+        ValueError: If a line is malformed or two items share an id.
+    """
+    base = os.path.dirname(os.path.abspath(manifest_path))
+    items: list[BatchItem] = []
+    with open(manifest_path) as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if manifest_path.endswith(".jsonl"):
+                try:
+                    entry = json.loads(line)
+                    path = os.path.join(base, entry["path"])
+                    item_id = str(entry.get("id") or _item_id(entry["path"]))
+                    clip_start = int(entry.get("preview_clip_start", 0))
+                except (ValueError, KeyError, TypeError) as exc:
+                    raise ValueError(f"{manifest_path}:{line_no}: invalid entry ({exc})") from None
+            else:
+                path = os.path.join(base, line)
+                item_id, clip_start = _item_id(line), 0
+            items.append(BatchItem(item_id, path, clip_start))
+
+    seen: set[str] = set()
+    for item in items:
+        parts = item.id.split("/")
+        if os.path.isabs(item.id) or not all(part not in ("", ".", "..") for part in parts):
+            raise ValueError(f"Invalid item id '{item.id}' in {manifest_path}")
+        if item.id in seen:
+            raise ValueError(f"Duplicate item id '{item.id}' in {manifest_path}")
+        seen.add(item.id)
+    return items
+
+
+# ---------------------------------------------------------------------------
+# Checkpoints
+# ---------------------------------------------------------------------------
+
+def settings_fingerprint(tag_path: str, clip_duration: int, num_points: int) -> dict[str, Any]:
+    """Return every setting that affects batch outputs."""
+    return {
+        "version": CACHE_FORMAT_VERSION,
+        "tag": voice_tag_fingerprint(tag_path),
+        "interval": FULL_PREVIEW_INTERVAL,
+        "renditions": FULL_PREVIEW_RENDITIONS + CLIP_PREVIEW_RENDITIONS,
+        "clip_duration": clip_duration,
+        "num_points": num_points,
+        "peak_levels": PEAK_LEVELS,
+    }
+
+
+def item_fingerprint(item: BatchItem, settings: dict[str, Any]) -> str:
+    """Identify *item*'s input file and settings, to decide if it is done."""
+    stat = os.stat(item.path)
+    payload = json.dumps(
+        {
+            "path": os.path.abspath(item.path),
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "preview_clip_start": item.preview_clip_start,
+            "settings": settings,
+        },
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def load_results(output_dir: str) -> dict[str, dict[str, Any]]:
+    """Return the latest recorded result per item id.
+
+    A truncated last line (from a crash mid-write) is ignored.
+    """
+    results: dict[str, dict[str, Any]] = {}
+    try:
+        with open(os.path.join(output_dir, RESULTS_FILE)) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                results[record["id"]] = record
+    except FileNotFoundError:
+        pass
+    return results
+
+
+def _write_json(path: str, data: Any) -> None:
+    """Write *data* to *path* atomically."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+
+
+# ---------------------------------------------------------------------------
+# Worker (runs in the pool)
+# ---------------------------------------------------------------------------
+
+def process_item(
+    item: BatchItem,
+    output_dir: str,
+    tag_path: str,
+    clip_duration: int,
+    num_points: int,
+) -> dict[str, Any]:
+    """Run the upload pipeline for *item* and store its outputs.
+
+    Outputs replace any previous ones in ``<output_dir>/<item.id>/``.
+
+    Returns:
+        ``{"outputs": {name: path}, "duration": seconds}``.
+    """
+    duration = probe_audio(item.path).duration
+    result = process_upload_audio(
+        item.path,
+        tag_path,
+        preview_clip_start=item.preview_clip_start,
+        clip_duration=clip_duration,
+        num_points=num_points,
+    )
+
+    item_dir = os.path.join(output_dir, item.id)
+    os.makedirs(item_dir, exist_ok=True)
+    outputs: dict[str, str] = {}
+    for key, src in result.items():
+        if not key.endswith("_path"):
+            continue
+        name = key.removesuffix("_path")
+        dst = os.path.join(item_dir, name + os.path.splitext(src)[1])
+        if os.path.isdir(dst):
+            shutil.rmtree(dst)
+        shutil.move(src, dst)
+        outputs[name] = dst
+
+    waveform_path = os.path.join(item_dir, "waveform.json")
+    _write_json(
+        waveform_path,
+        {"waveform_data": result["waveform_data"], "waveform_peaks": result["waveform_peaks"]},
+    )
+    outputs["waveform"] = waveform_path
+    return {"outputs": outputs, "duration": duration}
+
+
+# ---------------------------------------------------------------------------
+# Runner
+# ---------------------------------------------------------------------------
+
+def _format_seconds(seconds: float) -> str:
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    return f"{hours}h{minutes:02d}m{seconds:02d}s" if hours else f"{minutes}m{seconds:02d}s"
+
+
+class _Progress:
+    """Throughput and ETA reporting on stderr."""
+
+    def __init__(self, total: int) -> None:
+        self.total = total
+        self.done = 0
+        self.failed = 0
+        self.audio_seconds = 0.0
+        self.started = time.monotonic()
+        self._last_report = 0.0
+
+    def record(self, ok: bool, duration: float) -> None:
+        self.done += 1
+        self.failed += not ok
+        self.audio_seconds += duration
+        if time.monotonic() - self._last_report >= REPORT_INTERVAL or self.done == self.total:
+            self.report()
+
+    def report(self) -> None:
+        self._last_report = time.monotonic()
+        elapsed = max(self._last_report - self.started, 1e-9)
+        rate = self.done / elapsed
+        eta = (self.total - self.done) / rate if rate else 0.0
+        print(
+            f"[{self.done}/{self.total}] {rate:.2f} files/s, "
+            f"{self.audio_seconds / elapsed:.1f}x realtime, "
+            f"{self.failed} failed, elapsed {_format_seconds(elapsed)}, "
+            f"ETA {_format_seconds(eta)}",
+            file=sys.stderr,
+            flush=True,
+        )
+
+
+def run_batch(
+    items: list[BatchItem],
+    output_dir: str,
+    tag_path: str = VOICE_TAG_PATH,
+    workers: int = AUDIO_POOL_WORKERS,
+    clip_duration: int = 30,
+    num_points: int = 200,
+    force: bool = False,
+) -> dict[str, dict[str, Any]]:
+    """Process *items* into *output_dir*, resuming from earlier runs.
+
+    Args:
+        items: Files to process.
+        output_dir: Directory for outputs, checkpoints and the manifest.
+        tag_path: Voice tag to watermark with.
+        workers: Number of worker processes.
+        clip_duration: Clip preview length in seconds.
+        num_points: Points in the waveform envelope.
+        force: Reprocess items even if they already succeeded.
+
+    Returns:
+        The latest result per item id, as written to ``manifest.json``.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    settings = settings_fingerprint(tag_path, clip_duration, num_points)
+    results = load_results(output_dir)
+
+    todo: list[tuple[BatchItem, str]] = []
+    for item in items:
+        try:
+            fingerprint = item_fingerprint(item, settings)
+        except OSError as exc:
+            results[item.id] = {
+                "id": item.id, "path": item.path, "status": "failed", "error": str(exc),
+            }
+            continue
+        previous = results.get(item.id)
+        if (
+            not force
+            and previous is not None
+            and previous["status"] == "succeeded"
+            and previous.get("fingerprint") == fingerprint
+        ):
+            continue
+        todo.append((item, fingerprint))
+
+    print(
+        f"{len(items)} items, {len(items) - len(todo)} already done, "
+        f"{len(todo)} to process with {workers} workers",
+        file=sys.stderr,
+        flush=True,
+    )
+    progress = _Progress(len(todo))
+    pending = iter(todo)
+    context = multiprocessing.get_context("spawn")
+
+    with open(os.path.join(output_dir, RESULTS_FILE), "a") as checkpoint:
+
+        def record(item: BatchItem, fingerprint: str, started: float, **fields: Any) -> None:
+            entry = {
+                "id": item.id,
+                "path": item.path,
+                "fingerprint": fingerprint,
+                "elapsed": round(time.monotonic() - started, 3),
+                "finished_at": time.time(),
+                **fields,
+            }
+            checkpoint.write(json.dumps(entry) + "\n")
+            checkpoint.flush()
+            results[item.id] = entry
+            progress.record(fields["status"] == "succeeded", fields.get("duration", 0.0))
+
+        def collect(future: Future, item: BatchItem, fingerprint: str, started: float) -> None:
+            try:
+                outcome = future.result()
+            except BrokenProcessPool:
+                raise
+            except Exception as exc:
+                record(item, fingerprint, started, status="failed", error=str(exc))
+            else:
+                record(item, fingerprint, started, status="succeeded", **outcome)
+
+        # A crashed worker breaks the whole pool and every job in flight
+        # with it. Those items become suspects and are retried one at a
+        # time in the next pool, so only an item that breaks a pool on its
+        # own is recorded as failed; the rest continue as normal.
+        suspects: collections.deque[tuple[BatchItem, str]] = collections.deque()
+        while True:
+            in_flight: dict[Future, tuple[BatchItem, str, float]] = {}
+            isolated = False
+            with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+                try:
+                    while suspects:
+                        item, fingerprint = suspects[0]
+                        isolated = True
+                        future = pool.submit(
+                            process_item, item, output_dir, tag_path, clip_duration, num_points
+                        )
+                        in_flight[future] = (item, fingerprint, time.monotonic())
+                        wait([future])
+                        collect(future, *in_flight[future])
+                        del in_flight[future]
+                        suspects.popleft()
+                    isolated = False
+                    for _ in range(2 * workers):
+                        _submit_next(pool, pending, in_flight, output_dir, tag_path, clip_duration, num_points)
+                    while in_flight:
+                        finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                        for future in finished:
+                            # Popped only once collected: a broken pool
+                            # leaves every unrecorded item in in_flight
+                            collect(future, *in_flight[future])
+                            del in_flight[future]
+                            _submit_next(pool, pending, in_flight, output_dir, tag_path, clip_duration, num_points)
+                    break
+                except BrokenProcessPool:
+                    for future, (item, fingerprint, started) in in_flight.items():
+                        if isolated:
+                            suspects.popleft()
+                            record(
+                                item, fingerprint, started,
+                                status="failed", error="Worker process died while processing",
+                            )
+                        elif future.done() and not isinstance(future.exception(), BrokenProcessPool):
+                            # Finished before the pool broke
+                            collect(future, item, fingerprint, started)
+                        else:
+                            suspects.append((item, fingerprint))
+
+    _write_json(os.path.join(output_dir, MANIFEST_FILE), {
+        "items": [results[item.id] for item in items if item.id in results],
+        "settings": settings,
+    })
+    return results
+
+
+def _submit_next(
+    pool: ProcessPoolExecutor,
+    pending: Iterator[tuple[BatchItem, str]],
+    in_flight: dict[Future, tuple[BatchItem, str, float]],
+    output_dir: str,
+    tag_path: str,
+    clip_duration: int,
+    num_points: int,
+) -> None:
+    """Submit the next pending item, if any; keeps the queue bounded."""
+    entry = next(pending, None)
+    if entry is None:
+        return
+    item, fingerprint = entry
+    future = pool.submit(process_item, item, output_dir, tag_path, clip_duration, num_points)
+    in_flight[future] = (item, fingerprint, time.monotonic())
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m app.batch",
+        description="Reprocess a directory or manifest of audio files.",
+    )
+    parser.add_argument("source", help="Directory of audio files, or a .jsonl/.txt manifest")
+    parser.add_argument("--output", "-o", required=True, help="Output directory")
+    parser.add_argument("--workers", "-j", type=int, default=AUDIO_POOL_WORKERS,
+                        help="Worker processes (default: AUDIO_POOL_WORKERS)")
+    parser.add_argument("--voice-tag", default=VOICE_TAG_PATH, help="Voice tag audio file")
+    parser.add_argument("--clip-duration", type=int, default=30, help="Clip preview seconds")
+    parser.add_argument("--num-points", type=int, default=200, help="Waveform envelope points")
+    parser.add_argument("--force", action="store_true",
+                        help="Reprocess items that already succeeded")
+    args = parser.parse_args(argv)
+
+    if os.path.isdir(args.source):
+        items = scan_directory(args.source)
+    elif os.path.isfile(args.source):
+        try:
+            items = read_manifest(args.source)
+        except ValueError as exc:
+            parser.error(str(exc))
+    else:
+        parser.error(f"Source not found: {args.source}")
+    if not os.path.isfile(args.voice_tag):
+        parser.error(f"Voice tag file not found: {args.voice_tag}")
+
+    results = run_batch(
+        items,
+        args.output,
+        tag_path=args.voice_tag,
+        workers=max(1, args.workers),
+        clip_duration=args.clip_duration,
+        num_points=args.num_points,
+        force=args.force,
+    )
+    failed = [item.id for item in items if results.get(item.id, {}).get("status") != "succeeded"]
+    print(
+        f"{len(items) - len(failed)} succeeded, {len(failed)} failed; "
+        f"manifest: {os.path.join(args.output, MANIFEST_FILE)}",
+        file=sys.stderr,
+    )
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
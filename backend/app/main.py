@@ -1,12 +1,47 @@
 import os
+from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
+
+from app.services.catalogue import track_catalogue
+from app.services.database import database
+from app.services.executor import audio_pool
+from app.services.jobs import job_worker
+from app.services.metrics import MetricsMiddleware, register_gauge, render_metrics
+from app.services.store import artifact_store
+from app.services.warmup import warm_up
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start shared resources on startup and release them on shutdown."""
+    # CPU-bound audio work runs in worker processes so it never blocks
+    # the event loop (and with it /health and /chat/query).
+    audio_pool.start()
+    await artifact_store.start()
+    await job_worker.start()
+    # Pool workers, the database client and the in-memory catalogue are
+    # warmed in the background, so the server answers /health at once and
+    # reports /ready when warm.
+    warm_up.start()
+    try:
+        yield
+    finally:
+        await warm_up.stop()
+        await track_catalogue.stop()
+        await database.stop()
+        await job_worker.stop()
+        await artifact_store.stop()
+        audio_pool.shutdown()
+
 
 app = FastAPI(
     title="FEATUNE API",
     description="Audio processing and AI chat service for FEATUNE",
     version="0.1.0",
+    lifespan=lifespan,
 )
 
 # CORS configuration
@@ -32,6 +67,12 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Outermost, so latency and in-flight counts cover the whole request
+app.add_middleware(
+    MetricsMiddleware,
+    prefixes=("process", "chat", "health", "ready", "metrics"),
+)
+
 
 # ---------------------------------------------------------------------------
 # Routers
@@ -49,3 +90,29 @@ app.include_router(chat.router, prefix="/chat", tags=["chat"])
 async def health_check():
     """Return service health status."""
     return {"status": "ok"}
+
+
+@app.get("/ready", tags=["health"])
+async def readiness_check():
+    """Return 200 once warm-up has finished, 503 until then.
+
+    Unlike ``/health``, which only says the process is up, this tells a
+    load balancer when to start sending traffic.
+    """
+    status = warm_up.status()
+    return JSONResponse(status, status_code=200 if warm_up.ready else 503)
+
+
+# ---------------------------------------------------------------------------
+# Metrics
+# ---------------------------------------------------------------------------
+register_gauge(
+    "featune_artifact_store_bytes", "Bytes used by the artifact store.",
+    artifact_store.usage,
+)
+
+
+@app.get("/metrics", tags=["health"], response_class=PlainTextResponse)
+async def metrics():
+    """Return stage timings, request latencies and resource gauges for Prometheus."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
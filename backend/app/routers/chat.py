@@ -4,44 +4,64 @@ Exposes an endpoint for query-based track discovery. Users describe what
 they are looking for in natural language and the system returns the most
 relevant approved tracks.
 
-TODO: Replace the keyword-matching implementation with actual LLM
-integration (e.g. OpenAI embeddings or Claude) once an API key is
-available.  The current approach splits the query into individual words
-and scores each track based on case-insensitive substring matches
-against title, genre, and mood fields.
+Two retrieval modes are available, chosen per request with ``mode`` or by
+default with ``CHAT_SEARCH_MODE``:
+
+* ``keyword`` (default) splits the query into individual words and scores
+  each track based on case-insensitive substring matches against title,
+  genre, and mood fields (see :mod:`app.services.search`).
+* ``semantic`` ranks tracks by cosine similarity between hashed TF-IDF
+  vectors of the query and of the track metadata, which also finds
+  near-matches and synonyms (see :mod:`app.services.semantic`).
+
+TODO: Replace both with actual LLM integration (e.g. OpenAI embeddings or
+Claude) once an API key is available.
 """
 
+import asyncio
 import os
-import re
-from typing import Any
+from typing import Annotated, Literal
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException
 from pydantic import BaseModel
-from supabase import create_client, Client
 
-router = APIRouter()
+from app.services.catalogue import CatalogueUnavailableError, track_catalogue
+from app.services.database import database
+from app.services.metrics import register_gauge, stage
+from app.services.search import keyword_index, query_cache, query_key, tokenize
+from app.services.semantic import semantic_index
 
-# ---------------------------------------------------------------------------
-# Supabase client (uses service-role key for server-side access)
-# ---------------------------------------------------------------------------
+router = APIRouter()
 
-_supabase_url: str | None = os.environ.get("NEXT_PUBLIC_SUPABASE_URL")
-_supabase_key: str | None = os.environ.get("SUPABASE_SERVICE_ROLE_KEY")
+SearchMode = Literal["keyword", "semantic"]
 
+CHAT_SEARCH_MODE: SearchMode = (
+    "semantic" if os.environ.get("CHAT_SEARCH_MODE") == "semantic" else "keyword"
+)
 
-def _get_supabase() -> Client:
-    """Lazily build and return a Supabase client.
 
-    Raises HTTPException(503) when the required environment variables are
-    not configured.
-    """
-    if not _supabase_url or not _supabase_key:
-        raise HTTPException(
-            status_code=503,
-            detail="Supabase is not configured. Set NEXT_PUBLIC_SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY.",
-        )
-    return create_client(_supabase_url, _supabase_key)
+# Rebuild the search indexes in the background whenever the catalogue
+# changes. The semantic index is built on first use unless it is the default.
+track_catalogue.subscribe(keyword_index)
+if CHAT_SEARCH_MODE == "semantic":
+    track_catalogue.subscribe(semantic_index)
 
+register_gauge(
+    "featune_catalogue_version", "Version of the in-memory track catalogue.",
+    lambda: track_catalogue.version,
+)
+register_gauge(
+    "featune_catalogue_tracks", "Approved tracks in the in-memory catalogue.",
+    lambda: len(track_catalogue.snapshot().tracks),
+)
+register_gauge(
+    "featune_chat_query_cache_hits_total", "Chat queries answered from the query cache.",
+    lambda: query_cache.hits, kind="counter",
+)
+register_gauge(
+    "featune_chat_query_cache_misses_total", "Chat queries that had to be scored.",
+    lambda: query_cache.misses, kind="counter",
+)
 
 # ---------------------------------------------------------------------------
 # Request / Response schemas
@@ -49,6 +69,7 @@ def _get_supabase() -> Client:
 
 class ChatQueryRequest(BaseModel):
     query: str
+    mode: SearchMode | None = None
 
 
 class TrackResult(BaseModel):
@@ -60,60 +81,21 @@ class ChatQueryResponse(BaseModel):
     results: list[TrackResult]
 
 
-# ---------------------------------------------------------------------------
-# Keyword matching helpers
-# ---------------------------------------------------------------------------
+class CatalogueInvalidateRequest(BaseModel):
+    track_ids: list[str] | None = None
 
-# Common English stop-words to ignore when scoring
-_STOP_WORDS = frozenset(
-    {
-        "a", "an", "the", "for", "and", "or", "but", "is", "in", "on",
-        "of", "to", "it", "with", "my", "me", "i", "this", "that",
-        "some", "any", "very", "really", "just", "so", "like", "want",
-        "need", "looking", "something", "find", "give", "get",
-    }
-)
 
+class CatalogueStatusResponse(BaseModel):
+    version: int
+    tracks: int
 
-def _tokenize(text: str) -> list[str]:
-    """Split text into lowercase alphanumeric tokens."""
-    return [w for w in re.findall(r"[a-z0-9]+", text.lower()) if w not in _STOP_WORDS]
 
-
-def _score_track(query_tokens: list[str], track: dict[str, Any]) -> float:
-    """Return a relevance score (0.0 – 1.0) for *track* given *query_tokens*.
-
-    Each query token can match against the track's title, genre, or mood.
-    A match in the title counts slightly more than genre/mood.
-    """
-    if not query_tokens:
-        return 0.0
-
-    title = (track.get("title") or "").lower()
-    genre = (track.get("genre") or "").lower()
-    mood = (track.get("mood") or "").lower()
-    vocalist_type = (track.get("vocalist_type") or "").lower()
-
-    matched_weight = 0.0
-    total_weight = len(query_tokens)
-
-    for token in query_tokens:
-        if token in title:
-            matched_weight += 1.2  # title gets a slight boost
-        elif token in genre:
-            matched_weight += 1.0
-        elif token in mood:
-            matched_weight += 1.0
-        elif token in vocalist_type:
-            matched_weight += 0.8
-        elif token == "ai" and track.get("is_ai_generated"):
-            matched_weight += 1.0
-        elif token == "human" and not track.get("is_ai_generated"):
-            matched_weight += 0.8
-
-    # Normalise to 0–1 (can exceed 1.0 due to title boost, so clamp)
-    score = matched_weight / total_weight if total_weight else 0.0
-    return min(score, 1.0)
+class QueryCacheStatsResponse(BaseModel):
+    entries: int
+    max_entries: int
+    version: int
+    hits: int
+    misses: int
 
 
 # ---------------------------------------------------------------------------
@@ -124,45 +106,110 @@ def _score_track(query_tokens: list[str], track: dict[str, Any]) -> float:
 async def chat_query(body: ChatQueryRequest) -> ChatQueryResponse:
     """Search for tracks matching a natural-language query.
 
-    The endpoint fetches all approved tracks from Supabase, scores each
-    one against the query using simple keyword matching, and returns the
-    top 5 results sorted by relevance.
+    The endpoint scores the approved tracks in the in-memory catalogue
+    (see :mod:`app.services.catalogue`) against the query, using keyword
+    matching or semantic similarity depending on ``mode``, and returns the
+    top 5 results sorted by relevance. Keyword scoring goes through an
+    inverted index, so it only touches tracks that match a query token,
+    and repeated queries are answered from the query cache.
     """
     query_text = body.query.strip()
     if not query_text:
         raise HTTPException(status_code=422, detail="query must not be empty")
 
-    supabase = _get_supabase()
+    try:
+        snapshot = track_catalogue.snapshot()
+    except CatalogueUnavailableError as exc:
+        raise HTTPException(status_code=503, detail=str(exc))
+
+    mode = body.mode or CHAT_SEARCH_MODE
+    query_tokens = tokenize(query_text)
+    key = query_key(mode, query_tokens)
+    results = query_cache.get(snapshot.version, key)
+    if results is None:
+        # Score and rank
+        if mode == "semantic":
+            # Off the event loop: the first query may have to build the index
+            index = await asyncio.to_thread(semantic_index, snapshot)
+            with stage("chat_search_semantic"):
+                top_results = index.search(" ".join(query_tokens), limit=5)
+        else:
+            with stage("chat_search_keyword"):
+                top_results = keyword_index(snapshot).search(query_tokens, limit=5)
+        results = tuple((str(t["id"]), round(s, 2)) for t, s in top_results)
+        query_cache.put(snapshot.version, key, results)
 
-    # Fetch approved tracks with the fields we need for matching + display
-    response = (
-        supabase.table("tracks")
-        .select("id, title, genre, mood, bpm, key, vocalist_type, is_ai_generated")
-        .eq("status", "approved")
-        .execute()
+    return ChatQueryResponse(
+        results=[TrackResult(track_id=track_id, score=score) for track_id, score in results]
     )
 
-    tracks: list[dict[str, Any]] = response.data or []
 
-    if not tracks:
-        return ChatQueryResponse(results=[])
+# ---------------------------------------------------------------------------
+# Catalogue cache
+# ---------------------------------------------------------------------------
+
+def require_service_key(
+    authorization: Annotated[str | None, Header()] = None,
+) -> None:
+    """Only let through callers presenting the Supabase service-role key.
 
-    # Score and rank
-    query_tokens = _tokenize(query_text)
+    The key goes in ``Authorization: Bearer <key>``; the Next.js admin
+    routes hold it already.
 
-    scored: list[tuple[dict[str, Any], float]] = []
-    for track in tracks:
-        score = _score_track(query_tokens, track)
-        if score > 0:
-            scored.append((track, score))
+    Raises:
+        HTTPException(401): If the header is missing or the key is wrong.
+    """
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not database.is_service_key(token.strip()):
+        raise HTTPException(
+            status_code=401,
+            detail="A service credential is required",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
 
-    # Sort descending by score, take top 5
-    scored.sort(key=lambda item: item[1], reverse=True)
-    top_results = scored[:5]
 
-    return ChatQueryResponse(
-        results=[
-            TrackResult(track_id=str(t["id"]), score=round(s, 2))
-            for t, s in top_results
-        ]
-    )
+@router.post(
+    "/catalogue/invalidate",
+    response_model=CatalogueStatusResponse,
+    dependencies=[Depends(require_service_key)],
+)
+async def invalidate_catalogue(
+    body: CatalogueInvalidateRequest | None = None,
+) -> CatalogueStatusResponse:
+    """Refetch tracks whose status or metadata just changed.
+
+    Called by the admin routes, with the service-role key, after a track is
+    approved, rejected, removed or edited so chat results reflect it before
+    the next background refresh. Without ``track_ids`` the whole catalogue
+    is reloaded; such reloads are shared and throttled (see
+    :meth:`TrackCatalogue.invalidate`).
+
+    Only the API worker process that receives the request is refreshed.
+    With several workers the others converge on their next background
+    refresh (``CATALOGUE_REFRESH_SECONDS``; deletions on the next full
+    reload).
+    """
+    track_ids = body.track_ids if body else None
+    try:
+        snapshot = await track_catalogue.invalidate(track_ids)
+    except CatalogueUnavailableError as exc:
+        raise HTTPException(status_code=503, detail=str(exc))
+    except Exception:
+        raise HTTPException(status_code=502, detail="Failed to refresh the track catalogue")
+    return CatalogueStatusResponse(version=snapshot.version, tracks=len(snapshot.tracks))
+
+
+@router.get("/catalogue", response_model=CatalogueStatusResponse)
+async def catalogue_status() -> CatalogueStatusResponse:
+    """Return the version and size of the in-memory catalogue."""
+    try:
+        snapshot = track_catalogue.snapshot()
+    except CatalogueUnavailableError as exc:
+        raise HTTPException(status_code=503, detail=str(exc))
+    return CatalogueStatusResponse(version=snapshot.version, tracks=len(snapshot.tracks))
+
+
+@router.get("/cache", response_model=QueryCacheStatsResponse)
+async def query_cache_stats() -> QueryCacheStatsResponse:
+    """Return the size and hit/miss counters of the query result cache."""
+    return QueryCacheStatsResponse(**query_cache.stats())
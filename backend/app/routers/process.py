@@ -2,64 +2,396 @@
 
 Exposes endpoints for:
 - Full upload processing (watermark + clip + waveform)
+- Background upload processing jobs with progress polling
 - Standalone watermarking
-- Standalone waveform generation
+- Batch clip previews, decoding only the requested windows
+- Standalone waveform generation (envelope list or binary peak pyramid)
+
+Waveforms and short clip batches run in the audio pool's interactive lane;
+full upload processing, watermarking and longer clip batches in its bulk
+lane (see
+:mod:`app.services.executor`). Audio work is cancelled, killing its ffmpeg
+processes, when the client disconnects (answered with 499) or the request's
+deadline passes (504). The deadline counts from when the saved upload is
+handed to the pool, queueing included, and can be shortened per request
+with an ``X-Request-Timeout`` header (seconds).
+
+Configuration (environment variables):
+    MAX_UPLOAD_BYTES: Largest accepted upload (default: 500 MiB).
+    INTERACTIVE_DEADLINE_SECONDS: Deadline of interactive audio work
+        (default: 60).
+    BULK_DEADLINE_SECONDS: Deadline of bulk audio work (default: 900).
 """
 
+import asyncio
+import base64
+import hashlib
 import json
 import os
-import tempfile
-from typing import Annotated
-
-from fastapi import APIRouter, File, Form, HTTPException, UploadFile
-from fastapi.responses import FileResponse, JSONResponse
-
+from typing import Annotated, Any, Callable, Coroutine, NamedTuple, TypeVar
+from urllib.parse import quote
+
+from fastapi import APIRouter, File, Form, HTTPException, Request, UploadFile
+from fastapi.responses import FileResponse, JSONResponse, Response
+from fastapi.routing import APIRoute
+from starlette.background import BackgroundTask
+
+from app.services.audio import sniff_format
+from app.services.cache import artifact_cache, cache_key
+from app.services.executor import (
+    BULK,
+    INTERACTIVE,
+    PoolSaturatedError,
+    PoolUnavailableError,
+    audio_pool,
+)
+from app.services.jobs import (
+    JOB_FAILED,
+    JOB_SUCCEEDED,
+    JobNotFoundError,
+    JobQueueFullError,
+    create_job,
+    job_worker,
+    public_job_view,
+    read_job,
+)
+from app.services.metrics import stage
+from app.services.peaks import PEAK_LEVELS, peaks_to_base64
+from app.services.pipeline import process_upload_audio
+from app.services.store import StoreFullError, artifact_store, remove_path
 from app.services.watermark import (
+    CLIP_PREVIEW_RENDITIONS,
+    FULL_PREVIEW_INTERVAL,
+    FULL_PREVIEW_RENDITIONS,
+    PREVIEW_MP3_BITRATE,
     VOICE_TAG_PATH,
-    create_clip_preview,
-    create_full_preview,
-    watermark_audio,
+    create_clip_previews,
+    voice_tag_fingerprint,
+    watermark_audio_spooled,
 )
-from app.services.waveform import generate_waveform
+from app.services.waveform import generate_waveform, generate_waveform_peaks
+
+T = TypeVar("T")
+F = TypeVar("F", bound=Callable[..., Any])
+
+# Seconds clients should wait before retrying when the pool is saturated.
+_RETRY_AFTER_SECONDS = "5"
+
+# Uploads are streamed to disk in chunks of this size. Request bodies are
+# rejected with 413 as soon as they are known to exceed MAX_UPLOAD_BYTES
+# (env var, default 500 MiB) plus _FORM_OVERHEAD_BYTES for the multipart
+# framing and form fields, before or while they are received.
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+MAX_UPLOAD_BYTES = int(os.environ.get("MAX_UPLOAD_BYTES", str(500 * 1024 * 1024)))
+_FORM_OVERHEAD_BYTES = 64 * 1024
+_SNIFF_BYTES = 16
+
+# Longest audio work per lane, queueing included.
+_DEADLINES = {
+    INTERACTIVE: float(os.environ.get("INTERACTIVE_DEADLINE_SECONDS", "60")),
+    BULK: float(os.environ.get("BULK_DEADLINE_SECONDS", "900")),
+}
+# Status for requests abandoned by the client (nginx's convention).
+_CLIENT_CLOSED_REQUEST = 499
+
+
+def _pool_error(exc: PoolSaturatedError | PoolUnavailableError) -> HTTPException:
+    """Map an audio pool rejection to a 429 (saturated) or 503 (unavailable)."""
+    status_code = 429 if isinstance(exc, PoolSaturatedError) else 503
+    return HTTPException(
+        status_code=status_code,
+        detail=str(exc),
+        headers={"Retry-After": _RETRY_AFTER_SECONDS},
+    )
+
+
+def _store_error(exc: StoreFullError) -> HTTPException:
+    """Map a full artifact store to a 507 (Insufficient Storage)."""
+    return HTTPException(
+        status_code=507,
+        detail=str(exc),
+        headers={"Retry-After": _RETRY_AFTER_SECONDS},
+    )
+
+
+def _ensure_pool_capacity(lane: str) -> None:
+    """Raise if the audio pool lane or the artifact store is full.
+
+    Raises:
+        HTTPException(429): If the lane's workers and queue are full.
+        HTTPException(503): If the pool is not running.
+        HTTPException(507): If the artifact store is full.
+    """
+    try:
+        audio_pool.ensure_capacity(lane)
+        artifact_store.ensure_capacity()
+    except (PoolSaturatedError, PoolUnavailableError) as exc:
+        raise _pool_error(exc) from exc
+    except StoreFullError as exc:
+        raise _store_error(exc) from exc
+
+
+def _ensure_job_capacity() -> None:
+    """Raise a 429 if the background job queue is full."""
+    try:
+        job_worker.ensure_capacity()
+    except JobQueueFullError as exc:
+        raise HTTPException(
+            status_code=429, detail=str(exc), headers={"Retry-After": _RETRY_AFTER_SECONDS}
+        ) from exc
+
+
+# ---------------------------------------------------------------------------
+# Admission — checks that run before an upload is received
+# ---------------------------------------------------------------------------
+
+def _too_large(max_bytes: int) -> HTTPException:
+    return HTTPException(status_code=413, detail=f"Upload exceeds {max_bytes} bytes")
+
+
+def _limit_body(request: Request, max_bytes: int) -> Request:
+    """Return *request* with its body capped at *max_bytes* plus form overhead.
+
+    A ``Content-Length`` over the cap is rejected before any of the body is
+    read; a body sent without one is cut off as soon as it passes the cap.
+
+    Raises:
+        HTTPException(413): If the declared length is over the cap. The
+            returned request's ``receive`` raises it once the body is.
+    """
+    limit = max_bytes + _FORM_OVERHEAD_BYTES
+    try:
+        declared = int(request.headers.get("content-length", ""))
+    except ValueError:
+        declared = None
+    if declared is not None and declared > limit:
+        raise _too_large(max_bytes)
+
+    received = 0
+
+    async def receive() -> dict[str, Any]:
+        nonlocal received
+        message = await request.receive()
+        if message["type"] == "http.request":
+            received += len(message.get("body", b""))
+            if received > limit:
+                # FastAPI re-raises an HTTPException from body parsing as is
+                raise _too_large(max_bytes)
+        return message
+
+    return Request(request.scope, receive)
+
+# Admission check of each endpoint, registered with @_admit.
+_ADMISSION_CHECKS: dict[Callable[..., Any], Callable[[], None]] = {}
+
+
+def _admit(check: Callable[[], None]) -> Callable[[F], F]:
+    """Run *check* before the decorated endpoint's request body is received.
+
+    Apply it below ``@router.post``. *check* raises an HTTPException to
+    reject the request.
+    """
+
+    def register(endpoint: F) -> F:
+        _ADMISSION_CHECKS[endpoint] = check
+        return endpoint
+
+    return register
+
+
+class _AdmissionRoute(APIRoute):
+    """A route that limits the body size and admits the request before reading it.
+
+    FastAPI receives and spools a whole multipart body before the endpoint,
+    or any of its dependencies, runs; a size or capacity check made there
+    would only reject an upload after it had been received in full.
+    """
+
+    def get_route_handler(self) -> Callable[[Request], Coroutine[Any, Any, Response]]:
+        handler = super().get_route_handler()
+
+        async def admit_then_handle(request: Request) -> Response:
+            request = _limit_body(request, MAX_UPLOAD_BYTES)
+            check = _ADMISSION_CHECKS.get(self.endpoint)
+            if check is not None:
+                check()
+            return await handler(request)
+
+        return admit_then_handle
+
+
+router = APIRouter(route_class=_AdmissionRoute)
+
+
+def _deadline(request: Request, lane: str) -> float:
+    """Return the seconds *request* may spend on audio work in *lane*.
+
+    An ``X-Request-Timeout`` header can shorten, never extend, the lane's
+    deadline; values that are not a positive number are ignored.
+    """
+    deadline = _DEADLINES[lane]
+    try:
+        requested = float(request.headers.get("x-request-timeout", ""))
+    except ValueError:
+        return deadline
+    if 0 < requested < deadline:
+        return requested
+    return deadline
+
+
+async def _wait_for_disconnect(request: Request) -> None:
+    """Return once the client has gone away.
+
+    Only valid once the request body has been read: the next ASGI message
+    is then ``http.disconnect``.
+    """
+    while True:
+        message = await request.receive()
+        if message["type"] == "http.disconnect":
+            return
 
-router = APIRouter()
 
+async def _run_in_pool(
+    request: Request, lane: str, fn: Callable[..., T], *args: Any, **kwargs: Any
+) -> T:
+    """Run blocking audio work in the process pool without stalling the event loop.
 
-async def _save_upload_to_temp(upload: UploadFile, suffix: str = ".mp3") -> str:
-    """Persist an uploaded file to a temporary location on disk.
+    The work is cancelled when the client disconnects or the deadline
+    passes, so nobody's pool worker is spent on an abandoned request.
+
+    Args:
+        request: The request the work is done for.
+        lane: Audio pool lane, ``INTERACTIVE`` or ``BULK``.
+        fn: The function to run, with its ``*args`` and ``**kwargs``.
+
+    Raises:
+        HTTPException(429): If the lane's workers and queue are full.
+        HTTPException(499): If the client disconnected.
+        HTTPException(503): If the pool is not running or a worker crashed.
+        HTTPException(504): If the deadline passed.
+        HTTPException(507): If the artifact store filled up.
+    """
+    deadline = _deadline(request, lane)
+    job = asyncio.ensure_future(audio_pool.run(fn, *args, lane=lane, **kwargs))
+    disconnect = asyncio.ensure_future(_wait_for_disconnect(request))
+    try:
+        done, _pending = await asyncio.wait(
+            (job, disconnect), timeout=deadline, return_when=asyncio.FIRST_COMPLETED
+        )
+        if job in done:
+            return job.result()
+        if disconnect in done:
+            raise HTTPException(
+                status_code=_CLIENT_CLOSED_REQUEST, detail="Client closed the request"
+            )
+        raise HTTPException(
+            status_code=504, detail=f"Audio processing exceeded its {deadline:g}s deadline"
+        )
+    except (PoolSaturatedError, PoolUnavailableError) as exc:
+        raise _pool_error(exc) from exc
+    except StoreFullError as exc:
+        raise _store_error(exc) from exc
+    finally:
+        # Cancelling the job kills its ffmpeg processes if it is running
+        job.cancel()
+        disconnect.cancel()
+        await asyncio.gather(job, disconnect, return_exceptions=True)
+
+
+def _attachment_headers(filename: str) -> dict[str, str]:
+    """Return a Content-Disposition header like FileResponse's ``filename=``."""
+    quoted = quote(filename)
+    if quoted != filename:
+        return {"Content-Disposition": f"attachment; filename*=utf-8''{quoted}"}
+    return {"Content-Disposition": f'attachment; filename="{filename}"'}
+
+
+class SavedUpload(NamedTuple):
+    """An upload persisted to disk by :func:`_save_upload_to_temp`."""
+
+    path: str
+    size: int
+    sha256: str
+    format: str | None
+
+
+async def _save_upload_to_temp(
+    upload: UploadFile,
+    suffix: str = ".mp3",
+    max_bytes: int = MAX_UPLOAD_BYTES,
+) -> SavedUpload:
+    """Stream an uploaded file to a temporary file in the artifact store.
+
+    The file is copied in ``UPLOAD_CHUNK_SIZE`` chunks so memory use per
+    upload stays fixed, and is hashed and format-sniffed on the way through.
+    The request body was already capped while it was received (see
+    :class:`_AdmissionRoute`); *max_bytes* applies to the file alone.
+    When the sniffed container disagrees with *suffix* the sniffed format
+    wins, so decoding does not depend on the client's filename.
 
     Args:
         upload: The incoming UploadFile from FastAPI.
         suffix: File extension for the temp file.
+        max_bytes: Maximum accepted size; larger uploads are rejected.
 
     Returns:
-        Absolute path to the saved temporary file.
+        The saved file's path, size, SHA-256 hex digest and sniffed format.
+
+    Raises:
+        HTTPException(413): If the upload exceeds *max_bytes*.
+        HTTPException(507): If the artifact store is full.
     """
-    fd, tmp_path = tempfile.mkstemp(suffix=suffix)
+    if upload.size is not None and upload.size > max_bytes:
+        raise _too_large(max_bytes)
+
+    digest = hashlib.sha256()
+    size = 0
+    header = b""
+
+    try:
+        tmp_path = artifact_store.new_file(suffix=suffix)
+    except StoreFullError as exc:
+        raise _store_error(exc) from exc
     try:
-        content = await upload.read()
-        with os.fdopen(fd, "wb") as f:
-            f.write(content)
-    except Exception:
-        os.close(fd)
+        with stage("upload_read") as timer, open(tmp_path, "wb") as f:
+            while chunk := await upload.read(UPLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise _too_large(max_bytes)
+                if len(header) < _SNIFF_BYTES:
+                    header += chunk[: _SNIFF_BYTES - len(header)]
+                digest.update(chunk)
+                await asyncio.to_thread(f.write, chunk)
+            timer.nbytes = size
+    except BaseException:
+        os.unlink(tmp_path)
         raise
-    return tmp_path
+
+    detected = sniff_format(header)
+    if detected and suffix.lower().lstrip(".") != detected:
+        renamed = os.path.splitext(tmp_path)[0] + "." + detected
+        os.replace(tmp_path, renamed)
+        tmp_path = renamed
+
+    return SavedUpload(path=tmp_path, size=size, sha256=digest.hexdigest(), format=detected)
 
 
 # ---------------------------------------------------------------------------
 # POST /upload — full upload processing pipeline
 # ---------------------------------------------------------------------------
 @router.post("/upload")
+@_admit(lambda: _ensure_pool_capacity(BULK))
 async def process_upload(
+    request: Request,
     listening_file: Annotated[UploadFile, File(description="Source MP3 file")],
     preview_clip_start: Annotated[int, Form()] = 0,
 ) -> JSONResponse:
     """Run the full upload processing pipeline.
 
     1. Save the uploaded listening file to a temp directory.
-    2. Generate a full-length watermarked preview.
-    3. Generate a 30-second watermarked clip preview.
-    4. Generate waveform data.
+    2. Decode it once into an in-memory buffer.
+    3. From that buffer, generate a full-length watermarked preview, a
+       30-second watermarked clip preview and waveform data.
 
     Returns a JSON object with paths/data for each artefact.
     """
@@ -68,47 +400,55 @@ async def process_upload(
     suffix = os.path.splitext(original_name)[1] or ".mp3"
 
     tmp_path: str | None = None
-    full_preview_path: str | None = None
-    clip_preview_path: str | None = None
 
     try:
-        tmp_path = await _save_upload_to_temp(listening_file, suffix=suffix)
+        saved = await _save_upload_to_temp(listening_file, suffix=suffix)
+        tmp_path = saved.path
         tag_path = VOICE_TAG_PATH
 
-        # Full watermarked preview
-        try:
-            full_preview_path = create_full_preview(tmp_path, tag_path)
-        except FileNotFoundError as exc:
-            raise HTTPException(
-                status_code=500,
-                detail=f"Watermark processing error: {exc}",
-            ) from exc
-
-        # 30-second clip preview
         try:
-            clip_preview_path = create_clip_preview(
-                tmp_path, tag_path, start_seconds=preview_clip_start, duration=30
+            key = cache_key(
+                saved.sha256,
+                "upload",
+                {
+                    "preview_clip_start": preview_clip_start,
+                    "clip_duration": 30,
+                    "tag": voice_tag_fingerprint(tag_path),
+                    "interval": FULL_PREVIEW_INTERVAL,
+                    "renditions": FULL_PREVIEW_RENDITIONS + CLIP_PREVIEW_RENDITIONS,
+                    "peak_levels": PEAK_LEVELS,
+                },
             )
+            entry = artifact_cache.get(key)
+            if entry is None:
+                # Decode once and derive the full preview, 30-second clip
+                # preview and waveform data from the same in-memory buffer.
+                artefacts = await _run_in_pool(
+                    request,
+                    BULK,
+                    process_upload_audio,
+                    tmp_path,
+                    tag_path,
+                    preview_clip_start=preview_clip_start,
+                    clip_duration=30,
+                )
+                data = {name: artefacts.pop(name) for name in ("waveform_data", "waveform_peaks")}
+                entry = await asyncio.to_thread(
+                    artifact_cache.put,
+                    key,
+                    files={name.removesuffix("_path"): path for name, path in artefacts.items()},
+                    data=data,
+                )
         except FileNotFoundError as exc:
             raise HTTPException(
                 status_code=500,
-                detail=f"Clip processing error: {exc}",
-            ) from exc
-
-        # Waveform data
-        try:
-            waveform_data = generate_waveform(tmp_path)
-        except Exception as exc:
-            raise HTTPException(
-                status_code=500,
-                detail=f"Waveform generation error: {exc}",
+                detail=f"Watermark processing error: {exc}",
             ) from exc
 
         return JSONResponse(
             content={
-                "full_preview_path": full_preview_path,
-                "clip_preview_path": clip_preview_path,
-                "waveform_data": waveform_data,
+                **{f"{name}_path": path for name, path in entry["files"].items()},
+                **entry["data"],
             }
         )
 
@@ -126,14 +466,94 @@ async def process_upload(
             os.unlink(tmp_path)
 
 
+# ---------------------------------------------------------------------------
+# /jobs — background upload processing
+# ---------------------------------------------------------------------------
+def _read_job_or_404(job_id: str) -> dict:
+    try:
+        return read_job(job_id)
+    except JobNotFoundError as exc:
+        raise HTTPException(status_code=404, detail=str(exc)) from exc
+
+
+@router.post("/jobs", status_code=202)
+@_admit(_ensure_job_capacity)
+async def create_upload_job(
+    listening_file: Annotated[UploadFile, File(description="Source MP3 file")],
+    preview_clip_start: Annotated[int, Form()] = 0,
+) -> JSONResponse:
+    """Queue the full upload pipeline and return a job id immediately.
+
+    Poll ``GET /process/jobs/{job_id}`` for per-stage progress and fetch
+    ``GET /process/jobs/{job_id}/result`` once the job has succeeded.
+    """
+    original_name = listening_file.filename or "upload.mp3"
+    suffix = os.path.splitext(original_name)[1] or ".mp3"
+
+    tmp_path = (await _save_upload_to_temp(listening_file, suffix=suffix)).path
+    try:
+        job = create_job(
+            tmp_path,
+            {
+                "tag_path": VOICE_TAG_PATH,
+                "preview_clip_start": preview_clip_start,
+                "clip_duration": 30,
+            },
+        )
+    finally:
+        # create_job moves the file into the job directory on success
+        if os.path.isfile(tmp_path):
+            os.unlink(tmp_path)
+
+    job_worker.submit(job["id"])
+
+    return JSONResponse(
+        status_code=202,
+        content={
+            **public_job_view(job),
+            "status_url": f"/process/jobs/{job['id']}",
+            "result_url": f"/process/jobs/{job['id']}/result",
+        },
+    )
+
+
+@router.get("/jobs/{job_id}")
+async def get_upload_job(job_id: str) -> JSONResponse:
+    """Return the status, current stage and progress of a processing job."""
+    return JSONResponse(content=public_job_view(_read_job_or_404(job_id)))
+
+
+@router.get("/jobs/{job_id}/result")
+async def get_upload_job_result(job_id: str) -> JSONResponse:
+    """Return the artefacts of a finished job.
+
+    Responds with 409 while the job is still queued or running and 500 if
+    the job failed.
+    """
+    job = _read_job_or_404(job_id)
+    if job["status"] == JOB_FAILED:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Upload processing failed: {job['error']}",
+        )
+    if job["status"] != JOB_SUCCEEDED:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Job {job_id} is {job['status']}",
+        )
+    return JSONResponse(content=job["result"])
+
+
 # ---------------------------------------------------------------------------
 # POST /watermark — standalone watermark endpoint
 # ---------------------------------------------------------------------------
 @router.post("/watermark")
+@_admit(lambda: _ensure_pool_capacity(BULK))
 async def process_watermark(
+    request: Request,
     audio_file: Annotated[UploadFile, File(description="Audio file to watermark")],
     positions: Annotated[str, Form(description="JSON array of positions in seconds, e.g. [10, 24]")],
-) -> FileResponse:
+) -> Response:
     """Watermark an audio file at the specified positions.
 
     Accepts:
@@ -162,16 +582,53 @@ async def process_watermark(
 
     tmp_path: str | None = None
     try:
-        tmp_path = await _save_upload_to_temp(audio_file, suffix=suffix)
+        saved = await _save_upload_to_temp(audio_file, suffix=suffix)
+        tmp_path = saved.path
         tag_path = VOICE_TAG_PATH
 
-        output_path = watermark_audio(tmp_path, tag_path, positions_list)
+        key = cache_key(
+            saved.sha256,
+            "watermark",
+            {
+                "positions": positions_list,
+                "tag": voice_tag_fingerprint(tag_path),
+                "bitrate": PREVIEW_MP3_BITRATE,
+            },
+        )
+        filename = f"watermarked_{original_name}"
+        entry = artifact_cache.get(key)
+        if entry is None:
+            output = await _run_in_pool(
+                request, BULK, watermark_audio_spooled, tmp_path, tag_path, positions_list
+            )
+            if isinstance(output, bytes):
+                # Small output: answer from memory and cache it only after
+                # the response has been sent.
+                return Response(
+                    content=output,
+                    media_type="audio/mpeg",
+                    headers=_attachment_headers(filename),
+                    background=BackgroundTask(_cache_watermarked, key, output),
+                )
+            if os.path.getsize(output) > artifact_cache.max_bytes:
+                # Too big to cache: stream it, then delete it.
+                return FileResponse(
+                    path=output,
+                    media_type="audio/mpeg",
+                    filename=filename,
+                    background=BackgroundTask(remove_path, output),
+                )
+            entry = await asyncio.to_thread(
+                artifact_cache.put, key, files={"watermarked": output}
+            )
 
         return FileResponse(
-            path=output_path,
+            path=entry["files"]["watermarked"],
             media_type="audio/mpeg",
-            filename=f"watermarked_{original_name}",
+            filename=filename,
         )
+    except HTTPException:
+        raise
     except FileNotFoundError as exc:
         raise HTTPException(status_code=500, detail=str(exc)) from exc
     except Exception as exc:
@@ -184,11 +641,154 @@ async def process_watermark(
             os.unlink(tmp_path)
 
 
+def _cache_watermarked(key: str, data: bytes) -> None:
+    """Store an in-memory /watermark output in the artefact cache."""
+    try:
+        path = artifact_store.write_bytes(data, suffix=".mp3")
+    except StoreFullError:
+        return
+    try:
+        artifact_cache.put(key, files={"watermarked": path})
+    except OSError:
+        remove_path(path)
+
+
+# ---------------------------------------------------------------------------
+# POST /clips — batch clip previews
+# ---------------------------------------------------------------------------
+MAX_CLIPS_PER_REQUEST = 10
+MAX_CLIP_DURATION_SECONDS = 60
+# Batches with more audio than this in total run in the bulk lane.
+INTERACTIVE_CLIP_SECONDS = 90
+
+
+def _parse_clip_windows(clips: str) -> list[tuple[int, int]]:
+    """Parse the ``clips`` form field into ``(start, duration)`` pairs.
+
+    Raises:
+        HTTPException(422): If the field is malformed.
+    """
+    error = HTTPException(
+        status_code=422,
+        detail=(
+            "clips must be a JSON array of up to "
+            f"{MAX_CLIPS_PER_REQUEST} objects like "
+            '{"start": 10, "duration": 30} (duration defaults to 30, '
+            f"at most {MAX_CLIP_DURATION_SECONDS})"
+        ),
+    )
+    try:
+        parsed = json.loads(clips)
+    except json.JSONDecodeError:
+        raise error
+    if not isinstance(parsed, list) or not 0 < len(parsed) <= MAX_CLIPS_PER_REQUEST:
+        raise error
+
+    windows: list[tuple[int, int]] = []
+    for item in parsed:
+        if not isinstance(item, dict):
+            raise error
+        start = item.get("start")
+        duration = item.get("duration", 30)
+        if not isinstance(start, int) or not isinstance(duration, int):
+            raise error
+        if start < 0 or not 1 <= duration <= MAX_CLIP_DURATION_SECONDS:
+            raise error
+        windows.append((start, duration))
+    return windows
+
+
+def _clips_lane(windows: list[tuple[int, int]]) -> str:
+    """Return the audio pool lane for rendering *windows*."""
+    total = sum(duration for _, duration in windows)
+    return INTERACTIVE if total <= INTERACTIVE_CLIP_SECONDS else BULK
+
+
+@router.post("/clips")
+# The windows are only known once the body is parsed; the batch may then
+# move to the bulk lane (see _clips_lane).
+@_admit(lambda: _ensure_pool_capacity(INTERACTIVE))
+async def process_clips(
+    request: Request,
+    audio_file: Annotated[UploadFile, File(description="Source audio file")],
+    clips: Annotated[
+        str,
+        Form(description='JSON array of clip windows, e.g. [{"start": 10, "duration": 30}]'),
+    ],
+) -> JSONResponse:
+    """Render several watermarked preview clips, decoding only their windows.
+
+    Lets creators compare candidate ``preview_clip_start`` values without a
+    full upload per attempt. Each clip is watermarked at 10 s and 24 s, like
+    the clip produced by ``/upload``.
+
+    Returns a JSON object with a ``clips`` list of
+    ``{"start", "duration", "clip_preview_path"}`` in request order.
+    """
+    windows = _parse_clip_windows(clips)
+
+    original_name = audio_file.filename or "audio.mp3"
+    suffix = os.path.splitext(original_name)[1] or ".mp3"
+
+    tmp_path: str | None = None
+    try:
+        saved = await _save_upload_to_temp(audio_file, suffix=suffix)
+        tmp_path = saved.path
+        tag_path = VOICE_TAG_PATH
+
+        key = cache_key(
+            saved.sha256,
+            "clips",
+            {
+                "windows": windows,
+                "tag": voice_tag_fingerprint(tag_path),
+                "bitrate": PREVIEW_MP3_BITRATE,
+            },
+        )
+        entry = artifact_cache.get(key)
+        if entry is None:
+            paths = await _run_in_pool(
+                request, _clips_lane(windows), create_clip_previews, tmp_path, tag_path, windows
+            )
+            entry = await asyncio.to_thread(
+                artifact_cache.put,
+                key,
+                files={f"clip_{i}": path for i, path in enumerate(paths)},
+            )
+
+        return JSONResponse(
+            content={
+                "clips": [
+                    {
+                        "start": start,
+                        "duration": duration,
+                        "clip_preview_path": entry["files"][f"clip_{i}"],
+                    }
+                    for i, (start, duration) in enumerate(windows)
+                ]
+            }
+        )
+    except HTTPException:
+        raise
+    except FileNotFoundError as exc:
+        raise HTTPException(status_code=500, detail=str(exc)) from exc
+    except Exception as exc:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Clip processing failed: {exc}",
+        ) from exc
+    finally:
+        if tmp_path and os.path.isfile(tmp_path):
+            os.unlink(tmp_path)
+
+
 # ---------------------------------------------------------------------------
 # POST /waveform — standalone waveform endpoint
 # ---------------------------------------------------------------------------
 @router.post("/waveform")
+@_admit(lambda: _ensure_pool_capacity(INTERACTIVE))
 async def process_waveform(
+    request: Request,
     audio_file: Annotated[UploadFile, File(description="Audio file to analyse")],
 ) -> JSONResponse:
     """Generate waveform amplitude data from an audio file.
@@ -200,11 +800,83 @@ async def process_waveform(
 
     tmp_path: str | None = None
     try:
-        tmp_path = await _save_upload_to_temp(audio_file, suffix=suffix)
+        saved = await _save_upload_to_temp(audio_file, suffix=suffix)
+        tmp_path = saved.path
+
+        key = cache_key(saved.sha256, "waveform", {"num_points": 200})
+        entry = artifact_cache.get(key)
+        if entry is None:
+            waveform_data = await _run_in_pool(request, INTERACTIVE, generate_waveform, tmp_path)
+            entry = await asyncio.to_thread(
+                artifact_cache.put, key, data={"waveform_data": waveform_data}
+            )
+
+        return JSONResponse(content={"waveform_data": entry["data"]["waveform_data"]})
+    except HTTPException:
+        raise
+    except FileNotFoundError as exc:
+        raise HTTPException(status_code=404, detail=str(exc)) from exc
+    except Exception as exc:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Waveform generation failed: {exc}",
+        ) from exc
+    finally:
+        if tmp_path and os.path.isfile(tmp_path):
+            os.unlink(tmp_path)
+
+
+# ---------------------------------------------------------------------------
+# POST /waveform/peaks — multi-resolution peak pyramid
+# ---------------------------------------------------------------------------
+@router.post("/waveform/peaks")
+@_admit(lambda: _ensure_pool_capacity(INTERACTIVE))
+async def process_waveform_peaks(
+    request: Request,
+    audio_file: Annotated[UploadFile, File(description="Audio file to analyse")],
+    num_points: Annotated[int, Form(ge=1, le=10000)] = 200,
+    levels: Annotated[int, Form(ge=1, le=8)] = PEAK_LEVELS,
+    bits: Annotated[int, Form()] = 8,
+    encoding: Annotated[str, Form()] = "binary",
+) -> Response:
+    """Generate a min/max peak pyramid for zoomable waveforms.
+
+    The pyramid uses the compact format described in
+    :mod:`app.services.peaks`. With ``encoding=binary`` (the default) it is
+    returned as ``application/octet-stream``; with ``encoding=base64`` as
+    ``{"waveform_peaks": "<base64>"}``.
+    """
+    if bits not in (8, 16):
+        raise HTTPException(status_code=422, detail="bits must be 8 or 16")
+    if encoding not in ("binary", "base64"):
+        raise HTTPException(status_code=422, detail="encoding must be 'binary' or 'base64'")
+
+    original_name = audio_file.filename or "audio.mp3"
+    suffix = os.path.splitext(original_name)[1] or ".mp3"
+
+    tmp_path: str | None = None
+    try:
+        saved = await _save_upload_to_temp(audio_file, suffix=suffix)
+        tmp_path = saved.path
 
-        waveform_data = generate_waveform(tmp_path)
+        key = cache_key(
+            saved.sha256, "waveform_peaks", {"num_points": num_points, "levels": levels, "bits": bits}
+        )
+        entry = artifact_cache.get(key)
+        if entry is None:
+            peaks = await _run_in_pool(
+                request, INTERACTIVE, generate_waveform_peaks, tmp_path, num_points, levels, bits
+            )
+            entry = await asyncio.to_thread(
+                artifact_cache.put, key, data={"waveform_peaks": peaks_to_base64(peaks)}
+            )
 
-        return JSONResponse(content={"waveform_data": waveform_data})
+        encoded = entry["data"]["waveform_peaks"]
+        if encoding == "base64":
+            return JSONResponse(content={"waveform_peaks": encoded})
+        return Response(content=base64.b64decode(encoded), media_type="application/octet-stream")
+    except HTTPException:
+        raise
     except FileNotFoundError as exc:
         raise HTTPException(status_code=404, detail=str(exc)) from exc
     except Exception as exc:
@@ -0,0 +1,277 @@
+"""Shared audio decoding helpers.
+
+Decodes an upload once into an in-memory PCM buffer (a pydub AudioSegment)
+so that every artefact derived from it — previews, clips and waveform data —
+can reuse the same samples instead of invoking ffmpeg again. When only part
+of a file is needed, :func:`load_audio_window` seeks instead of decoding the
+whole file, and :func:`open_pcm_decoder` / :func:`read_pcm_blocks` stream a
+file in fixed-size blocks when it should never be held in memory at once.
+"""
+
+import os
+import subprocess
+from pathlib import Path
+from typing import Iterator, NamedTuple
+
+import numpy as np
+from pydub import AudioSegment
+from pydub.audio_segment import fix_wav_headers
+from pydub.exceptions import CouldntDecodeError
+from pydub.utils import mediainfo_json
+
+from app.services.executor import raise_if_cancelled
+from app.services.metrics import stage
+
+SUPPORTED_FORMATS = frozenset({"mp3", "wav", "ogg", "flac", "m4a", "aac"})
+
+# Audio decoded ahead of a seek target and discarded, so codecs with
+# inter-frame state (MP3's bit reservoir, AAC priming) start cleanly.
+SEEK_PREROLL_SECONDS = 0.5
+
+# Sample width in bytes of PCM streamed by open_pcm_decoder (16-bit)
+PCM_SAMPLE_WIDTH = 2
+
+
+def sniff_format(header: bytes) -> str | None:
+    """Guess an audio container from its first bytes.
+
+    Args:
+        header: At least the first 12 bytes of the file.
+
+    Returns:
+        One of ``SUPPORTED_FORMATS``, or ``None`` if the bytes are not
+        recognised.
+    """
+    if header.startswith(b"ID3"):
+        return "mp3"
+    if header.startswith(b"RIFF") and header[8:12] == b"WAVE":
+        return "wav"
+    if header.startswith(b"fLaC"):
+        return "flac"
+    if header.startswith(b"OggS"):
+        return "ogg"
+    if header[4:8] == b"ftyp":
+        return "m4a"
+    if len(header) >= 2 and header[0] == 0xFF and header[1] & 0xE0 == 0xE0:
+        # MPEG frame sync; a layer field of 0 marks an ADTS (AAC) stream.
+        return "aac" if (header[1] >> 1) & 0x03 == 0 else "mp3"
+    return None
+
+
+def _checked_format(audio_path: str) -> str:
+    """Validate *audio_path* and return its (lower-case) extension."""
+    if not os.path.isfile(audio_path):
+        raise FileNotFoundError(f"Audio file not found: {audio_path}")
+
+    ext = Path(audio_path).suffix.lower().lstrip(".")
+    if ext not in SUPPORTED_FORMATS:
+        raise ValueError(
+            f"Unsupported audio format '.{ext}'. Supported: {', '.join(sorted(SUPPORTED_FORMATS))}"
+        )
+    return ext
+
+
+class AudioInfo(NamedTuple):
+    """Stream parameters reported by ffprobe."""
+
+    sample_rate: int
+    channels: int
+    duration: float
+
+
+def probe_audio(audio_path: str) -> AudioInfo:
+    """Read the first audio stream's sample rate, channels and duration.
+
+    Raises:
+        FileNotFoundError: If the file does not exist.
+        ValueError: If the format is unsupported or has no audio stream.
+    """
+    _checked_format(audio_path)
+    info = mediainfo_json(audio_path)
+    streams = [s for s in info.get("streams", []) if s.get("codec_type") == "audio"]
+    if not streams:
+        raise ValueError(f"No audio stream found in {audio_path}")
+    stream = streams[0]
+    duration = stream.get("duration") or info.get("format", {}).get("duration") or 0
+    return AudioInfo(
+        sample_rate=int(stream["sample_rate"]),
+        channels=int(stream["channels"]),
+        duration=float(duration),
+    )
+
+
+def load_audio(audio_path: str) -> AudioSegment:
+    """Load an audio file, auto-detecting format from the file extension.
+
+    Args:
+        audio_path: Path to the audio file.
+
+    Returns:
+        A pydub AudioSegment.
+
+    Raises:
+        FileNotFoundError: If the file does not exist.
+        ValueError: If the format is unsupported.
+    """
+    ext = _checked_format(audio_path)
+    with stage("decode", nbytes=os.path.getsize(audio_path)) as timer:
+        audio = AudioSegment.from_file(audio_path, format=ext)
+        timer.audio_seconds = audio.duration_seconds
+    return audio
+
+
+def load_audio_window(
+    audio_path: str,
+    start_seconds: float,
+    duration: float,
+    preroll: float = SEEK_PREROLL_SECONDS,
+) -> AudioSegment:
+    """Decode only ``[start_seconds, start_seconds + duration)`` of a file.
+
+    ffmpeg seeks in the container before decoding, so the cost is
+    proportional to *duration* rather than the file's length. Decoding
+    starts *preroll* seconds early (codecs such as MP3 need a few frames of
+    history to decode the first frame cleanly) and the pre-roll is trimmed
+    off sample-accurately afterwards. Output is 16-bit PCM at the source's
+    sample rate and channel layout.
+
+    Args:
+        audio_path: Path to the audio file.
+        start_seconds: Start of the window in seconds.
+        duration: Length of the window in seconds. The window is clamped to
+            the end of the file.
+        preroll: Seconds decoded ahead of *start_seconds* and discarded.
+
+    Returns:
+        A pydub AudioSegment holding just the window.
+
+    Raises:
+        FileNotFoundError: If the file does not exist.
+        ValueError: If the format is unsupported.
+        CouldntDecodeError: If ffmpeg fails.
+    """
+    _checked_format(audio_path)
+
+    seek = max(0.0, start_seconds - preroll)
+    lead_in = start_seconds - seek
+    command = [
+        AudioSegment.converter,
+        "-v", "error",
+        "-ss", f"{seek:.6f}",
+        "-i", audio_path,
+        "-t", f"{duration + lead_in:.6f}",
+        "-vn",
+        "-acodec", "pcm_s16le",
+        "-f", "wav",
+        "-",
+    ]
+    with stage("decode_window", audio_seconds=duration):
+        result = subprocess.run(command, capture_output=True)
+    if result.returncode != 0 or not result.stdout:
+        raise CouldntDecodeError(
+            f"Decoding failed. ffmpeg returned error code: {result.returncode}\n\n"
+            f"{result.stderr.decode(errors='ignore')}"
+        )
+
+    data = bytearray(result.stdout)
+    fix_wav_headers(data)
+    window = AudioSegment(data=bytes(data))
+
+    lead_in_ms = int(round(lead_in * 1000))
+    return window[lead_in_ms:lead_in_ms + int(duration * 1000)]
+
+
+def open_pcm_decoder(audio_path: str, info: AudioInfo, stderr) -> subprocess.Popen:
+    """Start an ffmpeg process that writes raw 16-bit PCM to its stdout.
+
+    Samples are interleaved at *info*'s sample rate and channel count. Read
+    them with :func:`read_pcm_blocks` and pass the process to
+    :func:`check_decoder` once the stream is exhausted.
+
+    Args:
+        audio_path: Path to the audio file.
+        info: Stream parameters from :func:`probe_audio`.
+        stderr: Writable file object that receives ffmpeg's diagnostics.
+    """
+    return subprocess.Popen(
+        [
+            AudioSegment.converter,
+            "-v", "error",
+            "-i", audio_path,
+            "-vn",
+            "-f", "s16le",
+            "-acodec", "pcm_s16le",
+            "-ar", str(info.sample_rate),
+            "-ac", str(info.channels),
+            "-",
+        ],
+        stdout=subprocess.PIPE,
+        stderr=stderr,
+    )
+
+
+def read_pcm_blocks(stream, channels: int, block_frames: int) -> Iterator[np.ndarray]:
+    """Yield ``(frames, channels)`` int16 blocks read from *stream*.
+
+    Every block holds *block_frames* frames except possibly the last. A
+    single buffer is reused for every block, so consumers must finish with
+    a block before asking for the next one.
+
+    Raises:
+        JobCancelledError: Before a block, if the pool job was cancelled.
+    """
+    frame_width = channels * PCM_SAMPLE_WIDTH
+    buffer = bytearray(block_frames * frame_width)
+    view = memoryview(buffer)
+    while True:
+        raise_if_cancelled()
+        filled = 0
+        while filled < len(buffer):
+            n = stream.readinto(view[filled:])
+            if not n:
+                break
+            filled += n
+        filled -= filled % frame_width
+        if not filled:
+            return
+        yield np.frombuffer(buffer, dtype="<i2", count=filled // PCM_SAMPLE_WIDTH).reshape(
+            -1, channels
+        )
+        if filled < len(buffer):
+            return
+
+
+def check_decoder(proc: subprocess.Popen, stderr) -> None:
+    """Raise if a finished :func:`open_pcm_decoder` process failed.
+
+    Raises:
+        RuntimeError: With ffmpeg's diagnostics, on a non-zero exit code.
+    """
+    if proc.returncode:
+        stderr.seek(0)
+        raise RuntimeError(
+            f"ffmpeg decode failed with code {proc.returncode}: "
+            f"{stderr.read().decode(errors='ignore')}"
+        )
+
+
+def sample_view(audio: AudioSegment) -> np.ndarray:
+    """Return a read-only ``(frames, channels)`` view of *audio*'s samples.
+
+    No data is copied; use :func:`to_sample_array` for a writable array.
+    """
+    samples = np.frombuffer(audio.raw_data, dtype=f"<i{audio.sample_width}")
+    return samples.reshape(-1, audio.channels)
+
+
+def to_sample_array(audio: AudioSegment) -> np.ndarray:
+    """Return a writable ``(frames, channels)`` integer array of *audio*'s samples."""
+    return sample_view(audio).copy()
+
+
+def from_sample_array(samples: np.ndarray, like: AudioSegment) -> AudioSegment:
+    """Wrap a sample array produced by :func:`to_sample_array` as a segment.
+
+    The sample rate, channel count and sample width are taken from *like*.
+    """
+    return like._spawn(samples.astype(f"<i{like.sample_width}", copy=False).tobytes())
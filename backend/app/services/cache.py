@@ -0,0 +1,192 @@
+"""Content-addressed on-disk cache for processed artefacts.
+
+Creators often re-upload the same file (retries, metadata edits, admins
+re-running processing). Artefacts are therefore stored under a key derived
+from the SHA-256 of the input plus every parameter that affects the output,
+so a repeat request can be answered without decoding anything.
+
+Layout: ``<root>/<key[:2]>/<key>/`` holds the artefact files and a
+``meta.json``. Entries are assembled in a private temp directory and
+published with a single ``rename``, so concurrent API workers never see a
+half-written entry. The ``meta.json`` mtime doubles as the LRU timestamp;
+once the cache grows past its byte budget the least recently used entries
+are removed.
+
+Configuration (environment variables):
+    ARTIFACT_CACHE_DIR: Cache root (default: <tmp>/featune-cache).
+    ARTIFACT_CACHE_MAX_BYTES: Size budget in bytes (default: 2 GiB).
+"""
+
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from typing import Any
+
+from app.services.store import path_size
+
+ARTIFACT_CACHE_DIR = os.environ.get(
+    "ARTIFACT_CACHE_DIR", os.path.join(tempfile.gettempdir(), "featune-cache")
+)
+ARTIFACT_CACHE_MAX_BYTES = int(
+    os.environ.get("ARTIFACT_CACHE_MAX_BYTES", str(2 * 1024 * 1024 * 1024))
+)
+
+# Bump when a processing change alters output for identical inputs, so
+# stale artefacts are never served.
+CACHE_FORMAT_VERSION = 2
+
+_META = "meta.json"
+
+
+def cache_key(input_sha256: str, operation: str, params: dict[str, Any]) -> str:
+    """Return the cache key for *operation* on an input with the given digest."""
+    payload = json.dumps(
+        {
+            "version": CACHE_FORMAT_VERSION,
+            "input": input_sha256,
+            "operation": operation,
+            "params": params,
+        },
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class ArtifactCache:
+    """A size-bounded LRU cache of artefact files and JSON data."""
+
+    def __init__(self, root: str, max_bytes: int) -> None:
+        self.root = root
+        self.max_bytes = max_bytes
+
+    def _entry_dir(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key)
+
+    def get(self, key: str) -> dict[str, Any] | None:
+        """Return the entry for *key*, or ``None`` on a miss.
+
+        The entry is ``{"files": {name: path}, "data": {...}}``, where a path
+        may be a directory (e.g. an HLS rendition). A hit marks the entry as
+        recently used.
+        """
+        entry_dir = self._entry_dir(key)
+        meta_path = os.path.join(entry_dir, _META)
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            os.utime(meta_path)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+        files = {name: os.path.join(entry_dir, filename) for name, filename in meta["files"].items()}
+        if not all(os.path.exists(path) for path in files.values()):
+            # Evicted underneath us by another worker
+            return None
+        return {"files": files, "data": meta["data"]}
+
+    def put(
+        self,
+        key: str,
+        files: dict[str, str] | None = None,
+        data: dict[str, Any] | None = None,
+    ) -> dict[str, Any]:
+        """Store artefacts under *key* and return the published entry.
+
+        Args:
+            key: Key from :func:`cache_key`.
+            files: Mapping of artefact name to a file or directory path.
+                They are moved into the cache.
+            data: JSON-serialisable data stored alongside the files.
+
+        Returns:
+            The entry as :meth:`get` would return it. If another worker
+            published the same key first, that entry is returned and the
+            given files are discarded.
+        """
+        files = files or {}
+        os.makedirs(self.root, exist_ok=True)
+        staging = tempfile.mkdtemp(prefix=".staging-", dir=self.root)
+        try:
+            stored: dict[str, str] = {}
+            size = 0
+            for name, src in files.items():
+                filename = name + os.path.splitext(src)[1]
+                dst = os.path.join(staging, filename)
+                shutil.move(src, dst)
+                stored[name] = filename
+                size += path_size(dst)
+
+            with open(os.path.join(staging, _META), "w") as f:
+                json.dump({"files": stored, "data": data or {}, "size": size}, f)
+
+            entry_dir = self._entry_dir(key)
+            os.makedirs(os.path.dirname(entry_dir), exist_ok=True)
+            try:
+                os.rename(staging, entry_dir)
+            except OSError:
+                # Lost the race; keep the entry that is already published.
+                pass
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+
+        self.evict()
+        entry = self.get(key)
+        if entry is None:
+            # Evicted immediately (budget smaller than the entry itself)
+            raise OSError(f"artifact cache entry {key} could not be stored")
+        return entry
+
+    def evict(self) -> int:
+        """Remove least recently used entries until under budget.
+
+        Only one process evicts at a time; others skip. Returns the number
+        of entries removed.
+        """
+        os.makedirs(self.root, exist_ok=True)
+        with open(os.path.join(self.root, ".evict.lock"), "w") as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return 0
+
+            entries: list[tuple[float, int, str]] = []
+            total = 0
+            for shard in os.scandir(self.root):
+                if not shard.is_dir() or shard.name.startswith("."):
+                    continue
+                for entry in os.scandir(shard.path):
+                    meta_path = os.path.join(entry.path, _META)
+                    try:
+                        with open(meta_path) as f:
+                            size = json.load(f).get("size", 0)
+                        used = os.stat(meta_path).st_mtime
+                    except (FileNotFoundError, json.JSONDecodeError):
+                        continue
+                    entries.append((used, size, entry.path))
+                    total += size
+
+            removed = 0
+            entries.sort()
+            for _used, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                shutil.rmtree(path, ignore_errors=True)
+                total -= size
+                removed += 1
+
+            self._sweep_staging()
+            return removed
+
+    def _sweep_staging(self, max_age: float = 3600.0) -> None:
+        """Remove staging directories abandoned by crashed workers."""
+        cutoff = time.time() - max_age
+        for entry in os.scandir(self.root):
+            if entry.name.startswith(".staging-") and entry.stat().st_mtime < cutoff:
+                shutil.rmtree(entry.path, ignore_errors=True)
+
+
+artifact_cache = ArtifactCache(ARTIFACT_CACHE_DIR, ARTIFACT_CACHE_MAX_BYTES)
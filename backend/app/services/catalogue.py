@@ -0,0 +1,316 @@
+"""Process-wide cache of the approved track catalogue.
+
+``/chat/query`` scores every approved track. Fetching them from Supabase on
+each query made latency and database load grow with both the catalogue size
+and the query rate, so the catalogue is loaded once at startup and kept
+current in the background instead:
+
+* Every ``CATALOGUE_REFRESH_SECONDS`` only the rows whose ``updated_at`` or
+  ``approved_at`` reached the newest timestamp already seen are fetched (the
+  ``tracks`` table stamps ``updated_at`` on every update). Approved rows are
+  upserted; rows that left the approved state are dropped.
+* Every ``CATALOGUE_FULL_REFRESH_SECONDS`` the whole catalogue is reloaded.
+  This also catches rows deleted outright and updates that committed out of
+  timestamp order.
+* :meth:`TrackCatalogue.invalidate` refetches the given tracks (or the whole
+  catalogue) immediately. It backs ``POST /chat/catalogue/invalidate``,
+  which the admin approve/reject/remove routes call. Concurrent full
+  reloads share one fetch, and at most one starts every
+  ``CATALOGUE_MIN_RELOAD_SECONDS``.
+
+Each API worker process holds its own catalogue. An invalidation only
+reaches the worker that received it; the others pick the change up on
+their next incremental refresh (deleted rows on their next full reload).
+
+Queries read an immutable :class:`CatalogueSnapshot` and never touch the
+database. Its ``version`` increases whenever the contents change, so
+structures derived from the catalogue can be keyed on it.
+
+Fetches are awaited on the worker's shared, pooled database client (see
+:mod:`app.services.database`); rebuilding the snapshot and anything derived
+from it runs in a thread, so a refresh never blocks the event loop.
+
+Configuration (environment variables):
+    CATALOGUE_REFRESH_SECONDS: Seconds between incremental refreshes
+        (default: 30).
+    CATALOGUE_FULL_REFRESH_SECONDS: Seconds between full reloads
+        (default: 900).
+    CATALOGUE_PAGE_SIZE: Rows fetched per request (default: 1000, the
+        PostgREST default row limit).
+    CATALOGUE_MIN_RELOAD_SECONDS: Minimum seconds between the starts of
+        two full reloads requested through :meth:`TrackCatalogue.invalidate`
+        (default: 5).
+"""
+
+import asyncio
+import os
+import time
+from typing import Any, Callable, Iterable, NamedTuple
+
+from app.services.database import Database, DatabaseUnavailableError, database
+from app.services.metrics import Counter
+
+CATALOGUE_REFRESH_SECONDS = float(os.environ.get("CATALOGUE_REFRESH_SECONDS", "30"))
+CATALOGUE_FULL_REFRESH_SECONDS = float(os.environ.get("CATALOGUE_FULL_REFRESH_SECONDS", "900"))
+CATALOGUE_PAGE_SIZE = int(os.environ.get("CATALOGUE_PAGE_SIZE", "1000"))
+CATALOGUE_MIN_RELOAD_SECONDS = float(os.environ.get("CATALOGUE_MIN_RELOAD_SECONDS", "5"))
+
+SUBSCRIBER_ERRORS = Counter(
+    "featune_catalogue_subscriber_errors_total",
+    "Catalogue subscribers that raised while handling a new version.",
+    ("subscriber",),
+)
+
+# Fields needed for matching and display, plus the bookkeeping columns.
+_FIELDS = (
+    "id, title, genre, mood, bpm, key, vocalist_type, is_ai_generated, "
+    "status, created_at, updated_at, approved_at"
+)
+
+
+class CatalogueUnavailableError(Exception):
+    """Raised when the catalogue is not configured or not loaded yet."""
+
+
+class CatalogueSnapshot(NamedTuple):
+    """An immutable view of the approved tracks.
+
+    Attributes:
+        version: Increases whenever the contents change.
+        tracks: Approved tracks in creation order (oldest first).
+        refreshed_at: ``time.time()`` of the last successful refresh.
+    """
+
+    version: int
+    tracks: tuple[dict[str, Any], ...]
+    refreshed_at: float
+
+
+def _callback_name(callback: Callable[..., Any]) -> str:
+    return f"{getattr(callback, '__module__', '')}.{getattr(callback, '__qualname__', repr(callback))}"
+
+
+def _catalogue_order(track: dict[str, Any]) -> tuple[str, str]:
+    return (track.get("created_at") or "", str(track["id"]))
+
+
+class TrackCatalogue:
+    """Approved tracks cached in memory and refreshed in the background.
+
+    Args:
+        db: The database to load tracks from.
+    """
+
+    def __init__(self, db: Database = database) -> None:
+        self._db = db
+        self._tracks: dict[str, dict[str, Any]] = {}
+        self._snapshot: CatalogueSnapshot | None = None
+        self._watermark: str | None = None
+        self._full_refresh_at = 0.0
+        self._reload_started_at = float("-inf")
+        self._pending_reload: asyncio.Task[CatalogueSnapshot] | None = None
+        self._version = 0
+        # Serialises refreshes; readers only ever see whole snapshots.
+        self._lock = asyncio.Lock()
+        self._refresher: asyncio.Task[None] | None = None
+        self._subscribers: list[Callable[[CatalogueSnapshot], Any]] = []
+        self.last_error: str | None = None
+
+    # -- reading ------------------------------------------------------------
+
+    def snapshot(self) -> CatalogueSnapshot:
+        """Return the current catalogue.
+
+        Raises:
+            CatalogueUnavailableError: If Supabase is not configured or the
+                first load has not succeeded yet.
+        """
+        snapshot = self._snapshot
+        if snapshot is None:
+            if not self._db.configured:
+                raise CatalogueUnavailableError(
+                    "Supabase is not configured. Set NEXT_PUBLIC_SUPABASE_URL "
+                    "and SUPABASE_SERVICE_ROLE_KEY."
+                )
+            raise CatalogueUnavailableError("The track catalogue is not loaded yet")
+        return snapshot
+
+    def subscribe(self, callback: Callable[[CatalogueSnapshot], Any]) -> None:
+        """Call *callback* with every new version of the catalogue.
+
+        Callbacks run in a worker thread before the refresh returns,
+        which makes them the place to rebuild derived structures such as
+        search indexes off the request path. A callback that raises is
+        counted in ``featune_catalogue_subscriber_errors_total`` and does not
+        stop the others or fail the refresh.
+        """
+        self._subscribers.append(callback)
+
+    @property
+    def version(self) -> int:
+        """The current catalogue version (0 before the first load)."""
+        return self._version
+
+    # -- refreshing ---------------------------------------------------------
+
+    async def reload(self) -> CatalogueSnapshot:
+        """Replace the catalogue with a full fetch of the approved tracks.
+
+        Raises:
+            CatalogueUnavailableError: If Supabase is not configured.
+        """
+        async with self._lock:
+            self._reload_started_at = time.monotonic()
+            rows = await self._fetch(lambda query: query.eq("status", "approved"))
+            self._full_refresh_at = time.monotonic()
+            self._watermark = None
+            return await asyncio.to_thread(self._apply, rows, replace=True)
+
+    async def refresh(self) -> CatalogueSnapshot:
+        """Apply the rows changed since the last refresh.
+
+        Falls back to :meth:`reload` before the first load and once
+        ``CATALOGUE_FULL_REFRESH_SECONDS`` have passed since the last one.
+        """
+        if (
+            self._snapshot is None
+            or self._watermark is None
+            or time.monotonic() - self._full_refresh_at >= CATALOGUE_FULL_REFRESH_SECONDS
+        ):
+            return await self.reload()
+        async with self._lock:
+            # Boundary rows are refetched each time; unchanged rows do not
+            # bump the version.
+            since = f'"{self._watermark}"'
+            rows = await self._fetch(
+                lambda query: query.or_(f"updated_at.gte.{since},approved_at.gte.{since}")
+            )
+            return await asyncio.to_thread(self._apply, rows)
+
+    async def invalidate(self, track_ids: list[str] | None = None) -> CatalogueSnapshot:
+        """Refetch *track_ids* now, or reload everything when none are given.
+
+        Tracks that are no longer approved (or no longer exist) are dropped.
+        A full reload is shared with any other caller waiting for one, and
+        starts no sooner than ``CATALOGUE_MIN_RELOAD_SECONDS`` after the
+        previous one did, so repeated calls cannot hammer the database.
+        """
+        if not track_ids or self._snapshot is None:
+            if self._pending_reload is None or self._pending_reload.done():
+                self._pending_reload = asyncio.create_task(self._throttled_reload())
+            # Shielded: one caller going away must not cancel the others' reload
+            return await asyncio.shield(self._pending_reload)
+        async with self._lock:
+            wanted = set(track_ids)
+            rows = await self._fetch(lambda query: query.in_("id", sorted(wanted)))
+            found = {str(row["id"]) for row in rows}
+            return await asyncio.to_thread(self._apply, rows, removed=wanted - found)
+
+    async def _throttled_reload(self) -> CatalogueSnapshot:
+        delay = self._reload_started_at + CATALOGUE_MIN_RELOAD_SECONDS - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        # Callers arriving from now on need a reload that starts after them
+        self._pending_reload = None
+        return await self.reload()
+
+    async def _fetch(self, apply_filter: Callable[[Any], Any]) -> list[dict[str, Any]]:
+        rows: list[dict[str, Any]] = []
+        start = 0
+        while True:
+            try:
+                table = self._db.table("tracks")
+            except DatabaseUnavailableError as exc:
+                raise CatalogueUnavailableError(str(exc)) from None
+            query = apply_filter(table.select(_FIELDS))
+            response = await (
+                query.order("created_at")
+                .order("id")
+                .range(start, start + CATALOGUE_PAGE_SIZE - 1)
+                .execute()
+            )
+            page = response.data or []
+            rows.extend(page)
+            if len(page) < CATALOGUE_PAGE_SIZE:
+                return rows
+            start += CATALOGUE_PAGE_SIZE
+
+    def _apply(
+        self,
+        rows: list[dict[str, Any]],
+        removed: Iterable[str] = (),
+        replace: bool = False,
+    ) -> CatalogueSnapshot:
+        tracks = {} if replace else dict(self._tracks)
+        for track_id in removed:
+            tracks.pop(track_id, None)
+        watermark = self._watermark
+        for row in rows:
+            track_id = str(row["id"])
+            if row.get("status") == "approved":
+                tracks[track_id] = row
+            else:
+                tracks.pop(track_id, None)
+            for column in ("updated_at", "approved_at"):
+                stamp = row.get(column)
+                if stamp and (watermark is None or stamp > watermark):
+                    watermark = stamp
+        self._watermark = watermark
+
+        changed = self._snapshot is None or tracks != self._tracks
+        if changed:
+            self._version += 1
+            self._tracks = tracks
+            ordered = tuple(sorted(tracks.values(), key=_catalogue_order))
+        else:
+            ordered = self._snapshot.tracks
+        snapshot = self._snapshot = CatalogueSnapshot(self._version, ordered, time.time())
+        self.last_error = None
+        if changed:
+            for callback in self._subscribers:
+                try:
+                    callback(snapshot)
+                except Exception:
+                    # The snapshot stands; an index that failed to rebuild
+                    # here is rebuilt on its next use
+                    SUBSCRIBER_ERRORS.inc(1, _callback_name(callback))
+        return snapshot
+
+    # -- background refresh -------------------------------------------------
+
+    async def start(self, interval: float = CATALOGUE_REFRESH_SECONDS) -> None:
+        """Load the catalogue and keep refreshing it in the background.
+
+        A failed first load does not prevent startup; the refresher keeps
+        retrying and queries get :class:`CatalogueUnavailableError` until it
+        succeeds.
+        """
+        if not self._db.configured:
+            return
+        try:
+            await self.reload()
+        except Exception as exc:
+            self.last_error = str(exc)
+        self._refresher = asyncio.create_task(self._refresh_forever(interval))
+
+    async def stop(self) -> None:
+        """Stop the background refresher."""
+        if self._refresher is not None:
+            self._refresher.cancel()
+            try:
+                await self._refresher
+            except asyncio.CancelledError:
+                pass
+            self._refresher = None
+
+    async def _refresh_forever(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.refresh()
+            except Exception as exc:
+                # Keep serving the last good snapshot; retry next interval
+                self.last_error = str(exc)
+
+
+track_catalogue = TrackCatalogue()
@@ -0,0 +1,161 @@
+"""Shared, pooled access to the Supabase database.
+
+Building a Supabase client per request meant new HTTP connections (and a
+TLS handshake) before every query. Instead each API worker keeps one async
+PostgREST client for its whole lifetime: :meth:`Database.start` opens it
+from the app lifespan and :meth:`Database.stop` closes it, and in between
+its connections are kept alive and reused from a bounded pool. Requests are
+awaited, so database calls never block the event loop.
+
+Only PostgREST (table access) is needed server-side, so the client is the
+``postgrest`` package that ``supabase`` itself is built on, pointed at
+``<SUPABASE_URL>/rest/v1`` with the service-role key. The HTTP stack
+(httpx, h2, postgrest) is imported by :meth:`Database.start`, not with this
+module, so it stays off the API's import path at startup.
+
+Configuration (environment variables):
+    NEXT_PUBLIC_SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY: Supabase access.
+    SUPABASE_POOL_SIZE: Maximum open connections (default: 10).
+    SUPABASE_KEEPALIVE_SECONDS: How long an idle connection is kept
+        (default: 60).
+    SUPABASE_CONNECT_TIMEOUT: Seconds to establish a connection (default: 5).
+    SUPABASE_TIMEOUT: Seconds to wait for a response (default: 30).
+"""
+
+import hmac
+import os
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from postgrest import AsyncRequestBuilder
+
+SUPABASE_POOL_SIZE = int(os.environ.get("SUPABASE_POOL_SIZE", "10"))
+SUPABASE_KEEPALIVE_SECONDS = float(os.environ.get("SUPABASE_KEEPALIVE_SECONDS", "60"))
+SUPABASE_CONNECT_TIMEOUT = float(os.environ.get("SUPABASE_CONNECT_TIMEOUT", "5"))
+SUPABASE_TIMEOUT = float(os.environ.get("SUPABASE_TIMEOUT", "30"))
+
+
+class DatabaseUnavailableError(Exception):
+    """Raised when Supabase is not configured or the client is not started."""
+
+
+def _pooled_client(
+    base_url: str,
+    headers: dict[str, str],
+    pool_size: int,
+    keepalive: float,
+    connect_timeout: float,
+    timeout: float,
+) -> Any:
+    """Return a PostgREST client whose HTTP session uses explicit pool limits."""
+    import httpx
+    from postgrest import AsyncPostgrestClient
+
+    limits = httpx.Limits(
+        max_connections=pool_size,
+        max_keepalive_connections=pool_size,
+        keepalive_expiry=keepalive,
+    )
+
+    class PooledPostgrestClient(AsyncPostgrestClient):
+        def create_session(self, base_url, headers, timeout, verify=True, proxy=None):
+            return httpx.AsyncClient(
+                base_url=base_url,
+                headers=headers,
+                timeout=timeout,
+                verify=verify,
+                proxy=proxy,
+                limits=limits,
+                follow_redirects=True,
+                http2=True,
+            )
+
+    return PooledPostgrestClient(
+        base_url, headers=headers, timeout=httpx.Timeout(timeout, connect=connect_timeout)
+    )
+
+
+class Database:
+    """The worker's long-lived Supabase (PostgREST) client.
+
+    Args:
+        url: Supabase project URL; ``None`` leaves the database unconfigured.
+        key: Service-role key.
+        pool_size: Maximum open connections.
+        keepalive: Seconds an idle connection is kept for reuse.
+        connect_timeout: Seconds to establish a connection.
+        timeout: Seconds to wait for a response.
+    """
+
+    def __init__(
+        self,
+        url: str | None,
+        key: str | None,
+        pool_size: int = SUPABASE_POOL_SIZE,
+        keepalive: float = SUPABASE_KEEPALIVE_SECONDS,
+        connect_timeout: float = SUPABASE_CONNECT_TIMEOUT,
+        timeout: float = SUPABASE_TIMEOUT,
+    ) -> None:
+        self.url = url
+        self._key = key
+        self._pool_size = pool_size
+        self._keepalive = keepalive
+        self._connect_timeout = connect_timeout
+        self._timeout = timeout
+        self._client: Any = None
+
+    @property
+    def configured(self) -> bool:
+        """Whether a Supabase URL and key are set."""
+        return bool(self.url and self._key)
+
+    def is_service_key(self, token: str | None) -> bool:
+        """Whether *token* is the service-role key (compared in constant time).
+
+        Lets trusted server-side callers, such as the Next.js admin routes,
+        authenticate with the credential they already hold.
+        """
+        if not self._key or not token:
+            return False
+        return hmac.compare_digest(token.encode(), self._key.encode())
+
+    async def start(self) -> None:
+        """Open the client (connections are made on first use)."""
+        if not self.configured or self._client is not None:
+            return
+        self._client = _pooled_client(
+            f"{self.url.rstrip('/')}/rest/v1",
+            {"apiKey": self._key, "Authorization": f"Bearer {self._key}"},
+            self._pool_size,
+            self._keepalive,
+            self._connect_timeout,
+            self._timeout,
+        )
+
+    async def stop(self) -> None:
+        """Close the pooled connections."""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def table(self, name: str) -> "AsyncRequestBuilder":
+        """Start a query on table *name*; finish it with ``await ... .execute()``.
+
+        Raises:
+            DatabaseUnavailableError: If Supabase is not configured or the
+                client has not been started.
+        """
+        if self._client is None:
+            if not self.configured:
+                raise DatabaseUnavailableError(
+                    "Supabase is not configured. Set NEXT_PUBLIC_SUPABASE_URL "
+                    "and SUPABASE_SERVICE_ROLE_KEY."
+                )
+            raise DatabaseUnavailableError("The database client is not started")
+        return self._client.from_(name)
+
+
+database = Database(
+    os.environ.get("NEXT_PUBLIC_SUPABASE_URL"),
+    os.environ.get("SUPABASE_SERVICE_ROLE_KEY"),
+)
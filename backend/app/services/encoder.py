@@ -0,0 +1,279 @@
+"""Multi-rendition audio encoder.
+
+Feeds raw PCM to a single ffmpeg process through its stdin and lets ffmpeg
+produce every requested rendition (e.g. a low-bitrate MP3 plus an Opus
+stream) from that one pass. Nothing is written to disk except the final
+outputs — unlike ``AudioSegment.export``, which writes an intermediate WAV
+and spawns one ffmpeg per output.
+
+Besides single-file formats, the ``hls`` format writes a segmented rendition:
+a directory holding a VOD playlist (``index.m3u8``) and fixed-duration AAC
+segments referenced by relative URIs, so a player can fetch only the part the
+listener seeks to. The directory can be uploaded to storage as-is.
+
+Outputs are created in the managed artifact store
+(:mod:`app.services.store`). :func:`encode_to_bytes` instead keeps a single
+small rendition entirely in memory.
+
+Configuration (environment variables):
+    HLS_SEGMENT_SECONDS: Target duration of HLS segments (default: 6).
+"""
+
+import os
+import subprocess
+import tempfile
+from typing import NamedTuple
+
+import numpy as np
+from pydub import AudioSegment
+
+from app.services.executor import raise_if_cancelled
+from app.services.metrics import stage
+from app.services.store import artifact_store, path_size, remove_path
+
+
+class Rendition(NamedTuple):
+    """One encoded output.
+
+    Attributes:
+        name: Key of the rendition in results (e.g. ``"full_preview"``).
+        format: One of ``RENDITION_FORMATS``.
+        bitrate: ffmpeg bitrate string such as ``"128k"``.
+    """
+
+    name: str
+    format: str
+    bitrate: str
+
+
+# format -> (ffmpeg encoder, ffmpeg muxer, file suffix). The hls muxer
+# writes a directory rather than a single file (see _output_args).
+RENDITION_FORMATS: dict[str, tuple[str, str, str]] = {
+    "mp3": ("libmp3lame", "mp3", ".mp3"),
+    "opus": ("libopus", "ogg", ".opus"),
+    "aac": ("aac", "ipod", ".m4a"),
+    "hls": ("aac", "hls", ""),
+}
+
+HLS_SEGMENT_SECONDS = int(os.environ.get("HLS_SEGMENT_SECONDS", "6"))
+
+# Playlist file name inside an hls rendition's directory
+HLS_PLAYLIST_NAME = "index.m3u8"
+
+# Muxers that can write to a pipe (they never seek back to patch headers)
+_STREAMABLE_MUXERS = frozenset({"mp3", "ogg"})
+
+# pydub sample width (bytes) -> ffmpeg raw PCM format
+_PCM_FORMATS = {1: "s8", 2: "s16le", 4: "s32le"}
+
+# Bytes written to ffmpeg's stdin per write() call
+_WRITE_CHUNK = 1024 * 1024
+
+
+def _output_args(rendition: Rendition) -> tuple[str, list[str]]:
+    """Create the output location for *rendition* and its ffmpeg arguments.
+
+    Returns:
+        ``(path, args)`` where *path* is a file, or for ``hls`` a directory
+        containing the playlist and its segments.
+    """
+    codec, muxer, suffix = RENDITION_FORMATS[rendition.format]
+    args = ["-c:a", codec, "-b:a", rendition.bitrate, "-f", muxer]
+
+    if muxer == "hls":
+        path = artifact_store.new_dir(suffix="-hls")
+        args += [
+            "-hls_time", str(HLS_SEGMENT_SECONDS),
+            "-hls_playlist_type", "vod",
+            "-hls_segment_type", "mpegts",
+            "-hls_segment_filename", os.path.join(path, "segment_%05d.ts"),
+            os.path.join(path, HLS_PLAYLIST_NAME),
+        ]
+        return path, args
+
+    path = artifact_store.new_file(suffix=suffix)
+    if muxer == "ipod":
+        # Put the moov atom first so playback can start before the
+        # whole file has downloaded.
+        args += ["-movflags", "+faststart"]
+    return path, args + [path]
+
+
+def parse_renditions(spec: str) -> list[Rendition]:
+    """Parse ``"name=format:bitrate,..."`` into renditions.
+
+    Example: ``"full_preview=mp3:128k,full_preview_opus=opus:96k"``.
+
+    Raises:
+        ValueError: If the spec is malformed or names an unknown format.
+    """
+    renditions: list[Rendition] = []
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        try:
+            name, rest = item.split("=", 1)
+            fmt, bitrate = rest.split(":", 1)
+        except ValueError:
+            raise ValueError(f"Invalid rendition '{item}', expected name=format:bitrate") from None
+        if fmt not in RENDITION_FORMATS:
+            raise ValueError(
+                f"Unsupported rendition format '{fmt}'. Supported: {', '.join(sorted(RENDITION_FORMATS))}"
+            )
+        renditions.append(Rendition(name.strip(), fmt, bitrate.strip()))
+    if not renditions:
+        raise ValueError("At least one rendition is required")
+    return renditions
+
+
+def _pcm_input_args(sample_rate: int, channels: int, sample_width: int) -> list[str]:
+    return [
+        "-f", _PCM_FORMATS[sample_width],
+        "-ar", str(sample_rate),
+        "-ac", str(channels),
+        "-i", "-",
+    ]
+
+
+def bitrate_bps(bitrate: str) -> int:
+    """Convert an ffmpeg bitrate string such as ``"128k"`` to bits per second."""
+    multiplier = {"k": 1000, "M": 1000 * 1000}.get(bitrate[-1:], 1)
+    return int(float(bitrate.rstrip("kM")) * multiplier)
+
+
+class RenditionEncoder:
+    """Encode a PCM stream into several renditions with one ffmpeg process.
+
+    Use as a context manager: call :meth:`write` with PCM blocks, and the
+    rendition paths are available from :attr:`outputs` after the ``with``
+    block exits cleanly. On error the ffmpeg process is killed and partial
+    outputs are removed.
+    """
+
+    def __init__(
+        self,
+        renditions: list[Rendition],
+        sample_rate: int,
+        channels: int,
+        sample_width: int = 2,
+    ) -> None:
+        self.renditions = renditions
+        self.outputs: dict[str, str] = {}
+        self._input_args = _pcm_input_args(sample_rate, channels, sample_width)
+        self._process: subprocess.Popen | None = None
+
+    def __enter__(self) -> "RenditionEncoder":
+        self._stderr = tempfile.TemporaryFile()
+        command = [AudioSegment.converter, "-v", "error", "-y", *self._input_args]
+        try:
+            for rendition in self.renditions:
+                path, args = _output_args(rendition)
+                self.outputs[rendition.name] = path
+                command += args
+
+            self._process = subprocess.Popen(
+                command, stdin=subprocess.PIPE, stderr=self._stderr
+            )
+        except BaseException:
+            self._remove_outputs()
+            self._stderr.close()
+            raise
+        return self
+
+    def write(self, pcm: bytes | memoryview | np.ndarray) -> None:
+        """Send a block of interleaved PCM to the encoder.
+
+        Raises:
+            JobCancelledError: If the pool job was cancelled.
+        """
+        raise_if_cancelled()
+        if isinstance(pcm, np.ndarray):
+            pcm = memoryview(np.ascontiguousarray(pcm)).cast("B")
+        try:
+            self._process.stdin.write(pcm)
+        except BrokenPipeError:
+            self._process.wait()
+            raise self._failure() from None
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        try:
+            if exc_type is None:
+                self._finish()
+            else:
+                self._abort()
+        finally:
+            self._stderr.close()
+
+    def _finish(self) -> None:
+        try:
+            try:
+                self._process.stdin.close()
+            except BrokenPipeError:
+                pass
+            self._process.wait()
+            if self._process.returncode:
+                raise self._failure()
+        except BaseException:
+            self._abort()
+            raise
+
+    def _abort(self) -> None:
+        self._process.kill()
+        self._process.wait()
+        self._remove_outputs()
+
+    def _remove_outputs(self) -> None:
+        for path in self.outputs.values():
+            remove_path(path)
+        self.outputs = {}
+
+    def _failure(self) -> RuntimeError:
+        self._stderr.seek(0)
+        return RuntimeError(
+            f"ffmpeg encode failed with code {self._process.returncode}: "
+            f"{self._stderr.read().decode(errors='ignore')}"
+        )
+
+
+def encode_renditions(audio: AudioSegment, renditions: list[Rendition]) -> dict[str, str]:
+    """Encode *audio* into every rendition in one ffmpeg pass.
+
+    Returns:
+        Mapping of rendition name to output path (a directory for ``hls``).
+    """
+    with stage("encode", audio_seconds=audio.duration_seconds) as timer:
+        with RenditionEncoder(
+            renditions, audio.frame_rate, audio.channels, audio.sample_width
+        ) as encoder:
+            data = memoryview(audio.raw_data)
+            for start in range(0, len(data), _WRITE_CHUNK):
+                encoder.write(data[start:start + _WRITE_CHUNK])
+        timer.nbytes = sum(path_size(path) for path in encoder.outputs.values())
+    return encoder.outputs
+
+
+def encode_to_bytes(audio: AudioSegment, rendition: Rendition) -> bytes:
+    """Encode *audio* into one rendition held in memory, bypassing the disk.
+
+    Only formats whose muxer can write to a pipe (``mp3``, ``opus``) are
+    supported. Meant for small outputs; the result is returned whole.
+
+    Raises:
+        ValueError: If the format cannot be streamed.
+        RuntimeError: If ffmpeg fails.
+    """
+    codec, muxer, _suffix = RENDITION_FORMATS[rendition.format]
+    if muxer not in _STREAMABLE_MUXERS:
+        raise ValueError(f"Rendition format '{rendition.format}' cannot be encoded to memory")
+    command = [
+        AudioSegment.converter, "-v", "error", "-y",
+        *_pcm_input_args(audio.frame_rate, audio.channels, audio.sample_width),
+        "-c:a", codec, "-b:a", rendition.bitrate, "-f", muxer, "-",
+    ]
+    with stage("encode", audio_seconds=audio.duration_seconds) as timer:
+        result = subprocess.run(command, input=audio.raw_data, capture_output=True)
+        timer.nbytes = len(result.stdout)
+    if result.returncode:
+        raise RuntimeError(
+            f"ffmpeg encode failed with code {result.returncode}: "
+            f"{result.stderr.decode(errors='ignore')}"
+        )
+    return result.stdout
@@ -0,0 +1,525 @@
+"""Bounded process pool for CPU-bound audio work.
+
+pydub and ffmpeg calls block for seconds at a time. Running them
+directly inside ``async def`` handlers freezes the event loop, so every
+processing endpoint hands its work to this pool instead. The pool is
+started and stopped by the FastAPI lifespan in ``app.main``.
+
+Every job is wrapped by :func:`app.services.metrics.run_job`, so its run
+time, peak memory and stage timings are recorded in the API process.
+
+Worker processes are started on demand and each runs
+:func:`app.services.warmup.warm_worker` first, which imports the audio stack
+and runs a tiny waveform/watermark job. :meth:`AudioPool.warm_up` starts
+every worker ahead of traffic (see :mod:`app.services.warmup`).
+
+Jobs are scheduled in two lanes, each with its own concurrency limit and
+queue, so a few long uploads cannot set the latency of quick requests:
+
+* ``interactive`` (waveforms, clip previews) may use every worker and is
+  always handed the next free worker first.
+* ``bulk`` (full upload processing, watermarking, background jobs) may only
+  occupy ``AUDIO_POOL_BULK_WORKERS`` workers at once, keeping the rest free
+  for interactive work.
+
+A job is only handed to the executor once a worker is free for it, so the
+executor's own FIFO queue never holds interactive work behind bulk work.
+
+A job is cancelled by cancelling the task awaiting :meth:`AudioPool.run`
+(the processing router does so when the client disconnects or the request
+deadline passes). A job that has not started is dropped; a running one is
+interrupted in its worker: the cancel signal only flags the job and kills
+its ffmpeg processes. The job then stops at the next block boundary, where
+it calls :func:`raise_if_cancelled`, or fails on its killed ffmpeg pipe,
+and the worker stays in the pool for the next one.
+
+Configuration (environment variables):
+    AUDIO_POOL_WORKERS: Number of worker processes (default: CPU count).
+    AUDIO_POOL_BULK_WORKERS: Workers bulk jobs may occupy at once
+        (default: workers - 1, at least 1).
+    AUDIO_POOL_QUEUE_LIMIT: Interactive jobs allowed to wait for a free
+        worker before new submissions are rejected (default: 2 x workers).
+    AUDIO_POOL_BULK_QUEUE_LIMIT: Bulk jobs allowed to wait for a free
+        worker (default: AUDIO_POOL_QUEUE_LIMIT).
+"""
+
+import asyncio
+import collections
+import multiprocessing
+import os
+import shutil
+import signal
+import tempfile
+import time
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, TypeVar
+
+from app.services.metrics import record_job, register_gauge, run_job
+
+T = TypeVar("T")
+
+AUDIO_POOL_WORKERS = int(os.environ.get("AUDIO_POOL_WORKERS", str(os.cpu_count() or 1)))
+AUDIO_POOL_BULK_WORKERS = int(
+    os.environ.get("AUDIO_POOL_BULK_WORKERS", str(max(1, AUDIO_POOL_WORKERS - 1)))
+)
+AUDIO_POOL_QUEUE_LIMIT = int(
+    os.environ.get("AUDIO_POOL_QUEUE_LIMIT", str(2 * AUDIO_POOL_WORKERS))
+)
+AUDIO_POOL_BULK_QUEUE_LIMIT = int(
+    os.environ.get("AUDIO_POOL_BULK_QUEUE_LIMIT", str(AUDIO_POOL_QUEUE_LIMIT))
+)
+
+# Scheduling lanes.
+INTERACTIVE = "interactive"
+BULK = "bulk"
+
+# Sent to a worker to interrupt the job it is running.
+_CANCEL_SIGNAL = signal.SIGUSR1
+# Suffix of the marker file that flags a job's ticket as cancelled.
+_CANCELLED = ".cancelled"
+
+
+class PoolSaturatedError(Exception):
+    """Raised when the pool's workers and queue are all occupied."""
+
+
+class PoolUnavailableError(Exception):
+    """Raised when the pool has not been started or has shut down."""
+
+
+class JobCancelledError(Exception):
+    """Raised in a worker when the job it is running is cancelled."""
+
+
+# ---------------------------------------------------------------------------
+# Worker side
+# ---------------------------------------------------------------------------
+
+# Ticket of the job this worker is running, if any.
+_current_ticket: str | None = None
+# Set by the cancel signal while the running job is cancelled.
+_cancel_requested = False
+
+
+def _child_pids() -> list[int]:
+    """Return the pids of this process's children (ffmpeg), via ``/proc``."""
+    me = os.getpid()
+    pids = []
+    try:
+        entries = os.listdir("/proc")
+    except OSError:
+        return pids
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # The parent pid is the second field after the parenthesised command
+        fields = stat.rsplit(")", 1)[-1].split()
+        if len(fields) > 1 and fields[1] == str(me):
+            pids.append(int(entry))
+    return pids
+
+
+def _kill_children() -> None:
+    for pid in _child_pids():
+        try:
+            os.kill(pid, signal.SIGKILL)
+        except OSError:
+            pass
+
+
+def _on_cancel_signal(signum: int, frame: Any) -> None:
+    # Raising here would unwind the job at whatever bytecode it is on,
+    # possibly inside a finally block or while holding a lock, so only flag
+    # it and stop ffmpeg. A late signal for a finished job is ignored.
+    global _cancel_requested
+    ticket = _current_ticket
+    if ticket is not None and os.path.exists(ticket + _CANCELLED):
+        _cancel_requested = True
+        _kill_children()
+
+
+def raise_if_cancelled() -> None:
+    """Raise :class:`JobCancelledError` if the job running here was cancelled.
+
+    Job code calls this between blocks of work, where stopping leaves
+    nothing half done. Outside a pool worker it never raises.
+    """
+    if _cancel_requested:
+        raise JobCancelledError("job cancelled")
+
+
+def _init_worker() -> None:
+    # Imported here: warmup itself uses the pool singleton below
+    from app.services.warmup import warm_worker
+
+    signal.signal(_CANCEL_SIGNAL, _on_cancel_signal)
+    warm_worker()
+
+
+def _run_ticketed(ticket: str, fn: Callable[..., T], args: tuple, kwargs: dict) -> tuple:
+    """Run a job through :func:`run_job` under a cancellation ticket.
+
+    The ticket file records which worker runs the job, so the API process
+    can signal it. The worker writes it before checking for the cancelled
+    marker and the API process writes the marker before reading it, so a
+    cancellation is seen by one side or the other.
+
+    Once the job is flagged as cancelled, any error it ends with (an
+    ffmpeg pipe closed by the kill, most likely) is reported as
+    :class:`JobCancelledError`.
+    """
+    global _current_ticket, _cancel_requested
+    with open(ticket, "w") as f:
+        f.write(str(os.getpid()))
+    _cancel_requested = False
+    _current_ticket = ticket
+    try:
+        if os.path.exists(ticket + _CANCELLED):
+            raise JobCancelledError("job cancelled before it started")
+        result = run_job(fn, args, kwargs)
+        raise_if_cancelled()
+        return result
+    except JobCancelledError:
+        # Also catch ffmpeg processes started after the signal
+        _kill_children()
+        raise
+    except Exception as exc:
+        if not _cancel_requested:
+            raise
+        _kill_children()
+        raise JobCancelledError("job cancelled") from exc
+    finally:
+        _current_ticket = None
+        _cancel_requested = False
+
+
+def _worker_pid() -> int:
+    # Hold the worker briefly so the other workers pick up the siblings
+    time.sleep(0.05)
+    return os.getpid()
+
+
+# ---------------------------------------------------------------------------
+# API side
+# ---------------------------------------------------------------------------
+
+class _Lane:
+    """Concurrency limit and FIFO queue of one scheduling lane."""
+
+    def __init__(self, name: str, concurrency: int, queue_limit: int) -> None:
+        self.name = name
+        self.concurrency = max(1, concurrency)
+        self.queue_limit = max(0, queue_limit)
+        self.running = 0
+        self.waiting: collections.deque[asyncio.Future[None]] = collections.deque()
+
+
+class AudioPool:
+    """A process pool with priority lanes that rejects work instead of queueing without bound.
+
+    Args:
+        max_workers: Number of worker processes.
+        queue_limit: Interactive jobs allowed to wait for a free worker.
+        initializer: Run once in every new worker process, including
+            replacements for crashed ones.
+        bulk_workers: Workers bulk jobs may occupy at once (default: all
+            but one).
+        bulk_queue_limit: Bulk jobs allowed to wait for a free worker
+            (default: *queue_limit*).
+    """
+
+    def __init__(
+        self,
+        max_workers: int,
+        queue_limit: int,
+        initializer: Callable[[], None] | None = None,
+        bulk_workers: int | None = None,
+        bulk_queue_limit: int | None = None,
+    ) -> None:
+        self.max_workers = max(1, max_workers)
+        if bulk_workers is None:
+            bulk_workers = self.max_workers - 1
+        if bulk_queue_limit is None:
+            bulk_queue_limit = queue_limit
+        self._lanes = {
+            INTERACTIVE: _Lane(INTERACTIVE, self.max_workers, queue_limit),
+            BULK: _Lane(BULK, min(bulk_workers, self.max_workers), bulk_queue_limit),
+        }
+        self._initializer = initializer
+        self._executor: ProcessPoolExecutor | None = None
+        self._ticket_dir: str | None = None
+        self._running = 0
+
+    @property
+    def capacity(self) -> int:
+        """Maximum number of running plus queued jobs."""
+        return self.max_workers + sum(lane.queue_limit for lane in self._lanes.values())
+
+    @property
+    def in_flight(self) -> int:
+        """Number of jobs currently running or waiting for a worker."""
+        return self._running + sum(len(lane.waiting) for lane in self._lanes.values())
+
+    def lane_stats(self) -> dict[str, dict[str, int]]:
+        """Return ``{lane: {"running", "queued", "concurrency", "queue_limit"}}``."""
+        return {
+            name: {
+                "running": lane.running,
+                "queued": len(lane.waiting),
+                "concurrency": lane.concurrency,
+                "queue_limit": lane.queue_limit,
+            }
+            for name, lane in self._lanes.items()
+        }
+
+    def start(self) -> None:
+        """Start the worker processes (idempotent)."""
+        if self._ticket_dir is None:
+            self._ticket_dir = tempfile.mkdtemp(prefix="featune-pool-")
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=self._initializer,
+            )
+
+    def shutdown(self) -> None:
+        """Stop the workers, cancelling jobs that have not started yet."""
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+        ticket_dir, self._ticket_dir = self._ticket_dir, None
+        if ticket_dir is not None:
+            shutil.rmtree(ticket_dir, ignore_errors=True)
+
+    def ensure_capacity(self, lane: str = BULK) -> None:
+        """Raise immediately if a new job in *lane* would be rejected.
+
+        Lets handlers fail fast before doing any work of their own.
+
+        Raises:
+            PoolUnavailableError: If the pool is not running.
+            PoolSaturatedError: If the lane's workers and queue are all taken.
+        """
+        if self._executor is None:
+            raise PoolUnavailableError("audio processing pool is not running")
+        state = self._lanes[lane]
+        if not self._can_start(state) and len(state.waiting) >= state.queue_limit:
+            raise PoolSaturatedError(
+                f"audio processing pool is saturated ({state.running} {lane} jobs "
+                f"running, {len(state.waiting)} queued)"
+            )
+
+    async def run(self, fn: Callable[..., T], *args: Any, lane: str = BULK, **kwargs: Any) -> T:
+        """Run ``fn(*args, **kwargs)`` in a worker process and await the result.
+
+        Cancelling the awaiting task cancels the job, killing its ffmpeg
+        processes if it is already running.
+
+        Args:
+            fn: A picklable module-level function.
+            lane: ``"interactive"`` or ``"bulk"``.
+
+        Raises:
+            PoolUnavailableError: If the pool is not running or a worker died.
+            PoolSaturatedError: If the lane's workers and queue are all taken.
+        """
+        self.ensure_capacity(lane)
+        state = self._lanes[lane]
+        await self._acquire(state)
+
+        executor = self._executor
+        if executor is None:
+            self._release(state)
+            raise PoolUnavailableError("audio processing pool is not running")
+        ticket = os.path.join(self._ticket_dir, uuid.uuid4().hex)
+        start = time.perf_counter()
+        try:
+            future = executor.submit(_run_ticketed, ticket, fn, args, kwargs)
+        except BrokenProcessPool as exc:
+            self._release(state)
+            self._restart(executor)
+            raise PoolUnavailableError("audio processing worker crashed") from exc
+        except RuntimeError as exc:
+            # Shut down since the slot was granted
+            self._release(state)
+            raise PoolUnavailableError("audio processing pool is not running") from exc
+
+        # The slot is only released once the worker is actually free again,
+        # even when the awaiting task was cancelled long before.
+        loop = asyncio.get_running_loop()
+        future.add_done_callback(lambda _: self._finished_threadsafe(loop, state, ticket))
+        try:
+            result, report = await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            self._cancel(future, ticket)
+            raise
+        except BrokenProcessPool as exc:
+            # A worker was killed (e.g. OOM). Replace the pool so later
+            # requests can succeed, and report this one as unavailable.
+            self._restart(executor)
+            raise PoolUnavailableError("audio processing worker crashed") from exc
+        record_job(report, time.perf_counter() - start)
+        return result
+
+    async def warm_up(self) -> None:
+        """Start every worker and wait until each has run the initializer.
+
+        Workers are otherwise started by the first jobs that need them,
+        which would then pay for process start-up and the initializer.
+
+        Raises:
+            PoolUnavailableError: If the pool is not running or a worker died.
+        """
+        seen: set[int] = set()
+        while len(seen) < self.max_workers:
+            executor = self._executor
+            if executor is None:
+                raise PoolUnavailableError("audio processing pool is not running")
+            try:
+                # A worker only takes jobs once its initializer has finished
+                pids = await asyncio.gather(*(
+                    self._probe(executor) for _ in range(self.max_workers)
+                ))
+            except BrokenProcessPool as exc:
+                self._restart(executor)
+                raise PoolUnavailableError("audio processing worker crashed") from exc
+            seen.update(pids)
+
+    async def _probe(self, executor: ProcessPoolExecutor) -> int:
+        """Run :func:`_worker_pid` on a free worker and return its pid.
+
+        Takes an interactive slot like any job, so requests arriving during
+        warm-up are scheduled around the probes rather than queued behind
+        them in the executor. Probes skip the queue limit: they are few and
+        brief, and warm-up should not fail because traffic arrived first.
+        """
+        lane = self._lanes[INTERACTIVE]
+        await self._acquire(lane)
+        try:
+            return await asyncio.get_running_loop().run_in_executor(executor, _worker_pid)
+        finally:
+            self._release(lane)
+
+    def _restart(self, broken: ProcessPoolExecutor) -> None:
+        # Several jobs can fail on the same broken pool; only replace it once.
+        if self._executor is not broken:
+            return
+        self._executor = None
+        broken.shutdown(wait=False, cancel_futures=True)
+        self.start()
+
+    # -- lane scheduling ----------------------------------------------------
+
+    def _can_start(self, lane: _Lane) -> bool:
+        return self._running < self.max_workers and lane.running < lane.concurrency
+
+    async def _acquire(self, lane: _Lane) -> None:
+        """Wait until *lane* may start a job on a free worker, and take the slot."""
+        if not lane.waiting and self._can_start(lane):
+            lane.running += 1
+            self._running += 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        lane.waiting.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # Granted just as the caller gave up: pass the slot on
+                self._release(lane)
+            elif waiter in lane.waiting:
+                lane.waiting.remove(waiter)
+            raise
+
+    def _release(self, lane: _Lane) -> None:
+        lane.running -= 1
+        self._running -= 1
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        """Hand free workers to waiting jobs, interactive ones first."""
+        for lane in (self._lanes[INTERACTIVE], self._lanes[BULK]):
+            while lane.waiting and self._can_start(lane):
+                waiter = lane.waiting.popleft()
+                if waiter.cancelled():
+                    continue
+                lane.running += 1
+                self._running += 1
+                waiter.set_result(None)
+
+    def _finished_threadsafe(
+        self, loop: asyncio.AbstractEventLoop, lane: _Lane, ticket: str
+    ) -> None:
+        # Called from the executor's management thread
+        try:
+            loop.call_soon_threadsafe(self._finished, lane, ticket)
+        except RuntimeError:
+            pass  # the loop is closed: the process is shutting down
+
+    def _finished(self, lane: _Lane, ticket: str) -> None:
+        self._release(lane)
+        for path in (ticket, ticket + _CANCELLED):
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+
+    @staticmethod
+    def _cancel(future: Future, ticket: str) -> None:
+        """Drop a job that has not started, or interrupt its worker."""
+        if future.cancel():
+            return
+        try:
+            with open(ticket + _CANCELLED, "w"):
+                pass
+        except OSError:
+            return  # the pool has shut down
+        try:
+            with open(ticket) as f:
+                pid = int(f.read())
+        except (OSError, ValueError):
+            return  # not started yet: the worker will see the marker
+        try:
+            os.kill(pid, _CANCEL_SIGNAL)
+        except OSError:
+            pass
+
+
+audio_pool = AudioPool(
+    AUDIO_POOL_WORKERS,
+    AUDIO_POOL_QUEUE_LIMIT,
+    initializer=_init_worker,
+    bulk_workers=AUDIO_POOL_BULK_WORKERS,
+    bulk_queue_limit=AUDIO_POOL_BULK_QUEUE_LIMIT,
+)
+
+register_gauge(
+    "featune_audio_pool_in_flight",
+    "Audio pool jobs running or waiting for a worker.",
+    lambda: audio_pool.in_flight,
+)
+register_gauge(
+    "featune_audio_pool_capacity",
+    "Audio pool jobs allowed in flight before new ones are rejected.",
+    lambda: audio_pool.capacity,
+)
+register_gauge(
+    "featune_audio_pool_lane_running",
+    "Audio pool jobs running, per scheduling lane.",
+    lambda: {(name,): stats["running"] for name, stats in audio_pool.lane_stats().items()},
+    labels=("lane",),
+)
+register_gauge(
+    "featune_audio_pool_lane_queued",
+    "Audio pool jobs waiting for a worker, per scheduling lane.",
+    lambda: {(name,): stats["queued"] for name, stats in audio_pool.lane_stats().items()},
+    labels=("lane",),
+)
@@ -0,0 +1,399 @@
+"""Persistent background jobs for upload processing.
+
+``POST /process/jobs`` stores the upload in a job directory and returns
+immediately; a :class:`JobWorker` running inside the API process feeds
+queued jobs to the audio process pool's bulk lane. Job state lives in
+``<JOBS_DIR>/<job_id>/job.json`` and is rewritten atomically at every
+transition (and at every pipeline stage, from inside the worker process),
+so any API worker can answer status polls and unfinished jobs are picked
+up again after a restart.
+
+Several API workers may share ``JOBS_DIR``. Whoever runs a job holds an
+exclusive lock on it, which the OS releases if that process dies, so every
+``_RECOVERY_INTERVAL`` each worker also takes over unfinished jobs that
+nobody holds and that have not changed for that long: the jobs of a worker
+that died, whether queued or running.
+
+Configuration (environment variables):
+    JOBS_DIR: Root directory for job state (default: <tmp>/featune-jobs).
+    JOB_QUEUE_LIMIT: Maximum number of unfinished jobs per API worker
+        (default: 100).
+    JOB_RETENTION_SECONDS: How long finished jobs and their outputs are
+        kept (default: 1 day). Expired jobs are pruned hourly.
+"""
+
+import asyncio
+import fcntl
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+import uuid
+from typing import Any
+
+from app.services.executor import BULK, AudioPool, PoolSaturatedError, audio_pool
+from app.services.pipeline import UPLOAD_STAGES, process_upload_audio
+
+JOBS_DIR = os.environ.get("JOBS_DIR", os.path.join(tempfile.gettempdir(), "featune-jobs"))
+JOB_QUEUE_LIMIT = int(os.environ.get("JOB_QUEUE_LIMIT", "100"))
+JOB_RETENTION_SECONDS = int(os.environ.get("JOB_RETENTION_SECONDS", str(24 * 60 * 60)))
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+UNFINISHED_STATUSES = frozenset({JOB_QUEUED, JOB_RUNNING})
+
+# Seconds to wait before resubmitting a job when the pool is saturated.
+_POOL_RETRY_DELAY = 1.0
+
+# Seconds between prune_jobs runs.
+_PRUNE_INTERVAL = 60 * 60
+
+# Seconds between scans for abandoned jobs, and how long an unfinished job
+# must have gone unchanged before it is taken over.
+_RECOVERY_INTERVAL = 60
+
+_JOB_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+
+
+class JobNotFoundError(Exception):
+    """Raised when a job id is unknown (or malformed)."""
+
+
+class JobQueueFullError(Exception):
+    """Raised when a worker already holds ``JOB_QUEUE_LIMIT`` unfinished jobs."""
+
+
+# ---------------------------------------------------------------------------
+# Job state on disk
+# ---------------------------------------------------------------------------
+
+def _job_dir(job_id: str) -> str:
+    if not _JOB_ID_RE.match(job_id):
+        raise JobNotFoundError(f"Job not found: {job_id}")
+    return os.path.join(JOBS_DIR, job_id)
+
+
+def _write_job(job: dict[str, Any]) -> None:
+    """Atomically replace the job's state file."""
+    job["updated_at"] = time.time()
+    job_dir = _job_dir(job["id"])
+    fd, tmp_path = tempfile.mkstemp(dir=job_dir, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(job, f)
+        os.replace(tmp_path, os.path.join(job_dir, "job.json"))
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def read_job(job_id: str) -> dict[str, Any]:
+    """Return the stored state of *job_id*.
+
+    Raises:
+        JobNotFoundError: If the job does not exist.
+    """
+    try:
+        with open(os.path.join(_job_dir(job_id), "job.json")) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        raise JobNotFoundError(f"Job not found: {job_id}") from None
+
+
+def update_job(job_id: str, **fields: Any) -> dict[str, Any]:
+    """Merge *fields* into the stored job state and return the new state."""
+    job = read_job(job_id)
+    job.update(fields)
+    _write_job(job)
+    return job
+
+
+def _list_jobs() -> list[dict[str, Any]]:
+    jobs: list[dict[str, Any]] = []
+    if not os.path.isdir(JOBS_DIR):
+        return jobs
+    for entry in os.scandir(JOBS_DIR):
+        if not entry.is_dir():
+            continue
+        try:
+            jobs.append(read_job(entry.name))
+        except (JobNotFoundError, json.JSONDecodeError):
+            continue
+    return jobs
+
+
+def create_job(input_path: str, params: dict[str, Any]) -> dict[str, Any]:
+    """Create a queued job that takes ownership of *input_path*.
+
+    The input file is moved into the job directory so it survives restarts.
+    """
+    job_id = uuid.uuid4().hex
+    job_dir = _job_dir(job_id)
+    os.makedirs(job_dir)
+
+    stored_input = os.path.join(job_dir, "input" + os.path.splitext(input_path)[1])
+    shutil.move(input_path, stored_input)
+
+    now = time.time()
+    job: dict[str, Any] = {
+        "id": job_id,
+        "status": JOB_QUEUED,
+        "stage": None,
+        "progress": 0.0,
+        "stages": {stage: "pending" for stage in UPLOAD_STAGES},
+        "params": params,
+        "input_path": stored_input,
+        "result": None,
+        "error": None,
+        "created_at": now,
+        "started_at": None,
+        "finished_at": None,
+    }
+    _write_job(job)
+    return job
+
+
+def delete_job(job_id: str) -> None:
+    """Remove a job and its directory."""
+    shutil.rmtree(_job_dir(job_id), ignore_errors=True)
+
+
+def prune_jobs(max_age: float = JOB_RETENTION_SECONDS) -> int:
+    """Delete finished jobs older than *max_age* seconds; return how many."""
+    cutoff = time.time() - max_age
+    pruned = 0
+    for job in _list_jobs():
+        if job["status"] not in UNFINISHED_STATUSES and (job["finished_at"] or 0) < cutoff:
+            delete_job(job["id"])
+            pruned += 1
+    return pruned
+
+
+def _is_claimed(job_id: str) -> bool:
+    """Return whether some process holds *job_id*'s lock (see ``JobWorker._process``)."""
+    try:
+        fd = os.open(os.path.join(_job_dir(job_id), "lock"), os.O_CREAT | os.O_RDWR)
+    except (FileNotFoundError, JobNotFoundError):
+        return True  # deleted meanwhile: nothing to take over
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        return True
+    finally:
+        # Closing the descriptor also releases a lock just taken
+        os.close(fd)
+    return False
+
+
+def abandoned_jobs(exclude: set[str], limit: int) -> list[str]:
+    """Return up to *limit* ids of unfinished jobs nobody is working on.
+
+    A job qualifies when it is not in *exclude*, has not been updated for
+    ``_RECOVERY_INTERVAL`` seconds (so jobs just queued by another worker
+    are left to it) and no process holds its lock. A job whose worker died
+    while running it qualifies as soon as that interval has passed; one
+    still running elsewhere, however long it takes, stays locked.
+    """
+    cutoff = time.time() - _RECOVERY_INTERVAL
+    found: list[str] = []
+    for job in sorted(_list_jobs(), key=lambda j: j["created_at"]):
+        if len(found) >= limit:
+            break
+        if (
+            job["status"] in UNFINISHED_STATUSES
+            and job["id"] not in exclude
+            and job.get("updated_at", 0) < cutoff
+            and not _is_claimed(job["id"])
+        ):
+            found.append(job["id"])
+    return found
+
+
+def public_job_view(job: dict[str, Any]) -> dict[str, Any]:
+    """Return the job fields that are safe to expose over HTTP."""
+    return {
+        "job_id": job["id"],
+        "status": job["status"],
+        "stage": job["stage"],
+        "progress": job["progress"],
+        "stages": job["stages"],
+        "error": job["error"],
+        "created_at": job["created_at"],
+        "started_at": job["started_at"],
+        "finished_at": job["finished_at"],
+    }
+
+
+# ---------------------------------------------------------------------------
+# Job execution (runs inside a pool worker process)
+# ---------------------------------------------------------------------------
+
+def run_upload_job(job_id: str) -> dict[str, Any]:
+    """Run the upload pipeline for *job_id*, recording per-stage progress."""
+    job = read_job(job_id)
+    params = job["params"]
+    stages = dict.fromkeys(UPLOAD_STAGES, "pending")
+
+    def progress(stage: str) -> None:
+        index = UPLOAD_STAGES.index(stage)
+        for done in UPLOAD_STAGES[:index]:
+            stages[done] = "done"
+        stages[stage] = "running"
+        update_job(
+            job_id,
+            stage=stage,
+            stages=dict(stages),
+            progress=round(index / len(UPLOAD_STAGES), 2),
+        )
+
+    result = process_upload_audio(
+        job["input_path"],
+        params["tag_path"],
+        preview_clip_start=params["preview_clip_start"],
+        clip_duration=params["clip_duration"],
+        progress=progress,
+    )
+
+    # Outputs live with the job, so pruning the job removes them too.
+    output_dir = os.path.join(_job_dir(job_id), "outputs")
+    os.makedirs(output_dir, exist_ok=True)
+    for key, src in list(result.items()):
+        if key.endswith("_path"):
+            dst = os.path.join(output_dir, key.removesuffix("_path") + os.path.splitext(src)[1])
+            shutil.move(src, dst)
+            result[key] = dst
+    return result
+
+
+# ---------------------------------------------------------------------------
+# Worker (runs in the API process)
+# ---------------------------------------------------------------------------
+
+class JobWorker:
+    """Feeds queued jobs to the audio pool, *concurrency* at a time."""
+
+    def __init__(self, pool: AudioPool, concurrency: int) -> None:
+        self._pool = pool
+        self._concurrency = max(1, concurrency)
+        self._queue: asyncio.Queue[str] = asyncio.Queue()
+        self._tasks: list[asyncio.Task[None]] = []
+        self._pending: set[str] = set()
+
+    @property
+    def pending(self) -> int:
+        """Number of jobs queued or running in this worker."""
+        return len(self._pending)
+
+    def ensure_capacity(self) -> None:
+        """Raise :class:`JobQueueFullError` if no more jobs can be accepted."""
+        if len(self._pending) >= JOB_QUEUE_LIMIT:
+            raise JobQueueFullError(f"Too many unfinished jobs (limit {JOB_QUEUE_LIMIT})")
+
+    async def start(self) -> None:
+        """Prune old jobs, re-queue unfinished ones and start consuming."""
+        self._queue = asyncio.Queue()
+        self._pending.clear()
+        prune_jobs()
+        for job in sorted(_list_jobs(), key=lambda j: j["created_at"]):
+            if job["status"] in UNFINISHED_STATUSES:
+                self.submit(job["id"])
+        self._tasks = [
+            asyncio.create_task(self._consume()) for _ in range(self._concurrency)
+        ]
+        self._tasks.append(asyncio.create_task(self._maintain_periodically()))
+
+    async def stop(self) -> None:
+        """Stop consuming; interrupted jobs stay queued on disk."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, job_id: str) -> None:
+        """Queue *job_id* for processing."""
+        self._pending.add(job_id)
+        self._queue.put_nowait(job_id)
+
+    async def _maintain_periodically(self) -> None:
+        """Take over abandoned jobs and prune expired ones."""
+        next_prune = time.monotonic() + _PRUNE_INTERVAL
+        while True:
+            await asyncio.sleep(_RECOVERY_INTERVAL)
+            try:
+                for job_id in await asyncio.to_thread(
+                    abandoned_jobs, set(self._pending), JOB_QUEUE_LIMIT - len(self._pending)
+                ):
+                    if job_id not in self._pending:
+                        self.submit(job_id)
+                if time.monotonic() >= next_prune:
+                    next_prune = time.monotonic() + _PRUNE_INTERVAL
+                    await asyncio.to_thread(prune_jobs)
+            except OSError:
+                # A transient filesystem error must not stop maintenance
+                continue
+
+    async def _consume(self) -> None:
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._process(job_id)
+            finally:
+                self._pending.discard(job_id)
+                self._queue.task_done()
+
+    async def _process(self, job_id: str) -> None:
+        # Several API workers may share JOBS_DIR; an exclusive lock on the
+        # job makes sure only one of them runs it. The lock is released
+        # automatically if this process dies.
+        try:
+            lock_fd = os.open(os.path.join(_job_dir(job_id), "lock"), os.O_CREAT | os.O_RDWR)
+        except (FileNotFoundError, JobNotFoundError):
+            return
+        try:
+            try:
+                fcntl.flock(lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return
+            job = read_job(job_id)
+            if job["status"] not in UNFINISHED_STATUSES:
+                return
+            await self._execute(job_id)
+        finally:
+            os.close(lock_fd)
+
+    async def _execute(self, job_id: str) -> None:
+        job = update_job(job_id, status=JOB_RUNNING, started_at=time.time(), error=None)
+        try:
+            while True:
+                try:
+                    result = await self._pool.run(run_upload_job, job_id, lane=BULK)
+                    break
+                except PoolSaturatedError:
+                    await asyncio.sleep(_POOL_RETRY_DELAY)
+        except asyncio.CancelledError:
+            # Shutting down: leave the job for the next process to pick up.
+            update_job(job_id, status=JOB_QUEUED)
+            raise
+        except Exception as exc:
+            update_job(job_id, status=JOB_FAILED, error=str(exc), finished_at=time.time())
+        else:
+            update_job(
+                job_id,
+                status=JOB_SUCCEEDED,
+                stage=None,
+                stages=dict.fromkeys(UPLOAD_STAGES, "done"),
+                progress=1.0,
+                result=result,
+                finished_at=time.time(),
+            )
+
+        if os.path.isfile(job["input_path"]):
+            os.unlink(job["input_path"])
+
+
+job_worker = JobWorker(audio_pool, concurrency=audio_pool.lane_stats()[BULK]["concurrency"])
@@ -0,0 +1,498 @@
+"""Performance instrumentation exposed in Prometheus text format.
+
+Processing code wraps each expensive step in :func:`stage`::
+
+    with stage("decode", nbytes=os.path.getsize(path)) as timer:
+        audio = ...
+        timer.audio_seconds = len(audio) / 1000
+
+which records the wall time in the ``featune_stage_seconds`` histogram and
+adds the bytes and seconds of audio handled to per-stage counters, so
+``featune_stage_realtime_factor`` (audio seconds per wall-second) can be
+read straight off ``/metrics``.
+
+Most stages run in the audio pool's worker processes, whose counters the
+API process cannot see. :func:`run_job` therefore wraps every pool job: it
+buffers the job's stage timings, measures its wall time and peak RSS, and
+returns them alongside the result for :func:`record_job` to replay in the
+API process. Replayed stages land in the histograms and, when the job was
+awaited by a request, in that request's ``Server-Timing`` header.
+
+:class:`MetricsMiddleware` adds per-route request latency histograms,
+in-flight gauges and (when ``SERVER_TIMING`` is set) a ``Server-Timing``
+header listing the stages the request spent time in. Other state (pool
+occupancy, store usage, cache counters) is sampled through callbacks
+registered with :func:`register_gauge` when ``/metrics`` is scraped.
+
+Configuration (environment variables):
+    SERVER_TIMING: Set to 1 to add a Server-Timing header to responses
+        (default: off).
+"""
+
+import contextvars
+import os
+import resource
+import threading
+import time
+from typing import Any, Callable, Iterable, NamedTuple
+
+SERVER_TIMING = os.environ.get("SERVER_TIMING", "").lower() in ("1", "true", "yes")
+
+# Latency buckets in seconds, from a cached chat query to a long upload.
+LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0,
+)
+# Peak RSS buckets in bytes, 64 MiB to 8 GiB.
+MEMORY_BUCKETS = tuple(float(64 * 1024 * 1024 * 2 ** i) for i in range(8))
+
+Labels = tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Labels, values: Labels, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    """Base class: a named family of samples keyed by label values."""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labels: Labels = ()) -> None:
+        self.name = name
+        self.help_text = help_text
+        self.label_names = labels
+        self._lock = threading.Lock()
+        _REGISTRY.append(self)
+
+    def _key(self, labels: Labels) -> Labels:
+        if len(labels) != len(self.label_names):
+            raise ValueError(f"{self.name} expects labels {self.label_names}")
+        return tuple(str(v) for v in labels)
+
+    def samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    """A monotonically increasing value per label set."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: Labels = ()) -> None:
+        super().__init__(name, help_text, labels)
+        self._values: dict[Labels, float] = {}
+
+    def inc(self, amount: float = 1.0, *labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> Iterable[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}"
+
+
+class Gauge(Counter):
+    """A value per label set that can go up and down."""
+
+    kind = "gauge"
+
+    def dec(self, amount: float = 1.0, *labels: str) -> None:
+        self.inc(-amount, *labels)
+
+    def set(self, value: float, *labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class CallbackGauge(_Metric):
+    """A gauge whose samples are computed by a callback at scrape time.
+
+    The callback returns a number, or a mapping of label-value tuples to
+    numbers for a labelled gauge.
+    """
+
+    kind = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        callback: Callable[[], float | dict[Labels, float]],
+        labels: Labels = (),
+        kind: str = "gauge",
+    ) -> None:
+        super().__init__(name, help_text, labels)
+        self.kind = kind
+        self._callback = callback
+
+    def samples(self) -> Iterable[str]:
+        try:
+            values = self._callback()
+        except Exception:
+            # A failing source must not break the whole scrape
+            return
+        if not isinstance(values, dict):
+            values = {(): values}
+        for key, value in sorted(values.items()):
+            yield f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}"
+
+
+class Histogram(_Metric):
+    """Cumulative bucket counts, sum and count per label set."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labels: Labels = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ) -> None:
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._series: dict[Labels, list[float]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # One count per bucket, then sum and count
+                series = self._series[key] = [0.0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def sum(self, *labels: str) -> float:
+        series = self._series.get(self._key(labels))
+        return series[-2] if series else 0.0
+
+    def series(self) -> list[Labels]:
+        with self._lock:
+            return list(self._series)
+
+    def samples(self) -> Iterable[str]:
+        with self._lock:
+            items = sorted((key, list(series)) for key, series in self._series.items())
+        for key, series in items:
+            for bound, count in zip(self.buckets, series):
+                le = f'le="{_format_value(bound)}"'
+                yield (
+                    f"{self.name}_bucket{_format_labels(self.label_names, key, le)} "
+                    f"{_format_value(count)}"
+                )
+            labels = _format_labels(self.label_names, key)
+            yield f"{self.name}_sum{labels} {_format_value(series[-2])}"
+            yield f"{self.name}_count{labels} {_format_value(series[-1])}"
+
+
+_REGISTRY: list[_Metric] = []
+
+
+def register_gauge(
+    name: str,
+    help_text: str,
+    callback: Callable[[], float | dict[Labels, float]],
+    labels: Labels = (),
+    kind: str = "gauge",
+) -> CallbackGauge:
+    """Expose the value returned by *callback* each time ``/metrics`` is scraped."""
+    return CallbackGauge(name, help_text, callback, labels, kind)
+
+
+def render_metrics() -> str:
+    """Return every registered metric in Prometheus text format (0.0.4)."""
+    return "\n".join(metric.render() for metric in _REGISTRY) + "\n"
+
+
+# ---------------------------------------------------------------------------
+# Stages
+# ---------------------------------------------------------------------------
+
+STAGE_SECONDS = Histogram(
+    "featune_stage_seconds", "Wall time spent in each processing stage.", ("stage",)
+)
+STAGE_BYTES = Counter(
+    "featune_stage_bytes_total", "Bytes read or written by each processing stage.", ("stage",)
+)
+STAGE_AUDIO_SECONDS = Counter(
+    "featune_stage_audio_seconds_total", "Seconds of audio handled by each processing stage.", ("stage",)
+)
+
+
+def _realtime_factors() -> dict[Labels, float]:
+    factors = {}
+    for key in STAGE_SECONDS.series():
+        audio_seconds = STAGE_AUDIO_SECONDS.value(*key)
+        wall_seconds = STAGE_SECONDS.sum(*key)
+        if audio_seconds and wall_seconds:
+            factors[key] = audio_seconds / wall_seconds
+    return factors
+
+
+register_gauge(
+    "featune_stage_realtime_factor",
+    "Seconds of audio processed per wall-clock second, per stage, since startup.",
+    _realtime_factors,
+    ("stage",),
+)
+
+# Stage timings of the current request, for the Server-Timing header.
+_request_timings: contextvars.ContextVar[list[tuple[str, float]] | None] = contextvars.ContextVar(
+    "request_timings", default=None
+)
+
+# Set inside a pool worker while a job runs; stage timings are buffered
+# here and shipped back with the job's result.
+_job_events: list[tuple[str, float, int, float]] | None = None
+
+
+def record_stage(name: str, seconds: float, nbytes: int = 0, audio_seconds: float = 0.0) -> None:
+    """Record one completed stage (see :func:`stage`)."""
+    if _job_events is not None:
+        _job_events.append((name, seconds, nbytes, audio_seconds))
+        return
+    STAGE_SECONDS.observe(seconds, name)
+    if nbytes:
+        STAGE_BYTES.inc(nbytes, name)
+    if audio_seconds:
+        STAGE_AUDIO_SECONDS.inc(audio_seconds, name)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.append((name, seconds))
+
+
+class stage:
+    """Context manager timing a processing stage.
+
+    Args:
+        name: Stage name (a label value, so keep the set small).
+        nbytes: Bytes handled; may also be set on the timer before exit.
+        audio_seconds: Seconds of audio handled; may also be set later.
+
+    The stage is recorded only if the block completes without raising.
+    """
+
+    def __init__(self, name: str, nbytes: int = 0, audio_seconds: float = 0.0) -> None:
+        self.name = name
+        self.nbytes = nbytes
+        self.audio_seconds = audio_seconds
+
+    def __enter__(self) -> "stage":
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            record_stage(
+                self.name, time.perf_counter() - self._start, self.nbytes, self.audio_seconds
+            )
+
+
+# ---------------------------------------------------------------------------
+# Pool jobs
+# ---------------------------------------------------------------------------
+
+JOB_SECONDS = Histogram(
+    "featune_job_seconds", "Wall time of audio pool jobs, excluding queueing.", ("function",)
+)
+JOB_PEAK_RSS = Histogram(
+    "featune_job_peak_rss_bytes",
+    "Peak resident memory of the worker process during each audio pool job.",
+    ("function",),
+    MEMORY_BUCKETS,
+)
+
+
+class JobReport(NamedTuple):
+    """Measurements taken in a pool worker by :func:`run_job`."""
+
+    function: str
+    seconds: float
+    peak_rss: int
+    stages: list[tuple[str, float, int, float]]
+
+
+def peak_rss_bytes() -> int:
+    """Return this process's peak resident set size in bytes."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    # Linux reports ru_maxrss in KiB (it is not resettable per job)
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def reset_peak_rss() -> None:
+    """Restart :func:`peak_rss_bytes` from the current RSS, where supported."""
+    # Writing 5 to clear_refs resets VmHWM to the current RSS (Linux 4.0+),
+    # so the peak read after the job belongs to that job alone.
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def run_job(fn: Callable[..., Any], args: tuple, kwargs: dict) -> tuple[Any, JobReport]:
+    """Run ``fn(*args, **kwargs)`` in a pool worker and measure it.
+
+    Returns the result and a :class:`JobReport` for :func:`record_job`.
+    """
+    global _job_events
+    _job_events = []
+    reset_peak_rss()
+    start = time.perf_counter()
+    try:
+        result = fn(*args, **kwargs)
+        report = JobReport(
+            getattr(fn, "__name__", "job"), time.perf_counter() - start, peak_rss_bytes(), _job_events
+        )
+    finally:
+        _job_events = None
+    return result, report
+
+
+def record_job(report: JobReport, waited: float) -> None:
+    """Record a job measured by :func:`run_job` in this process.
+
+    Args:
+        report: The worker's measurements.
+        waited: Total seconds the caller awaited the job; the part not spent
+            running it is recorded as the ``queue_wait`` stage.
+    """
+    JOB_SECONDS.observe(report.seconds, report.function)
+    JOB_PEAK_RSS.observe(report.peak_rss, report.function)
+    for name, seconds, nbytes, audio_seconds in report.stages:
+        record_stage(name, seconds, nbytes, audio_seconds)
+    record_stage("queue_wait", max(0.0, waited - report.seconds))
+
+
+# ---------------------------------------------------------------------------
+# HTTP
+# ---------------------------------------------------------------------------
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "featune_http_request_seconds",
+    "Time from request start to the end of the response body.",
+    ("method", "route", "status"),
+)
+HTTP_IN_FLIGHT = Gauge(
+    "featune_http_requests_in_flight", "Requests currently being handled.", ("prefix",)
+)
+
+register_gauge(
+    "featune_process_peak_rss_bytes",
+    "Peak resident memory of the API process.",
+    lambda: resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+)
+
+
+def _server_timing(timings: list[tuple[str, float]], total: float) -> str:
+    durations: dict[str, float] = {}
+    for name, seconds in timings:
+        durations[name] = durations.get(name, 0.0) + seconds
+    durations["total"] = total
+    return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in durations.items())
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording request latency and in-flight requests.
+
+    In-flight requests are counted by the first path segment, but only for
+    the segments in *prefixes*; every other path (scanners, typos) shares
+    the ``other`` label, so the gauge's label set stays fixed.
+
+    Args:
+        app: The wrapped ASGI app.
+        prefixes: First path segments given their own in-flight label,
+            e.g. ``("process", "chat")``.
+        server_timing: Add a ``Server-Timing`` header with the stages the
+            request spent time in.
+    """
+
+    def __init__(
+        self,
+        app: Any,
+        prefixes: Iterable[str] = (),
+        server_timing: bool = SERVER_TIMING,
+    ) -> None:
+        self.app = app
+        self.prefixes = frozenset(prefixes)
+        self.server_timing = server_timing
+
+    async def __call__(self, scope: dict, receive: Callable, send: Callable) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        prefix = scope["path"].strip("/").split("/", 1)[0]
+        if prefix not in self.prefixes:
+            prefix = "other"
+        timings: list[tuple[str, float]] = []
+        token = _request_timings.set(timings)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message: dict) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if self.server_timing:
+                    header = _server_timing(timings, time.perf_counter() - start)
+                    message = {
+                        **message,
+                        "headers": [
+                            *message.get("headers", []),
+                            (b"server-timing", header.encode("latin-1")),
+                            (b"timing-allow-origin", b"*"),
+                        ],
+                    }
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc(1, prefix)
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            HTTP_IN_FLIGHT.dec(1, prefix)
+            _request_timings.reset(token)
+            # The route template keeps label cardinality bounded. Newer
+            # FastAPI keeps included routes relative to their router and
+            # records the full template separately.
+            matched = scope.get("fastapi", {}).get("effective_route_context") or scope.get("route")
+            route = getattr(matched, "path", "unmatched")
+            HTTP_REQUEST_SECONDS.observe(
+                time.perf_counter() - start, scope["method"], route, str(status)
+            )
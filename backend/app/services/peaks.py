@@ -0,0 +1,157 @@
+"""Compact binary encoding of multi-resolution waveform peaks.
+
+A peak pyramid holds several zoom levels of the same track. Level ``k`` has
+``num_points * PEAK_LEVEL_FACTOR ** k`` points, and every point stores the
+minimum and maximum sample (for drawing zoomed waveforms) and the mean
+absolute amplitude (the classic ``waveform_data`` envelope). Level 0 at 200
+points therefore carries the 200-point list; see :func:`envelope_from_peaks`.
+
+Binary layout (little-endian)::
+
+    header   "FTPK" | u8 version | u8 bits | u16 levels | u32 sample_rate | u64 frames
+    level    u32 points | f32 envelope_scale
+             min[points] (int<bits>) | max[points] (int<bits>)
+             envelope[points] (uint<bits>)
+
+``bits`` is 8 or 16. Minima and maxima are scaled so that full scale (1.0)
+maps to the largest signed value. Envelope values are normalised to the
+level's loudest point (stored as ``envelope_scale``, in full-scale units),
+so ``envelope / uint_max`` is the normalised 0.0-1.0 envelope.
+
+Configuration (environment variables):
+    WAVEFORM_PEAK_LEVELS: Number of zoom levels (default: 3).
+"""
+
+import base64
+import os
+import struct
+from typing import NamedTuple
+
+import numpy as np
+
+PEAK_LEVELS = int(os.environ.get("WAVEFORM_PEAK_LEVELS", "3"))
+
+# Each level has this many times the points of the previous one.
+PEAK_LEVEL_FACTOR = 4
+
+PEAKS_MAGIC = b"FTPK"
+PEAKS_VERSION = 1
+
+_HEADER = struct.Struct("<4sBBHIQ")
+_LEVEL_HEADER = struct.Struct("<If")
+
+# bits -> (signed dtype, unsigned dtype)
+_DTYPES = {8: ("i1", "u1"), 16: ("<i2", "<u2")}
+
+
+class PeakLevel(NamedTuple):
+    """One zoom level of a peak pyramid.
+
+    Attributes:
+        mins: Minimum sample per point, in full-scale units [-1.0, 1.0].
+        maxs: Maximum sample per point, in full-scale units.
+        envelope: Mean absolute amplitude per point, in full-scale units.
+    """
+
+    mins: np.ndarray
+    maxs: np.ndarray
+    envelope: np.ndarray
+
+
+class PeakPyramid(NamedTuple):
+    """A decoded peak pyramid, finest level last."""
+
+    sample_rate: int
+    frames: int
+    levels: list[PeakLevel]
+
+
+def encode_peaks(pyramid: PeakPyramid, bits: int = 8) -> bytes:
+    """Serialise *pyramid* into the quantised binary format.
+
+    Raises:
+        ValueError: If *bits* is not 8 or 16.
+    """
+    if bits not in _DTYPES:
+        raise ValueError("bits must be 8 or 16")
+    signed, unsigned = _DTYPES[bits]
+    full_scale = float((1 << (bits - 1)) - 1)
+    unsigned_max = float((1 << bits) - 1)
+
+    parts = [
+        _HEADER.pack(
+            PEAKS_MAGIC, PEAKS_VERSION, bits, len(pyramid.levels),
+            pyramid.sample_rate, pyramid.frames,
+        )
+    ]
+    for level in pyramid.levels:
+        scale = float(level.envelope.max()) if len(level.envelope) else 0.0
+        parts.append(_LEVEL_HEADER.pack(len(level.envelope), scale))
+        for values in (level.mins, level.maxs):
+            quantised = np.clip(np.rint(values * full_scale), -full_scale, full_scale)
+            parts.append(quantised.astype(signed).tobytes())
+        normalised = level.envelope / scale if scale > 0 else np.zeros(len(level.envelope))
+        parts.append(np.rint(normalised * unsigned_max).astype(unsigned).tobytes())
+    return b"".join(parts)
+
+
+def decode_peaks(data: bytes) -> PeakPyramid:
+    """Parse bytes produced by :func:`encode_peaks`.
+
+    Values are dequantised back to full-scale floats.
+
+    Raises:
+        ValueError: If *data* is not a supported peaks payload.
+    """
+    try:
+        magic, version, bits, num_levels, sample_rate, frames = _HEADER.unpack_from(data)
+    except struct.error:
+        raise ValueError("Truncated peaks header") from None
+    if magic != PEAKS_MAGIC or version != PEAKS_VERSION or bits not in _DTYPES:
+        raise ValueError("Not a supported peaks payload")
+    signed, unsigned = _DTYPES[bits]
+    full_scale = float((1 << (bits - 1)) - 1)
+    unsigned_max = float((1 << bits) - 1)
+    width = bits // 8
+
+    levels: list[PeakLevel] = []
+    offset = _HEADER.size
+    for _ in range(num_levels):
+        try:
+            points, scale = _LEVEL_HEADER.unpack_from(data, offset)
+        except struct.error:
+            raise ValueError("Truncated peaks level") from None
+        offset += _LEVEL_HEADER.size
+        if len(data) < offset + 3 * points * width:
+            raise ValueError("Truncated peaks level")
+        mins, maxs = (
+            np.frombuffer(data, signed, points, offset + i * points * width) / full_scale
+            for i in range(2)
+        )
+        envelope = np.frombuffer(data, unsigned, points, offset + 2 * points * width)
+        levels.append(PeakLevel(mins, maxs, envelope / unsigned_max * scale))
+        offset += 3 * points * width
+    return PeakPyramid(sample_rate, frames, levels)
+
+
+def peaks_to_base64(data: bytes) -> str:
+    """Return the base64 text form of an encoded pyramid, for JSON transport."""
+    return base64.b64encode(data).decode("ascii")
+
+
+def peaks_from_base64(text: str) -> PeakPyramid:
+    """Decode the base64 form produced by :func:`peaks_to_base64`."""
+    return decode_peaks(base64.b64decode(text))
+
+
+def envelope_from_peaks(pyramid: PeakPyramid) -> list[float]:
+    """Return the normalised envelope of the coarsest level.
+
+    For a pyramid built with ``num_points=200`` this is the 200-point
+    ``waveform_data`` list (to the precision of the encoding).
+    """
+    envelope = pyramid.levels[0].envelope
+    max_val = envelope.max() if len(envelope) else 0.0
+    if max_val > 0:
+        envelope = envelope / max_val
+    return [round(float(v), 4) for v in envelope]
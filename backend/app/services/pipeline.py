@@ -0,0 +1,108 @@
+"""Upload processing pipeline.
+
+Decodes the uploaded listening file exactly once and derives every artefact
+(full preview, clip preview and waveform data) from that shared buffer.
+Uploads too long to hold decoded in memory go through the constant-memory
+streaming path in :mod:`app.services.streaming` instead.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+from app.services.audio import load_audio, probe_audio, sample_view
+from app.services.encoder import encode_renditions
+from app.services.streaming import should_stream, stream_full_preview
+from app.services.watermark import (
+    CLIP_PREVIEW_RENDITIONS,
+    FULL_PREVIEW_RENDITIONS,
+    load_voice_tag,
+    render_clip_from_file,
+    render_clip_preview,
+    render_full_preview,
+)
+from app.services.peaks import peaks_to_base64
+from app.services.waveform import WaveformAccumulator, accumulate_samples
+
+# Stages reported through the ``progress`` callback, in order.
+UPLOAD_STAGES = ("decode", "full_preview", "clip_preview", "waveform")
+
+
+def process_upload_audio(
+    audio_path: str,
+    tag_path: str,
+    preview_clip_start: int = 0,
+    clip_duration: int = 30,
+    num_points: int = 200,
+    progress: Callable[[str], None] | None = None,
+) -> dict[str, Any]:
+    """Produce all upload artefacts from a single decode of *audio_path*.
+
+    Args:
+        audio_path: Path to the uploaded listening file.
+        tag_path: Path to the voice tag audio file.
+        preview_clip_start: Clip start offset in seconds.
+        clip_duration: Clip length in seconds.
+        num_points: Number of points in the waveform envelope.
+        progress: Optional callback invoked with each stage name from
+            ``UPLOAD_STAGES`` as that stage starts.
+
+    Returns:
+        A dict with ``waveform_data``, ``waveform_peaks`` (a base64 peak
+        pyramid, see :mod:`app.services.peaks`) and a ``<name>_path`` entry
+        for every rendition in ``FULL_PREVIEW_RENDITIONS`` and
+        ``CLIP_PREVIEW_RENDITIONS`` (by default ``full_preview_path`` and
+        ``clip_preview_path``). ``hls`` renditions are directories holding
+        ``index.m3u8`` and its segments.
+    """
+    report = progress or (lambda _stage: None)
+
+    report("decode")
+    info = probe_audio(audio_path)
+    if should_stream(info):
+        # Too long to hold decoded in memory: stream the full preview in
+        # fixed-size blocks (folding each one into the waveform as it
+        # passes) and seek for the clip instead.
+        waveform = WaveformAccumulator(int(info.duration * info.sample_rate), info.sample_rate)
+
+        report("full_preview")
+        outputs = stream_full_preview(audio_path, tag_path, info=info, on_block=waveform.add)
+
+        report("clip_preview")
+        clip = render_clip_from_file(audio_path, tag_path, preview_clip_start, clip_duration)
+        outputs.update(encode_renditions(clip, CLIP_PREVIEW_RENDITIONS))
+
+        report("waveform")
+        return {**_output_paths(outputs), **_waveform_outputs(waveform, num_points)}
+
+    audio = load_audio(audio_path)
+    tag = load_voice_tag(tag_path, match=audio)
+
+    # Each preview is encoded (all its renditions in one ffmpeg pass) on a
+    # background thread, so the encoders and the waveform run concurrently.
+    with ThreadPoolExecutor(max_workers=2) as encoders:
+        report("full_preview")
+        full_preview = render_full_preview(audio, tag)
+        full_outputs = encoders.submit(encode_renditions, full_preview, FULL_PREVIEW_RENDITIONS)
+
+        report("clip_preview")
+        clip = render_clip_preview(audio, tag, preview_clip_start, clip_duration)
+        clip_outputs = encoders.submit(encode_renditions, clip, CLIP_PREVIEW_RENDITIONS)
+
+        report("waveform")
+        waveform = accumulate_samples(sample_view(audio), audio.frame_rate)
+        waveform_outputs = _waveform_outputs(waveform, num_points)
+
+        outputs = {**full_outputs.result(), **clip_outputs.result()}
+
+    return {**_output_paths(outputs), **waveform_outputs}
+
+
+def _waveform_outputs(waveform: WaveformAccumulator, num_points: int) -> dict[str, Any]:
+    return {
+        "waveform_data": waveform.envelope(num_points),
+        "waveform_peaks": peaks_to_base64(waveform.peaks(num_points)),
+    }
+
+
+def _output_paths(outputs: dict[str, str]) -> dict[str, str]:
+    return {f"{name}_path": path for name, path in outputs.items()}
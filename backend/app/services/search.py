@@ -0,0 +1,283 @@
+"""Keyword search over the track catalogue.
+
+A query is split into tokens (:func:`tokenize`) and every track is scored by
+:func:`score_track`: each token earns the weight of the first field it is a
+case-insensitive substring of (title 1.2, genre 1.0, mood 1.0, vocalist type
+0.8), or of the AI/human flag, and the total is divided by the number of
+tokens and clamped to 1.0.
+
+Scoring every track for every query makes chat latency grow with the
+catalogue. :class:`KeywordIndex` gives the same scores while only touching
+the tracks a token matches. For each field it maps every distinct value to
+the tracks that carry it, and every 1-, 2- and 3-gram of those values to the
+values containing it. Tokens of up to three characters are looked up
+directly; longer tokens intersect the postings of their trigrams and check
+the few surviving values with a real substring test. The best results are
+then taken with a bounded heap instead of a full sort.
+
+Chat traffic is repetitive, so ranked results are also kept in a
+:class:`QueryCache`, an LRU keyed by the normalised query and tagged with
+the catalogue version they were computed from.
+
+Configuration (environment variables):
+    CHAT_QUERY_CACHE_SIZE: Results kept in the query cache (default: 1024,
+        0 disables it).
+"""
+
+import heapq
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Hashable
+
+from app.services.catalogue import CatalogueSnapshot
+
+# Common English stop-words to ignore when scoring
+STOP_WORDS = frozenset(
+    {
+        "a", "an", "the", "for", "and", "or", "but", "is", "in", "on",
+        "of", "to", "it", "with", "my", "me", "i", "this", "that",
+        "some", "any", "very", "really", "just", "so", "like", "want",
+        "need", "looking", "something", "find", "give", "get",
+    }
+)
+
+# (field, weight) in order of precedence: a token only counts once per
+# track, for the first field it matches.
+FIELD_WEIGHTS = (
+    ("title", 1.2),  # title gets a slight boost
+    ("genre", 1.0),
+    ("mood", 1.0),
+    ("vocalist_type", 0.8),
+)
+AI_WEIGHT = 1.0
+HUMAN_WEIGHT = 0.8
+
+# Longest n-gram kept in the postings.
+_GRAM = 3
+
+CHAT_QUERY_CACHE_SIZE = int(os.environ.get("CHAT_QUERY_CACHE_SIZE", "1024"))
+
+
+def tokenize(text: str) -> list[str]:
+    """Split text into lowercase alphanumeric tokens, dropping stop-words."""
+    return [w for w in re.findall(r"[a-z0-9]+", text.lower()) if w not in STOP_WORDS]
+
+
+def score_track(query_tokens: list[str], track: dict[str, Any]) -> float:
+    """Return a relevance score (0.0 – 1.0) for *track* given *query_tokens*.
+
+    This is the reference scoring; :class:`KeywordIndex` returns the same
+    values without scanning every track.
+    """
+    if not query_tokens:
+        return 0.0
+
+    fields = [(track.get(name) or "").lower() for name, _weight in FIELD_WEIGHTS]
+
+    matched_weight = 0.0
+    for token in query_tokens:
+        for value, (_name, weight) in zip(fields, FIELD_WEIGHTS):
+            if token in value:
+                matched_weight += weight
+                break
+        else:
+            if token == "ai" and track.get("is_ai_generated"):
+                matched_weight += AI_WEIGHT
+            elif token == "human" and not track.get("is_ai_generated"):
+                matched_weight += HUMAN_WEIGHT
+
+    # Normalise to 0–1 (can exceed 1.0 due to title boost, so clamp)
+    return min(matched_weight / len(query_tokens), 1.0)
+
+
+class _FieldIndex:
+    """Substring postings for one field of the catalogue."""
+
+    def __init__(self, values: list[str]) -> None:
+        positions: dict[str, list[int]] = {}
+        for position, value in enumerate(values):
+            if value:
+                positions.setdefault(value, []).append(position)
+        self._values = list(positions)
+        self._positions = list(positions.values())
+
+        grams: dict[str, list[int]] = {}
+        for value_id, value in enumerate(self._values):
+            seen = {
+                value[start:start + n]
+                for n in range(1, _GRAM + 1)
+                for start in range(len(value) - n + 1)
+            }
+            for gram in seen:
+                grams.setdefault(gram, []).append(value_id)
+        self._grams = grams
+
+    def matches(self, token: str) -> list[int]:
+        """Return the positions of the tracks whose value contains *token*."""
+        if len(token) <= _GRAM:
+            value_ids = self._grams.get(token, ())
+        else:
+            postings = sorted(
+                (self._grams.get(token[i:i + _GRAM], ()) for i in range(len(token) - _GRAM + 1)),
+                key=len,
+            )
+            candidates = set(postings[0])
+            for posting in postings[1:]:
+                if not candidates:
+                    break
+                candidates.intersection_update(posting)
+            value_ids = [v for v in candidates if token in self._values[v]]
+        return [p for v in value_ids for p in self._positions[v]]
+
+
+class KeywordIndex:
+    """Inverted index over a catalogue snapshot, scored like :func:`score_track`.
+
+    Args:
+        snapshot: The catalogue to index. Positions in the index are
+            positions in ``snapshot.tracks``, so ties are broken in
+            catalogue order.
+    """
+
+    def __init__(self, snapshot: CatalogueSnapshot) -> None:
+        self.version = snapshot.version
+        self.tracks = snapshot.tracks
+        self._fields = [
+            (weight, _FieldIndex([(track.get(name) or "").lower() for track in self.tracks]))
+            for name, weight in FIELD_WEIGHTS
+        ]
+        self._ai = [p for p, track in enumerate(self.tracks) if track.get("is_ai_generated")]
+        self._human = [p for p, track in enumerate(self.tracks) if not track.get("is_ai_generated")]
+
+    def _token_weights(self, token: str) -> dict[int, float]:
+        weights: dict[int, float] = {}
+        for weight, field in self._fields:
+            for position in field.matches(token):
+                weights.setdefault(position, weight)
+        if token == "ai":
+            for position in self._ai:
+                weights.setdefault(position, AI_WEIGHT)
+        elif token == "human":
+            for position in self._human:
+                weights.setdefault(position, HUMAN_WEIGHT)
+        return weights
+
+    def search(self, query_tokens: list[str], limit: int = 5) -> list[tuple[dict[str, Any], float]]:
+        """Return up to *limit* ``(track, score)`` pairs, best first.
+
+        Only tracks with a positive score are returned; equal scores keep
+        catalogue order.
+        """
+        if not query_tokens:
+            return []
+        # Accumulate in token order so the float sums equal score_track's
+        matched: dict[int, float] = {}
+        for token in query_tokens:
+            for position, weight in self._token_weights(token).items():
+                matched[position] = matched.get(position, 0.0) + weight
+
+        total = len(query_tokens)
+        best = heapq.nsmallest(
+            limit,
+            ((min(weight / total, 1.0), position) for position, weight in matched.items()),
+            key=lambda item: (-item[0], item[1]),
+        )
+        return [(self.tracks[position], score) for score, position in best]
+
+
+_index: KeywordIndex | None = None
+_index_lock = threading.Lock()
+
+
+def keyword_index(snapshot: CatalogueSnapshot) -> KeywordIndex:
+    """Return an index at least as new as *snapshot*, building one if needed.
+
+    Subscribed to the catalogue, so the index is rebuilt by the background
+    refresh rather than by the first query after a change.
+    """
+    global _index
+    index = _index
+    if index is not None and index.version >= snapshot.version:
+        return index
+    with _index_lock:
+        if _index is None or _index.version < snapshot.version:
+            _index = KeywordIndex(snapshot)
+        return _index
+
+
+class QueryCache:
+    """A thread-safe LRU cache of ranked results for one catalogue version.
+
+    Entries are stored with the catalogue version they were computed from.
+    The first lookup or store for a newer version drops every older entry,
+    so approvals and removals are never answered from stale results.
+
+    Args:
+        max_entries: Capacity; 0 disables caching.
+    """
+
+    def __init__(self, max_entries: int = CHAT_QUERY_CACHE_SIZE) -> None:
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._version = 0
+        self._entries: OrderedDict[Hashable, Any] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _check_version(self, version: int) -> None:
+        if version > self._version:
+            self._entries.clear()
+            self._version = version
+
+    def get(self, version: int, key: Hashable) -> Any | None:
+        """Return the cached value for *key* at *version*, or ``None``."""
+        with self._lock:
+            self._check_version(version)
+            value = self._entries.get(key) if version == self._version else None
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, version: int, key: Hashable, value: Any) -> None:
+        """Store *value* for *key* at *version*, evicting the oldest entry if full."""
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._check_version(version)
+            if version != self._version:
+                return
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict[str, int]:
+        """Return the size, capacity, hit and miss counters."""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "version": self._version,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+def query_key(mode: str, query_tokens: list[str]) -> tuple[str, tuple[str, ...]]:
+    """Return the cache key of a tokenized query.
+
+    Keyword scores do not depend on token order (repeats do count), so the
+    tokens are sorted. Semantic search also embeds joined neighbouring
+    words ("lo fi" -> "lofi"), so there the order is kept.
+    """
+    if mode == "keyword":
+        return mode, tuple(sorted(query_tokens))
+    return mode, tuple(query_tokens)
+
+
+query_cache = QueryCache()
@@ -0,0 +1,321 @@
+"""Semantic track search with a local vector index.
+
+Keyword matching only finds tracks that literally contain a query word.
+This module embeds track metadata (title, genre, mood, bpm, key, vocalist
+type and the AI flag) and queries into the same vector space with a
+deterministic hashed TF-IDF vectorizer, with no model download and no
+network call:
+
+* Text is tokenized like keyword search, and each word contributes a word
+  feature plus its character trigrams, so "pianos" still lands near
+  "piano". Compact forms of multi-word values are added too ("Lo-Fi" also
+  yields "lofi").
+* A small table of synonym groups maps related words ("chill", "mellow",
+  "relaxed", ...) onto a shared concept feature, and the bpm is turned into
+  a tempo word ("slow", "midtempo", "fast").
+* Features are hashed (CRC32, signed) into ``SEMANTIC_DIMENSIONS`` buckets,
+  weighted by field and by inverse document frequency over the catalogue,
+  and L2-normalised.
+
+Track vectors live in one contiguous float32 matrix stored dimension-major,
+so a query, which only uses a few dimensions, reads just those rows and
+needs one small matrix product followed by a partial sort. When
+``SEMANTIC_INDEX_DIR`` is set the matrix is written there, named after a
+hash of its contents, and memory-mapped back. That keeps it out of the
+Python heap, and workers that index the same catalogue map the same file,
+so the OS shares its pages between them. Files no worker has written or
+mapped for a few minutes are deleted as new ones are written.
+
+Configuration (environment variables):
+    SEMANTIC_DIMENSIONS: Hashed vector size (default: 1024).
+    SEMANTIC_MIN_SCORE: Lowest cosine similarity returned (default: 0.1).
+    SEMANTIC_INDEX_DIR: Directory to memory-map the vectors from (default:
+        unset, vectors stay in memory).
+"""
+
+import hashlib
+import os
+import threading
+import time
+import zlib
+from typing import Any
+
+import numpy as np
+
+from app.services.catalogue import CatalogueSnapshot
+from app.services.search import FIELD_WEIGHTS, tokenize
+
+SEMANTIC_DIMENSIONS = int(os.environ.get("SEMANTIC_DIMENSIONS", "1024"))
+SEMANTIC_MIN_SCORE = float(os.environ.get("SEMANTIC_MIN_SCORE", "0.1"))
+SEMANTIC_INDEX_DIR = os.environ.get("SEMANTIC_INDEX_DIR")
+
+# Vector files are named ``track-vectors-<content hash>.npy``.
+_VECTOR_FILE_PREFIX = "track-vectors-"
+# Vector files not written or mapped for this long are deleted. Workers
+# pick up a catalogue change within one refresh interval, so by then every
+# worker still using a file has mapped it.
+_VECTOR_FILE_GRACE_SECONDS = 300.0
+
+# Weight of the bpm, key and AI/human features relative to a title word.
+_ATTRIBUTE_WEIGHT = 0.5
+
+# Share of a word's weight spread over its character trigrams.
+_TRIGRAM_WEIGHT = 0.5
+
+# Words in a group share a concept feature, so a query for one finds tracks
+# tagged with another.
+_SYNONYM_GROUPS = (
+    ("chill", "relaxed", "relaxing", "calm", "mellow", "laidback", "peaceful", "smooth"),
+    ("sad", "melancholy", "melancholic", "emotional", "heartbreak", "somber", "sorrow"),
+    ("happy", "joyful", "uplifting", "cheerful", "feelgood", "bright", "fun"),
+    ("energetic", "hype", "intense", "powerful", "aggressive", "energy"),
+    ("dark", "moody", "ominous", "eerie", "haunting"),
+    ("romantic", "love", "sensual", "sexy"),
+    ("lofi", "chillhop"),
+    ("hiphop", "rap"),
+    ("rnb", "rb", "soul"),
+    ("edm", "electronic", "dance", "house", "techno"),
+    ("female", "woman", "girl", "feminine"),
+    ("male", "man", "guy", "masculine"),
+    ("fast", "uptempo", "upbeat", "quick"),
+    ("slow", "downtempo", "ballad"),
+)
+_CONCEPTS = {word: f"c:{group[0]}" for group in _SYNONYM_GROUPS for word in group}
+
+
+def _tempo_word(bpm: Any) -> str | None:
+    try:
+        bpm = float(bpm)
+    except (TypeError, ValueError):
+        return None
+    if bpm <= 0:
+        return None
+    if bpm < 90:
+        return "slow"
+    if bpm < 120:
+        return "midtempo"
+    return "fast"
+
+
+def _text_features(text: str, weight: float, features: dict[str, float]) -> None:
+    words = tokenize(text)
+    compact = "".join(words)
+    if len(words) > 1 and len(compact) > 2:
+        words.append(compact)
+    for word in words:
+        features[f"w:{word}"] = features.get(f"w:{word}", 0.0) + weight
+        concept = _CONCEPTS.get(word)
+        if concept:
+            features[concept] = features.get(concept, 0.0) + weight
+        padded = f"#{word}#"
+        trigrams = [padded[i:i + 3] for i in range(len(padded) - 2)]
+        share = weight * _TRIGRAM_WEIGHT / len(trigrams)
+        for gram in trigrams:
+            features[f"g:{gram}"] = features.get(f"g:{gram}", 0.0) + share
+
+
+def track_features(track: dict[str, Any]) -> dict[str, float]:
+    """Return the weighted features of a track's metadata."""
+    features: dict[str, float] = {}
+    for name, weight in FIELD_WEIGHTS:
+        _text_features(track.get(name) or "", weight, features)
+    attributes = [_tempo_word(track.get("bpm")), track.get("key")]
+    attributes.append("ai" if track.get("is_ai_generated") else "human")
+    for attribute in attributes:
+        if attribute:
+            _text_features(attribute, _ATTRIBUTE_WEIGHT, features)
+    return features
+
+
+def query_features(query: str) -> dict[str, float]:
+    """Return the features of a free-text query."""
+    features: dict[str, float] = {}
+    _text_features(query, 1.0, features)
+    return features
+
+
+def _remove_stale_vectors(directory: str, current: str) -> None:
+    """Delete vector files in *directory* unused for ``_VECTOR_FILE_GRACE_SECONDS``.
+
+    Age rather than order decides, so a worker still on an older catalogue
+    cannot delete the file of a newer one that other workers just wrote.
+    """
+    cutoff = time.time() - _VECTOR_FILE_GRACE_SECONDS
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if not entry.name.startswith(_VECTOR_FILE_PREFIX) or entry.path == current:
+                    continue
+                try:
+                    if entry.stat().st_mtime < cutoff:
+                        os.unlink(entry.path)
+                except OSError:
+                    # Another worker removed it first, or the platform
+                    # refuses to delete a mapped file; retried next rebuild
+                    pass
+    except OSError:
+        pass
+
+
+def _hash_feature(feature: str, dimensions: int) -> tuple[int, float]:
+    digest = zlib.crc32(feature.encode("utf-8"))
+    return digest % dimensions, -1.0 if digest & 0x80000000 else 1.0
+
+
+class SemanticIndex:
+    """Hashed TF-IDF vectors for a catalogue snapshot.
+
+    Args:
+        snapshot: The catalogue to index. Row ``i`` of the matrix is
+            ``snapshot.tracks[i]``.
+        dimensions: Hashed vector size.
+        directory: If given, the matrix is saved there and memory-mapped.
+    """
+
+    def __init__(
+        self,
+        snapshot: CatalogueSnapshot,
+        dimensions: int = SEMANTIC_DIMENSIONS,
+        directory: str | None = SEMANTIC_INDEX_DIR,
+    ) -> None:
+        self.version = snapshot.version
+        self.tracks = snapshot.tracks
+        self.dimensions = dimensions
+        # Every feature seen in the catalogue -> (bucket, sign). Query
+        # features outside it cannot match anything and are dropped, so an
+        # unknown word never scores through a hash collision.
+        self._buckets: dict[str, tuple[int, float]] = {}
+
+        columns: list[int] = []
+        buckets: list[int] = []
+        values: list[float] = []
+        for column, track in enumerate(self.tracks):
+            for feature, weight in track_features(track).items():
+                bucket = self._buckets.get(feature)
+                if bucket is None:
+                    bucket = self._buckets[feature] = _hash_feature(feature, dimensions)
+                columns.append(column)
+                buckets.append(bucket[0])
+                values.append(bucket[1] * weight)
+
+        count = len(self.tracks)
+        vectors = np.zeros((dimensions, count), dtype=np.float32)
+        np.add.at(vectors, (np.array(buckets, dtype=np.int64), np.array(columns, dtype=np.int64)), values)
+        document_frequency = np.count_nonzero(vectors, axis=1)
+        self.idf = (np.log((1.0 + count) / (1.0 + document_frequency)) + 1.0).astype(np.float32)
+        vectors *= self.idf[:, None]
+        norms = np.linalg.norm(vectors, axis=0)
+        np.divide(vectors, norms, out=vectors, where=norms > 0)
+        # One row per hashed dimension, so a query only reads the rows of
+        # the few dimensions it uses
+        self.vectors = self._map(vectors, directory) if directory else vectors
+
+    def _map(self, vectors: np.ndarray, directory: str) -> np.ndarray:
+        """Return a read-only memory map of *vectors* saved under *directory*.
+
+        The file is named after a hash of the matrix, so workers holding the
+        same catalogue map the same file (and share its pages) instead of
+        each writing their own. It is written to a private temporary name
+        and moved into place, so a reader never sees a partial file. Files
+        unused for ``_VECTOR_FILE_GRACE_SECONDS`` are then removed; workers
+        still mapping one keep their pages until they rebuild. If the
+        directory cannot be written, the in-memory matrix is used.
+        """
+        digest = hashlib.blake2b(vectors.data, digest_size=8)
+        digest.update(repr(vectors.shape).encode())
+        path = os.path.join(directory, f"{_VECTOR_FILE_PREFIX}{digest.hexdigest()}.npy")
+        try:
+            # Once mapped, the pages survive the file being deleted
+            mapped = np.load(path, mmap_mode="r")
+        except FileNotFoundError:
+            # Not written yet, or just deleted as stale by another worker
+            mapped = None
+        except OSError:
+            return vectors
+        if mapped is not None:
+            try:
+                # Mark it in use so other workers' sweeps keep it
+                os.utime(path)
+            except OSError:
+                pass
+        else:
+            partial = f"{path}.{os.getpid()}.partial"
+            try:
+                os.makedirs(directory, exist_ok=True)
+                with open(partial, "wb") as f:
+                    np.save(f, vectors)
+                mapped = np.load(partial, mmap_mode="r")
+                os.replace(partial, path)
+            except OSError:
+                try:
+                    os.unlink(partial)
+                except OSError:
+                    pass
+                return vectors
+        _remove_stale_vectors(directory, path)
+        return mapped
+
+    def embed(self, queries: list[str]) -> np.ndarray:
+        """Return the L2-normalised ``(len(queries), dimensions)`` query vectors."""
+        vectors = np.zeros((len(queries), self.dimensions), dtype=np.float32)
+        for row, query in enumerate(queries):
+            for feature, weight in query_features(query).items():
+                bucket = self._buckets.get(feature)
+                if bucket is not None:
+                    vectors[row, bucket[0]] += bucket[1] * weight
+        vectors *= self.idf
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        np.divide(vectors, norms, out=vectors, where=norms > 0)
+        return vectors
+
+    def search_many(
+        self,
+        queries: list[str],
+        limit: int = 5,
+        min_score: float = SEMANTIC_MIN_SCORE,
+    ) -> list[list[tuple[dict[str, Any], float]]]:
+        """Answer several queries with one matrix product.
+
+        Only the dimensions used by at least one query are read.
+
+        Returns:
+            For each query, up to *limit* ``(track, cosine)`` pairs with a
+            similarity of at least *min_score*, best first; equal scores
+            keep catalogue order.
+        """
+        embedded = self.embed(queries)
+        used = np.flatnonzero(embedded.any(axis=0))
+        if not len(self.tracks) or not len(used):
+            return [[] for _ in queries]
+        scores = embedded[:, used] @ self.vectors[used]
+        results = []
+        for row in scores:
+            candidates = np.flatnonzero((row > 0) & (row >= min_score))
+            if len(candidates) > limit:
+                # Keep everything tied with the limit-th score so ties are
+                # resolved in catalogue order below
+                cutoff = np.partition(row[candidates], -limit)[-limit]
+                candidates = candidates[row[candidates] >= cutoff]
+            order = candidates[np.lexsort((candidates, -row[candidates]))][:limit]
+            results.append([(self.tracks[i], float(row[i])) for i in order])
+        return results
+
+    def search(self, query: str, limit: int = 5) -> list[tuple[dict[str, Any], float]]:
+        """Return up to *limit* ``(track, cosine)`` pairs for *query*, best first."""
+        return self.search_many([query], limit)[0]
+
+
+_index: SemanticIndex | None = None
+_index_lock = threading.Lock()
+
+
+def semantic_index(snapshot: CatalogueSnapshot) -> SemanticIndex:
+    """Return a semantic index at least as new as *snapshot*, building one if needed."""
+    global _index
+    index = _index
+    if index is not None and index.version >= snapshot.version:
+        return index
+    with _index_lock:
+        if _index is None or _index.version < snapshot.version:
+            _index = SemanticIndex(snapshot)
+        return _index
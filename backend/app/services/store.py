@@ -0,0 +1,253 @@
+"""Managed scratch storage for processing outputs.
+
+Encoders, uploads and pipeline stages create their files here instead of in
+the system temp directory. The store bounds disk use in two ways:
+
+* A TTL: entries (files or directories) not modified for
+  ``ARTIFACT_TTL_SECONDS`` are deleted by :meth:`ArtifactStore.sweep`, which
+  the API runs periodically in the background. Outputs worth keeping are
+  moved out of the store (into the artefact cache or a job directory)
+  before they expire, so anything left behind is garbage from a crashed
+  worker or an abandoned request.
+* A quota: once usage exceeds ``ARTIFACT_STORE_MAX_BYTES`` even after a
+  sweep, :meth:`ArtifactStore.new_file` raises :class:`StoreFullError` and
+  new work is refused until space frees up, rather than filling the disk.
+
+Walking the store takes time that grows with its contents (an HLS rendition
+is a file per segment), so usage is re-measured by each sweep and otherwise
+only when the quota check needs it: when the figure is older than the sweep
+interval, or older than ``_USAGE_REFRESH_SECONDS`` while usage is within
+``_NEAR_FULL_FRACTION`` of the quota. Bytes written through
+:meth:`ArtifactStore.write_bytes` are added as they are written. In the API
+process a re-measurement runs in a background thread and the check uses the
+last figure meanwhile, so the event loop never walks the store.
+
+Outputs smaller than ``ARTIFACT_SPOOL_MAX_BYTES`` can skip the disk entirely
+(see ``watermark.watermark_audio_spooled``).
+
+Configuration (environment variables):
+    ARTIFACT_STORE_DIR: Root directory (default: <tmp>/featune-artifacts).
+    ARTIFACT_STORE_MAX_BYTES: Disk quota in bytes (default: 4 GiB).
+    ARTIFACT_TTL_SECONDS: Age after which entries are swept (default: 1 h).
+    ARTIFACT_SWEEP_INTERVAL_SECONDS: Seconds between sweeps (default: 60).
+    ARTIFACT_SPOOL_MAX_BYTES: Largest output kept in memory (default: 8 MiB).
+"""
+
+import asyncio
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+ARTIFACT_STORE_DIR = os.environ.get(
+    "ARTIFACT_STORE_DIR", os.path.join(tempfile.gettempdir(), "featune-artifacts")
+)
+ARTIFACT_STORE_MAX_BYTES = int(
+    os.environ.get("ARTIFACT_STORE_MAX_BYTES", str(4 * 1024 * 1024 * 1024))
+)
+ARTIFACT_TTL_SECONDS = int(os.environ.get("ARTIFACT_TTL_SECONDS", "3600"))
+ARTIFACT_SWEEP_INTERVAL_SECONDS = int(os.environ.get("ARTIFACT_SWEEP_INTERVAL_SECONDS", "60"))
+ARTIFACT_SPOOL_MAX_BYTES = int(os.environ.get("ARTIFACT_SPOOL_MAX_BYTES", str(8 * 1024 * 1024)))
+
+# Once usage reaches this fraction of the quota, a figure older than
+# _USAGE_REFRESH_SECONDS is re-measured before it is trusted; below it, the
+# figure from the last sweep is good enough.
+_NEAR_FULL_FRACTION = 0.9
+_USAGE_REFRESH_SECONDS = 2.0
+
+
+class StoreFullError(Exception):
+    """Raised when the store is over its disk quota."""
+
+
+def path_size(path: str) -> int:
+    """Return the size of a file, or the total size of a directory tree."""
+    if not os.path.isdir(path):
+        return os.path.getsize(path)
+    return sum(
+        os.path.getsize(os.path.join(dirpath, name))
+        for dirpath, _dirs, names in os.walk(path)
+        for name in names
+    )
+
+
+def remove_path(path: str) -> None:
+    """Delete a file or directory tree, ignoring ones already gone."""
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+    else:
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+
+class ArtifactStore:
+    """A quota- and TTL-bounded directory of scratch outputs."""
+
+    def __init__(self, root: str, max_bytes: int, ttl: float) -> None:
+        self.root = root
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._usage: tuple[float, int] | None = None
+        self._lock = threading.Lock()
+        self._interval: float = ARTIFACT_SWEEP_INTERVAL_SECONDS
+        self._sweeper: asyncio.Task[None] | None = None
+        self._measuring: asyncio.Task[None] | None = None
+
+    # -- allocation ---------------------------------------------------------
+
+    def new_file(self, suffix: str = "") -> str:
+        """Create an empty file in the store and return its path.
+
+        Raises:
+            StoreFullError: If the store is over quota.
+        """
+        self.ensure_capacity()
+        os.makedirs(self.root, exist_ok=True)
+        fd, path = tempfile.mkstemp(suffix=suffix, dir=self.root)
+        os.close(fd)
+        return path
+
+    def new_dir(self, suffix: str = "") -> str:
+        """Create an empty directory in the store and return its path.
+
+        Raises:
+            StoreFullError: If the store is over quota.
+        """
+        self.ensure_capacity()
+        os.makedirs(self.root, exist_ok=True)
+        return tempfile.mkdtemp(suffix=suffix, dir=self.root)
+
+    def write_bytes(self, data: bytes, suffix: str = "") -> str:
+        """Write *data* to a new file in the store and return its path."""
+        path = self.new_file(suffix)
+        with open(path, "wb") as f:
+            f.write(data)
+        with self._lock:
+            if self._usage is not None:
+                self._usage = (self._usage[0], self._usage[1] + len(data))
+        return path
+
+    # -- accounting ---------------------------------------------------------
+
+    def usage(self) -> int:
+        """Return the bytes used by the store.
+
+        A stale figure (see the module docstring) is re-measured. On the
+        event loop of a process running the sweeper that happens in a
+        background thread and the last figure is returned meanwhile, so
+        this is safe to call from async code; elsewhere it walks the store.
+        """
+        with self._lock:
+            measured = self._usage
+        if measured is not None:
+            near_full = measured[1] >= _NEAR_FULL_FRACTION * self.max_bytes
+            max_age = _USAGE_REFRESH_SECONDS if near_full else self._interval
+            if time.monotonic() - measured[0] <= max_age:
+                return measured[1]
+        if self._sweeper is not None:
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                loop = None
+            if loop is not None:
+                if self._measuring is None or self._measuring.done():
+                    self._measuring = loop.create_task(self._measure_in_background())
+                return measured[1] if measured is not None else 0
+        return self.measure()
+
+    def measure(self) -> int:
+        """Walk the store, record its usage and return it (blocking)."""
+        return self._record(sum(size for _path, _mtime, size in self._entries()))
+
+    async def _measure_in_background(self) -> None:
+        try:
+            await asyncio.to_thread(self.measure)
+        except OSError:
+            pass  # retried on the next stale check or sweep
+
+    def _record(self, usage: int) -> int:
+        with self._lock:
+            self._usage = (time.monotonic(), usage)
+        return usage
+
+    def ensure_capacity(self) -> None:
+        """Raise :class:`StoreFullError` if the store is over quota.
+
+        Without the background sweeper, expired entries are swept first so
+        only live outputs count; with it, they are at most one sweep
+        interval late.
+        """
+        usage = self.usage()
+        if usage > self.max_bytes and self._sweeper is None:
+            self.sweep()
+            usage = self.usage()
+        if usage > self.max_bytes:
+            raise StoreFullError(
+                f"Artifact store is full ({usage} of {self.max_bytes} bytes in use)"
+            )
+
+    def _entries(self) -> list[tuple[str, float, int]]:
+        entries: list[tuple[str, float, int]] = []
+        try:
+            scan = list(os.scandir(self.root))
+        except FileNotFoundError:
+            return entries
+        for entry in scan:
+            try:
+                entries.append((entry.path, entry.stat().st_mtime, path_size(entry.path)))
+            except FileNotFoundError:
+                # Moved out or removed while scanning
+                continue
+        return entries
+
+    # -- sweeping -----------------------------------------------------------
+
+    def sweep(self) -> int:
+        """Delete entries older than the TTL and re-measure usage (blocking).
+
+        Returns:
+            The number of entries removed.
+        """
+        cutoff = time.time() - self.ttl
+        removed = 0
+        usage = 0
+        for path, mtime, size in self._entries():
+            if mtime < cutoff:
+                remove_path(path)
+                removed += 1
+            else:
+                usage += size
+        self._record(usage)
+        return removed
+
+    async def start(self, interval: float = ARTIFACT_SWEEP_INTERVAL_SECONDS) -> None:
+        """Start sweeping (and re-measuring usage) every *interval* seconds in the background."""
+        self._interval = interval
+        await asyncio.to_thread(self.sweep)
+        self._sweeper = asyncio.create_task(self._sweep_forever(interval))
+
+    async def stop(self) -> None:
+        """Stop the background sweeper."""
+        for task in (self._sweeper, self._measuring):
+            if task is not None:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._sweeper = self._measuring = None
+
+    async def _sweep_forever(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.to_thread(self.sweep)
+            except OSError:
+                # A transient filesystem error must not kill the sweeper
+                continue
+
+
+artifact_store = ArtifactStore(ARTIFACT_STORE_DIR, ARTIFACT_STORE_MAX_BYTES, ARTIFACT_TTL_SECONDS)
@@ -0,0 +1,154 @@
+"""Constant-memory streaming watermark pipeline for long audio.
+
+``create_full_preview`` holds the whole decoded track in memory and pydub's
+``export`` writes an intermediate WAV before encoding. For hour-long DJ mixes
+and large uncompressed uploads that is enough to OOM a small container.
+
+This module instead pipes fixed-size PCM blocks from an ffmpeg decoder,
+mixes the voice tag into each block as it passes the scheduled positions and
+writes the block straight into an ffmpeg encoder's stdin (see
+:class:`app.services.encoder.RenditionEncoder`). Memory use is one
+block plus the tag, regardless of duration.
+
+Configuration (environment variables):
+    STREAMING_THRESHOLD_BYTES: Decoded size (16-bit PCM) above which
+        previews are produced by streaming (default: 256 MiB, roughly
+        25 minutes of 44.1 kHz stereo).
+"""
+
+import os
+import tempfile
+from typing import Callable, Iterator
+
+import numpy as np
+from pydub import AudioSegment
+
+from app.services.audio import (
+    PCM_SAMPLE_WIDTH,
+    AudioInfo,
+    check_decoder,
+    open_pcm_decoder,
+    probe_audio,
+    read_pcm_blocks,
+    to_sample_array,
+)
+from app.services.encoder import Rendition, RenditionEncoder
+from app.services.metrics import stage
+from app.services.mixer import Placement, mix_into
+from app.services.watermark import (
+    FULL_PREVIEW_INTERVAL,
+    FULL_PREVIEW_RENDITIONS,
+    full_preview_positions,
+    load_voice_tag,
+)
+
+STREAMING_THRESHOLD_BYTES = int(
+    os.environ.get("STREAMING_THRESHOLD_BYTES", str(256 * 1024 * 1024))
+)
+
+# Frames per block read from the decoder (about 1.5 s at 44.1 kHz).
+STREAM_BLOCK_FRAMES = 65536
+
+
+def decoded_size(info: AudioInfo) -> int:
+    """Return the approximate size in bytes of *info*'s 16-bit PCM decode."""
+    return int(info.duration * info.sample_rate * info.channels * PCM_SAMPLE_WIDTH)
+
+
+def should_stream(info: AudioInfo) -> bool:
+    """Return True if a full decode of *info* would exceed the threshold."""
+    return decoded_size(info) > STREAMING_THRESHOLD_BYTES
+
+
+def _positions(duration: float, interval: int) -> Iterator[int]:
+    """Yield full-preview tag positions (seconds) without an upper bound.
+
+    Mixing simply stops at the end of the stream, so only the short-track
+    fallback (a single tag in the middle) depends on the probed duration.
+    """
+    if duration <= interval:
+        yield from full_preview_positions(duration, interval)
+        return
+    pos = interval
+    while True:
+        yield pos
+        pos += interval
+
+
+def stream_full_preview(
+    audio_path: str,
+    tag_path: str,
+    info: AudioInfo | None = None,
+    interval: int = FULL_PREVIEW_INTERVAL,
+    renditions: list[Rendition] | None = None,
+    on_block: Callable[[np.ndarray], None] | None = None,
+) -> dict[str, str]:
+    """Create a full-length watermarked preview in constant memory.
+
+    Produces the same tag placement as ``create_full_preview``. Mixed blocks
+    are piped into one ffmpeg encoder that writes every rendition.
+
+    Args:
+        audio_path: Path to the source audio file.
+        tag_path: Path to the voice tag audio file.
+        info: Stream parameters, if already probed.
+        interval: Seconds between tags.
+        renditions: Outputs to encode (default ``FULL_PREVIEW_RENDITIONS``).
+        on_block: Optional callback receiving each decoded ``(frames,
+            channels)`` int16 block before the tag is mixed in, so other
+            analyses can share the decode. The array is reused afterwards.
+
+    Returns:
+        Mapping of rendition name to output file path.
+    """
+    info = info or probe_audio(audio_path)
+    like = AudioSegment(
+        b"", frame_rate=info.sample_rate, channels=info.channels, sample_width=PCM_SAMPLE_WIDTH
+    )
+    tag = to_sample_array(load_voice_tag(tag_path, match=like))
+    tag_frames = len(tag)
+
+    with (
+        stage("stream_preview", nbytes=os.path.getsize(audio_path), audio_seconds=info.duration),
+        tempfile.TemporaryFile() as decode_err,
+    ):
+        decoder = open_pcm_decoder(audio_path, info, decode_err)
+        try:
+            with RenditionEncoder(
+                renditions or FULL_PREVIEW_RENDITIONS, info.sample_rate, info.channels
+            ) as encoder:
+                positions = _positions(info.duration, interval)
+                pending = next(positions, None)
+                active: list[Placement] = []
+                offset = 0
+
+                for block in read_pcm_blocks(decoder.stdout, info.channels, STREAM_BLOCK_FRAMES):
+                    block_end = offset + len(block)
+
+                    # Schedule every placement that starts inside this block
+                    # and drop the ones whose tag has fully played out.
+                    while pending is not None and pending * info.sample_rate < block_end:
+                        active.append(Placement(pending * 1000))
+                        pending = next(positions, None)
+                    active = [
+                        p for p in active
+                        if int(p.position_ms * info.sample_rate / 1000.0) + tag_frames > offset
+                    ]
+
+                    if on_block is not None:
+                        on_block(block)
+                    if active:
+                        mix_into(block, tag, active, info.sample_rate, offset=offset)
+                    encoder.write(block)
+                    offset = block_end
+
+                decoder.wait()
+                check_decoder(decoder, decode_err)
+        except BaseException:
+            decoder.kill()
+            decoder.wait()
+            raise
+        finally:
+            decoder.stdout.close()
+
+    return encoder.outputs
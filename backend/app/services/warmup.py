@@ -0,0 +1,149 @@
+"""Background warm-up and readiness.
+
+Everything slow to get going is kept off the import and lifespan path, so a
+new instance answers ``/health`` as soon as uvicorn is up, and then warmed
+in the background before ``/ready`` reports it ready:
+
+* Every audio pool worker is started ahead of traffic and runs
+  :func:`warm_worker` once: it imports the audio stack (pydub, NumPy and the
+  processing services; spawned workers do not inherit the API process's
+  imports), decodes and caches the voice tag, and runs a tiny synthetic waveform and
+  watermark/encode job so ffmpeg and every code path have run once.
+* The Supabase client (httpx, h2, postgrest) is imported and opened, and
+  the track catalogue is loaded, which also builds the search indexes
+  subscribed to it.
+
+A load balancer should route traffic to an instance only once ``/ready``
+returns 200. Failures do not hold readiness back, since the instance can
+still serve, just without that part warmed: a failed catalogue load is
+reported by ``/ready``, and a worker that cannot run the synthetic job (a
+missing voice tag, say) simply starts colder. After
+``WARMUP_TIMEOUT_SECONDS`` the instance reports ready and lets unfinished
+steps complete in the background.
+
+Configuration (environment variables):
+    WARMUP_TIMEOUT_SECONDS: Longest warm-up before the instance reports
+        ready anyway (default: 120).
+"""
+
+import asyncio
+import os
+import tempfile
+import time
+import wave
+from typing import Any
+
+from app.services.catalogue import track_catalogue
+from app.services.database import database
+from app.services.executor import audio_pool
+
+WARMUP_TIMEOUT_SECONDS = float(os.environ.get("WARMUP_TIMEOUT_SECONDS", "120"))
+
+# Length of the synthetic clip processed by warm_worker.
+_WARMUP_AUDIO_SECONDS = 2
+
+
+def _write_tone(path: str, seconds: int, sample_rate: int = 44100) -> None:
+    import numpy as np
+
+    t = np.arange(seconds * sample_rate) / sample_rate
+    tone = (np.sin(2 * np.pi * 440.0 * t) * 8000).astype("<i2")
+    with wave.open(path, "wb") as out:
+        out.setnchannels(2)
+        out.setsampwidth(2)
+        out.setframerate(sample_rate)
+        out.writeframes(np.repeat(tone[:, None], 2, axis=1).tobytes())
+
+
+def warm_worker() -> None:
+    """Prepare an audio pool worker process (the pool's initializer).
+
+    Never raises: a failure only means the worker starts colder.
+    """
+    try:
+        from app.services.audio import load_audio
+        from app.services.encoder import encode_to_bytes
+        from app.services.pipeline import process_upload_audio  # noqa: F401
+        from app.services.watermark import (
+            CLIP_PREVIEW_RENDITIONS,
+            load_voice_tag,
+            render_clip_preview,
+        )
+        from app.services.waveform import generate_waveform
+
+        with tempfile.TemporaryDirectory(prefix="featune-warmup-") as directory:
+            path = os.path.join(directory, "warmup.wav")
+            _write_tone(path, _WARMUP_AUDIO_SECONDS)
+            generate_waveform(path, num_points=16)
+            audio = load_audio(path)
+            clip = render_clip_preview(audio, load_voice_tag(match=audio), 0, _WARMUP_AUDIO_SECONDS)
+            rendition = next(
+                (r for r in CLIP_PREVIEW_RENDITIONS if r.format in ("mp3", "opus")), None
+            )
+            if rendition is not None:
+                encode_to_bytes(clip, rendition)
+    except Exception:
+        pass
+
+
+class WarmUp:
+    """Runs the warm-up once per API process and tracks readiness."""
+
+    def __init__(self, timeout: float = WARMUP_TIMEOUT_SECONDS) -> None:
+        self.timeout = timeout
+        self.ready = False
+        self.errors: dict[str, str] = {}
+        self._started_at: float | None = None
+        self._seconds: float | None = None
+        self._tasks: list[asyncio.Task[None]] = []
+
+    def start(self) -> None:
+        """Start warming up in the background (idempotent)."""
+        if not self._tasks:
+            self._started_at = time.monotonic()
+            self._tasks.append(asyncio.create_task(self._run()))
+
+    async def stop(self) -> None:
+        """Abandon a warm-up still in progress."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _step(self, name: str, coro: Any) -> None:
+        try:
+            await coro
+        except Exception as exc:
+            self.errors[name] = str(exc) or type(exc).__name__
+
+    async def _load_catalogue(self) -> None:
+        await database.start()
+        await track_catalogue.start()
+        if track_catalogue.last_error:
+            raise RuntimeError(track_catalogue.last_error)
+
+    async def _run(self) -> None:
+        steps = [
+            asyncio.create_task(self._step("audio_pool", audio_pool.warm_up())),
+            asyncio.create_task(self._step("catalogue", self._load_catalogue())),
+        ]
+        self._tasks.extend(steps)
+        # Steps still running at the timeout carry on in the background
+        # (cancelling the catalogue's first load would leave it without
+        # its refresher); the instance just stops waiting for them.
+        _done, pending = await asyncio.wait(steps, timeout=self.timeout)
+        if pending:
+            self.errors["timeout"] = f"warm-up exceeded {self.timeout:g}s"
+        self._seconds = time.monotonic() - self._started_at
+        self.ready = True
+
+    def status(self) -> dict[str, Any]:
+        """Return readiness details for ``/ready``."""
+        return {
+            "status": "ready" if self.ready else "warming_up",
+            "warmup_seconds": round(self._seconds, 3) if self._seconds is not None else None,
+            "errors": dict(self.errors),
+        }
+
+
+warm_up = WarmUp()
@@ -1,53 +1,113 @@
 """Audio watermarking service.
 
-Uses pydub to overlay a voice tag onto audio files at specified positions.
-Requires ffmpeg to be installed on the system.
+Uses pydub to decode audio, a NumPy mixer to overlay a voice tag onto it at
+specified positions and ffmpeg pipes to encode the result. Requires ffmpeg
+to be installed on the system.
 """
 
+import functools
+import hashlib
 import os
-import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 from pydub import AudioSegment
 
+from app.services.audio import load_audio, load_audio_window
+from app.services.encoder import (
+    Rendition,
+    bitrate_bps,
+    encode_renditions,
+    encode_to_bytes,
+    parse_renditions,
+)
+from app.services.metrics import stage
+from app.services.mixer import Placement, overlay_tag
+from app.services.store import ARTIFACT_SPOOL_MAX_BYTES
+
 # Default voice tag path — can be overridden via VOICE_TAG_PATH env var.
 DEFAULT_VOICE_TAG_PATH = str(
     Path(__file__).resolve().parent.parent.parent / "assets" / "voice_tag.mp3"
 )
 VOICE_TAG_PATH = os.environ.get("VOICE_TAG_PATH", DEFAULT_VOICE_TAG_PATH)
 
+# Spacing of voice tags in full-length previews, in seconds.
+FULL_PREVIEW_INTERVAL = 17
 
-def _load_audio(audio_path: str) -> AudioSegment:
-    """Load an audio file, auto-detecting format from the file extension.
+# Bitrate of exported MP3 previews (128k is ffmpeg's libmp3lame default).
+PREVIEW_MP3_BITRATE = os.environ.get("PREVIEW_MP3_BITRATE", "128k")
 
-    Args:
-        audio_path: Path to the audio file.
+# Renditions encoded for upload previews, as "name=format:bitrate,..."
+# (see encoder.parse_renditions). Each name is returned as "<name>_path";
+# e.g. add "full_preview_opus=opus:96k" for an Opus stream of the full
+# preview, or "full_preview_hls=hls:128k" for a segmented HLS rendition
+# (a directory with index.m3u8 and its segments). All renditions of one
+# preview are encoded in a single pass.
+FULL_PREVIEW_RENDITIONS = parse_renditions(
+    os.environ.get("FULL_PREVIEW_RENDITIONS", f"full_preview=mp3:{PREVIEW_MP3_BITRATE}")
+)
+CLIP_PREVIEW_RENDITIONS = parse_renditions(
+    os.environ.get("CLIP_PREVIEW_RENDITIONS", f"clip_preview=mp3:{PREVIEW_MP3_BITRATE}")
+)
 
-    Returns:
-        A pydub AudioSegment.
 
-    Raises:
-        FileNotFoundError: If the file does not exist.
-        ValueError: If the format is unsupported.
-    """
-    if not os.path.isfile(audio_path):
-        raise FileNotFoundError(f"Audio file not found: {audio_path}")
-
-    ext = Path(audio_path).suffix.lower().lstrip(".")
-    supported = {"mp3", "wav", "ogg", "flac", "m4a", "aac"}
-    if ext not in supported:
-        raise ValueError(
-            f"Unsupported audio format '.{ext}'. Supported: {', '.join(sorted(supported))}"
-        )
+# Clips rendered at once by create_clip_previews. Each runs one ffmpeg
+# process at a time, and the whole batch holds a single audio pool slot, so
+# this is kept small like the upload pipeline's two encoder threads.
+_CLIP_RENDER_THREADS = 2
+
+# Process-wide cache of decoded voice tags. Keys are
+# (path, mtime_ns, frame_rate, channels, sample_width); a ``None`` format
+# triple holds the tag as decoded, other entries hold copies converted to
+# match a particular track so overlays never have to convert per call.
+VOICE_TAG_CACHE_SIZE = int(os.environ.get("VOICE_TAG_CACHE_SIZE", "16"))
+
+_TagKey = tuple[str, int, int | None, int | None, int | None]
+_voice_tag_cache: OrderedDict[_TagKey, AudioSegment] = OrderedDict()
+_voice_tag_lock = threading.Lock()
+
+
+def _cache_get(key: _TagKey) -> AudioSegment | None:
+    with _voice_tag_lock:
+        tag = _voice_tag_cache.get(key)
+        if tag is not None:
+            _voice_tag_cache.move_to_end(key)
+        return tag
+
 
-    return AudioSegment.from_file(audio_path, format=ext)
+def _cache_put(key: _TagKey, tag: AudioSegment) -> None:
+    with _voice_tag_lock:
+        # Drop entries for an older version of the same file
+        for stale in [k for k in _voice_tag_cache if k[0] == key[0] and k[1] != key[1]]:
+            del _voice_tag_cache[stale]
+        _voice_tag_cache[key] = tag
+        _voice_tag_cache.move_to_end(key)
+        while len(_voice_tag_cache) > max(VOICE_TAG_CACHE_SIZE, 1):
+            _voice_tag_cache.popitem(last=False)
 
 
-def _load_voice_tag(tag_path: str | None = None) -> AudioSegment:
-    """Load the voice tag audio file.
+def clear_voice_tag_cache() -> None:
+    """Drop every cached voice tag."""
+    with _voice_tag_lock:
+        _voice_tag_cache.clear()
+
+
+def load_voice_tag(
+    tag_path: str | None = None,
+    match: AudioSegment | None = None,
+) -> AudioSegment:
+    """Load the voice tag audio file, decoding it at most once per version.
+
+    Decoded tags are kept in a process-wide LRU cache keyed by path and
+    modification time, so editing the file on disk picks up the new tag.
 
     Args:
         tag_path: Optional override path. Falls back to VOICE_TAG_PATH.
+        match: Optional track the tag will be overlaid onto. When given, the
+            returned tag is converted (and cached) in the track's sample
+            rate, channel layout and sample width.
 
     Returns:
         A pydub AudioSegment for the voice tag.
@@ -61,8 +121,87 @@ def _load_voice_tag(tag_path: str | None = None) -> AudioSegment:
             f"Voice tag file not found: {path}. "
             "Place a voice_tag.mp3 in backend/assets/ or set VOICE_TAG_PATH."
         )
-    ext = Path(path).suffix.lower().lstrip(".")
-    return AudioSegment.from_file(path, format=ext)
+    path = os.path.realpath(path)
+    mtime_ns = os.stat(path).st_mtime_ns
+
+    base_key: _TagKey = (path, mtime_ns, None, None, None)
+    tag = _cache_get(base_key)
+    if tag is None:
+        ext = Path(path).suffix.lower().lstrip(".")
+        tag = AudioSegment.from_file(path, format=ext)
+        _cache_put(base_key, tag)
+
+    if match is None:
+        return tag
+
+    key: _TagKey = (path, mtime_ns, match.frame_rate, match.channels, match.sample_width)
+    matched = _cache_get(key)
+    if matched is None:
+        matched = (
+            tag.set_frame_rate(match.frame_rate)
+            .set_channels(match.channels)
+            .set_sample_width(match.sample_width)
+        )
+        _cache_put(key, matched)
+    return matched
+
+
+@functools.lru_cache(maxsize=32)
+def _file_sha256(path: str, mtime_ns: int) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def voice_tag_fingerprint(tag_path: str | None = None) -> str:
+    """Return a SHA-256 of the voice tag file's contents.
+
+    Used to key cached artefacts on the tag's identity. The digest is
+    memoised per file version (path and mtime).
+
+    Raises:
+        FileNotFoundError: If the voice tag file is missing.
+    """
+    path = tag_path or VOICE_TAG_PATH
+    if not os.path.isfile(path):
+        raise FileNotFoundError(f"Voice tag file not found: {path}")
+    path = os.path.realpath(path)
+    return _file_sha256(path, os.stat(path).st_mtime_ns)
+
+
+def _overlay_positions(
+    audio: AudioSegment,
+    tag: AudioSegment,
+    positions_ms: list[int],
+) -> AudioSegment:
+    """Mix *tag* into *audio* at each position that falls inside it."""
+    with stage("overlay", audio_seconds=audio.duration_seconds):
+        return overlay_tag(audio, tag, [Placement(pos_ms) for pos_ms in positions_ms])
+
+
+def export_mp3(audio: AudioSegment) -> str:
+    """Export *audio* as an MP3 in the artifact store and return its path.
+
+    PCM is piped straight into ffmpeg; no intermediate WAV is written.
+    """
+    rendition = Rendition("mp3", "mp3", PREVIEW_MP3_BITRATE)
+    return encode_renditions(audio, [rendition])[rendition.name]
+
+
+def export_mp3_spooled(audio: AudioSegment, max_bytes: int = ARTIFACT_SPOOL_MAX_BYTES) -> bytes | str:
+    """Export *audio* as an MP3, in memory if it is small.
+
+    Returns:
+        The encoded bytes if the MP3 is expected to fit in *max_bytes*,
+        otherwise the path of a file in the artifact store.
+    """
+    rendition = Rendition("mp3", "mp3", PREVIEW_MP3_BITRATE)
+    expected = audio.duration_seconds * bitrate_bps(rendition.bitrate) / 8
+    if expected <= max_bytes:
+        return encode_to_bytes(audio, rendition)
+    return encode_renditions(audio, [rendition])[rendition.name]
 
 
 def watermark_audio(
@@ -79,43 +218,41 @@ def watermark_audio(
             overlaid onto the audio.
 
     Returns:
-        Path to the watermarked output file (MP3, in a temp directory).
+        Path to the watermarked output file (MP3, in the artifact store).
     """
-    audio = _load_audio(audio_path)
-    tag = _load_voice_tag(tag_path)
-
-    for pos_seconds in positions:
-        pos_ms = pos_seconds * 1000
-        # Only overlay if the position is within the audio duration
-        if pos_ms < len(audio):
-            audio = audio.overlay(tag, position=pos_ms)
-
-    output_fd, output_path = tempfile.mkstemp(suffix=".mp3")
-    os.close(output_fd)
-    audio.export(output_path, format="mp3")
-    return output_path
+    return export_mp3(_watermarked(audio_path, tag_path, positions))
 
 
-def create_full_preview(
+def watermark_audio_spooled(
     audio_path: str,
     tag_path: str,
-) -> str:
-    """Create a full-length watermarked preview of an audio file.
-
-    The voice tag is overlaid every 15-20 seconds. The implementation uses a
-    17-second interval (midpoint of the 15-20 range) for consistent spacing.
-
-    Args:
-        audio_path: Path to the source audio file (MP3).
-        tag_path: Path to the voice tag audio file.
+    positions: list[int],
+    max_bytes: int = ARTIFACT_SPOOL_MAX_BYTES,
+) -> bytes | str:
+    """Like :func:`watermark_audio`, but keep small outputs in memory.
 
     Returns:
-        Path to the full-length watermarked output file (MP3).
+        The MP3 bytes if the output is expected to fit in *max_bytes*,
+        otherwise the path of the output file.
     """
-    audio = _load_audio(audio_path)
-    duration_seconds = len(audio) / 1000.0
-    interval = 17  # seconds — midpoint of 15-20s range
+    return export_mp3_spooled(_watermarked(audio_path, tag_path, positions), max_bytes)
+
+
+def _watermarked(audio_path: str, tag_path: str, positions: list[int]) -> AudioSegment:
+    audio = load_audio(audio_path)
+    tag = load_voice_tag(tag_path, match=audio)
+    return _overlay_positions(audio, tag, [p * 1000 for p in positions])
+
 
+def full_preview_positions(
+    duration_seconds: float,
+    interval: int = FULL_PREVIEW_INTERVAL,
+) -> list[int]:
+    """Return the tag positions (in seconds) used for a full-length preview.
+
+    The voice tag is placed every 15-20 seconds. The implementation uses a
+    17-second interval (midpoint of the 15-20 range) for consistent spacing.
+    """
     positions: list[int] = []
     pos = interval
     while pos < duration_seconds:
@@ -126,16 +263,56 @@ def create_full_preview(
     if not positions and duration_seconds > 5:
         positions.append(int(duration_seconds / 2))
 
-    tag = _load_voice_tag(tag_path)
-    for p in positions:
-        pos_ms = p * 1000
-        if pos_ms < len(audio):
-            audio = audio.overlay(tag, position=pos_ms)
+    return positions
+
+
+def render_full_preview(audio: AudioSegment, tag: AudioSegment) -> AudioSegment:
+    """Watermark already-decoded *audio* for a full-length preview."""
+    positions = full_preview_positions(len(audio) / 1000.0)
+    return _overlay_positions(audio, tag, [p * 1000 for p in positions])
+
+
+def render_clip_preview(
+    audio: AudioSegment,
+    tag: AudioSegment,
+    start_seconds: int,
+    duration: int = 30,
+) -> AudioSegment:
+    """Cut and watermark a clip from already-decoded *audio*.
+
+    The voice tag is overlaid at 10 s and 24 s into the clip.
+    """
+    start_ms = start_seconds * 1000
+    end_ms = start_ms + (duration * 1000)
+
+    # Clamp end to actual audio length
+    end_ms = min(end_ms, len(audio))
+
+    clip = audio[start_ms:end_ms]
+
+    # Watermark at 10s and 24s into the clip
+    return _overlay_positions(clip, tag, [10 * 1000, 24 * 1000])
+
+
+def create_full_preview(
+    audio_path: str,
+    tag_path: str,
+) -> str:
+    """Create a full-length watermarked preview of an audio file.
+
+    The voice tag is overlaid every 15-20 seconds (see
+    :func:`full_preview_positions`).
 
-    output_fd, output_path = tempfile.mkstemp(suffix=".mp3")
-    os.close(output_fd)
-    audio.export(output_path, format="mp3")
-    return output_path
+    Args:
+        audio_path: Path to the source audio file (MP3).
+        tag_path: Path to the voice tag audio file.
+
+    Returns:
+        Path to the full-length watermarked output file (MP3).
+    """
+    audio = load_audio(audio_path)
+    tag = load_voice_tag(tag_path, match=audio)
+    return export_mp3(render_full_preview(audio, tag))
 
 
 def create_clip_preview(
@@ -158,25 +335,56 @@ def create_clip_preview(
     Returns:
         Path to the clipped and watermarked output file (MP3).
     """
-    audio = _load_audio(audio_path)
+    return export_mp3(render_clip_from_file(audio_path, tag_path, start_seconds, duration))
 
-    start_ms = start_seconds * 1000
-    end_ms = start_ms + (duration * 1000)
 
-    # Clamp end to actual audio length
-    end_ms = min(end_ms, len(audio))
+def render_clip_from_file(
+    audio_path: str,
+    tag_path: str,
+    start_seconds: int,
+    duration: int = 30,
+) -> AudioSegment:
+    """Decode only the clip window of *audio_path* and watermark it.
 
-    clip = audio[start_ms:end_ms]
+    Returns the watermarked clip as an AudioSegment (see
+    :func:`create_clip_preview` for the encoded version).
+    """
+    # Decode only the clip window rather than the whole source
+    clip = load_audio_window(audio_path, start_seconds, duration)
+    tag = load_voice_tag(tag_path, match=clip)
+    return render_clip_preview(clip, tag, 0, duration)
 
-    tag = _load_voice_tag(tag_path)
 
-    # Watermark at 10s and 24s into the clip
-    watermark_positions_ms = [10 * 1000, 24 * 1000]
-    for pos_ms in watermark_positions_ms:
-        if pos_ms < len(clip):
-            clip = clip.overlay(tag, position=pos_ms)
-
-    output_fd, output_path = tempfile.mkstemp(suffix=".mp3")
-    os.close(output_fd)
-    clip.export(output_path, format="mp3")
-    return output_path
+def create_clip_previews(
+    audio_path: str,
+    tag_path: str,
+    windows: list[tuple[int, int]],
+) -> list[str]:
+    """Render several watermarked clip candidates, decoding only their windows.
+
+    Each window is decoded on its own (see :func:`render_clip_from_file`),
+    so the work scales with the clips' total duration, however far apart
+    they are in the track. Each clip is watermarked at 10 s and 24 s like
+    :func:`create_clip_preview`, and ``_CLIP_RENDER_THREADS`` clips are
+    processed at a time.
+
+    Args:
+        audio_path: Path to the source audio file.
+        tag_path: Path to the voice tag audio file.
+        windows: ``(start_seconds, duration)`` pairs, one per clip.
+
+    Returns:
+        Paths to the clip MP3s, in the same order as *windows*.
+    """
+    if not windows:
+        return []
+
+    def render(window: tuple[int, int]) -> str:
+        start, duration = window
+        return export_mp3(render_clip_from_file(audio_path, tag_path, start, duration))
+
+    # Every decode and export runs its own ffmpeg process, so threads are
+    # enough to process clips in parallel.
+    workers = min(len(windows), _CLIP_RENDER_THREADS)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(render, windows))
@@ -1,21 +1,286 @@
 """Waveform generation service.
 
-Uses librosa to load audio and extract an amplitude envelope, returning a
-JSON-serializable list of floats normalised to the 0.0-1.0 range.
+Extracts an amplitude envelope from audio, returning a JSON-serializable list
+of floats normalised to the 0.0-1.0 range, and multi-resolution min/max peak
+pyramids for zoomable waveforms (see :mod:`app.services.peaks`).
+
+Files are decoded by ffmpeg into fixed-size PCM blocks that are folded into
+per-sub-bucket statistics (sum of absolute amplitude, minimum and maximum)
+as they arrive, so memory use does not grow with the length of the track.
+Each block is reduced with vectorised NumPy operations; once the stream
+ends the sub-buckets are combined into as many points as each output needs,
+and every sample, including the tail, contributes.
 """
 
 import os
+import tempfile
 
-import librosa
 import numpy as np
 
+from app.services.audio import check_decoder, open_pcm_decoder, probe_audio, read_pcm_blocks
+from app.services.metrics import stage
+from app.services.peaks import (
+    PEAK_LEVEL_FACTOR,
+    PEAK_LEVELS,
+    PeakLevel,
+    PeakPyramid,
+    encode_peaks,
+)
+
+# Frames per block decoded from the file (about 1.5 s at 44.1 kHz).
+WAVEFORM_BLOCK_FRAMES = 65536
+
+# Target number of sub-buckets per track. Output points are built from whole
+# sub-buckets, so this bounds the boundary error (a 200-point envelope gets
+# ~330 sub-buckets per point) while keeping the accumulator's size, a few
+# MiB at most, independent of the track's length: once there are twice as
+# many, adjacent sub-buckets are merged pairwise.
+WAVEFORM_SUB_BUCKETS = 65536
+
+# Sub-bucket size when the track's length is unknown (about 23 ms at
+# 44.1 kHz); merging grows it as the stream turns out longer.
+_UNKNOWN_LENGTH_BUCKET_FRAMES = 1024
+
+
+class WaveformAccumulator:
+    """Accumulate amplitude statistics from a stream of sample blocks.
+
+    Feed blocks in order with :meth:`add` (it can be passed directly as the
+    ``on_block`` callback of :func:`app.services.streaming.stream_full_preview`),
+    then read any number of outputs with :meth:`envelope` and :meth:`peaks`.
+
+    Args:
+        expected_frames: Approximate total number of frames, used to size
+            the sub-buckets, or 0 if unknown. The actual count may differ;
+            every frame passed to :meth:`add` is used, and sub-buckets are
+            merged as needed to keep their number bounded.
+        sample_rate: Sample rate recorded in peak pyramids.
+    """
+
+    def __init__(self, expected_frames: int, sample_rate: int = 0) -> None:
+        if expected_frames > 0:
+            self.bucket_frames = max(1, int(expected_frames) // WAVEFORM_SUB_BUCKETS)
+        else:
+            self.bucket_frames = _UNKNOWN_LENGTH_BUCKET_FRAMES
+        self.sample_rate = sample_rate
+        self.frames = 0
+        self._buckets = 0
+        self._sums: list[np.ndarray] = []
+        self._mins: list[np.ndarray] = []
+        self._maxs: list[np.ndarray] = []
+        # Statistics of the sub-bucket still being filled
+        self._open_frames = 0
+        self._open_sum = 0.0
+        self._open_min = 0.0
+        self._open_max = 0.0
+
+    def add(self, block: np.ndarray) -> None:
+        """Fold a block of samples into the statistics.
+
+        Args:
+            block: ``(frames, channels)`` or 1-D mono samples. Integer
+                samples are scaled to full scale ([-1.0, 1.0]); float
+                samples are taken as already in that range. Channels are
+                averaged. The block is not retained.
+        """
+        mono = block if block.ndim == 1 else block[:, 0]
+        mono = mono.astype(np.float32)
+        if block.ndim == 2:
+            # Column by column: summing along the short channel axis is an
+            # order of magnitude slower for interleaved data.
+            for channel in range(1, block.shape[1]):
+                mono += block[:, channel]
+        scale = block.shape[1] if block.ndim == 2 else 1
+        if np.issubdtype(block.dtype, np.integer):
+            scale *= float(np.iinfo(block.dtype).max) + 1
+        if scale != 1:
+            mono /= scale
+        if not len(mono):
+            return
+        self.frames += len(mono)
+
+        size = self.bucket_frames
+        start = 0
+        if self._open_frames:
+            # Complete the sub-bucket left open by the previous block
+            start = min(size - self._open_frames, len(mono))
+            self._fold_open(mono[:start])
+            if self._open_frames < size:
+                return
+            self._append(
+                np.array([self._open_sum]), np.array([self._open_min]), np.array([self._open_max])
+            )
+            self._open_frames = 0
+
+        full = (len(mono) - start) // size
+        end = start + full * size
+        if full:
+            buckets = mono[start:end].reshape(full, size)
+            self._append(
+                np.abs(buckets).sum(axis=1, dtype=np.float64),
+                buckets.min(axis=1),
+                buckets.max(axis=1),
+            )
+        self._fold_open(mono[end:])
+
+        if self._buckets >= 2 * WAVEFORM_SUB_BUCKETS:
+            self._merge()
+
+    def _append(self, sums: np.ndarray, mins: np.ndarray, maxs: np.ndarray) -> None:
+        self._sums.append(sums)
+        self._mins.append(mins)
+        self._maxs.append(maxs)
+        self._buckets += len(sums)
+
+    def _fold_open(self, samples: np.ndarray) -> None:
+        """Add *samples* to the open sub-bucket."""
+        if not len(samples):
+            return
+        total = float(np.abs(samples).sum(dtype=np.float64))
+        low, high = float(samples.min()), float(samples.max())
+        if self._open_frames:
+            self._open_sum += total
+            self._open_min = min(self._open_min, low)
+            self._open_max = max(self._open_max, high)
+        else:
+            self._open_sum, self._open_min, self._open_max = total, low, high
+        self._open_frames += len(samples)
+
+    def _merge(self) -> None:
+        """Double the sub-bucket size by merging adjacent pairs of sub-buckets."""
+        sums, mins, maxs = (np.concatenate(s) for s in (self._sums, self._mins, self._maxs))
+        if len(sums) % 2:
+            # The odd one out is the first half of the open sub-bucket, which
+            # now starts where it does
+            if self._open_frames:
+                self._open_sum += float(sums[-1])
+                self._open_min = min(self._open_min, float(mins[-1]))
+                self._open_max = max(self._open_max, float(maxs[-1]))
+            else:
+                self._open_sum = float(sums[-1])
+                self._open_min, self._open_max = float(mins[-1]), float(maxs[-1])
+            self._open_frames += self.bucket_frames
+            sums, mins, maxs = sums[:-1], mins[:-1], maxs[:-1]
+        self._sums = [sums.reshape(-1, 2).sum(axis=1)]
+        self._mins = [mins.reshape(-1, 2).min(axis=1)]
+        self._maxs = [maxs.reshape(-1, 2).max(axis=1)]
+        self._buckets = len(self._sums[0])
+        self.bucket_frames *= 2
+
+    def _reduce(self, num_points: int) -> PeakLevel:
+        """Combine the sub-buckets into *num_points* points."""
+        sums, mins, maxs = (list(stat) for stat in (self._sums, self._mins, self._maxs))
+        counts = [np.full(len(s), float(self.bucket_frames)) for s in sums]
+        if self._open_frames:
+            sums.append(np.array([self._open_sum]))
+            mins.append(np.array([self._open_min]))
+            maxs.append(np.array([self._open_max]))
+            counts.append(np.array([float(self._open_frames)]))
+        if not self.frames:
+            empty = np.zeros(num_points)
+            return PeakLevel(empty, empty, empty)
+        sums, mins, maxs, counts = (np.concatenate(s) for s in (sums, mins, maxs, counts))
+
+        # Assign each sub-bucket to the point its first frame falls in; the
+        # points split the whole stream, so no tail samples are dropped.
+        first_frames = np.arange(len(sums), dtype=np.int64) * self.bucket_frames
+        points = first_frames * num_points // self.frames
+        totals = np.bincount(points, weights=sums, minlength=num_points)
+        frames = np.bincount(points, weights=counts, minlength=num_points)
+        envelope = np.divide(totals, frames, out=np.zeros(num_points), where=frames > 0)
+
+        # Sub-buckets are in point order, so each point's sub-buckets are
+        # one contiguous run.
+        filled = frames > 0
+        starts = np.searchsorted(points, np.flatnonzero(filled))
+        point_mins, point_maxs = np.zeros(num_points), np.zeros(num_points)
+        point_mins[filled] = np.minimum.reduceat(mins, starts)
+        point_maxs[filled] = np.maximum.reduceat(maxs, starts)
+        return PeakLevel(point_mins, point_maxs, envelope)
+
+    def envelope(self, num_points: int = 200) -> list[float]:
+        """Return the mean-amplitude envelope as *num_points* floats in [0.0, 1.0].
+
+        Raises:
+            ValueError: If *num_points* is less than 1.
+        """
+        if num_points < 1:
+            raise ValueError("num_points must be at least 1")
+        with stage("waveform_reduce"):
+            downsampled = self._reduce(num_points).envelope
+
+        # Normalise to 0.0 - 1.0
+        max_val = downsampled.max()
+        if max_val > 0:
+            downsampled = downsampled / max_val
+
+        # Convert to plain Python floats for JSON serialisation
+        return [round(float(v), 4) for v in downsampled]
+
+    def pyramid(self, num_points: int = 200, levels: int = PEAK_LEVELS) -> PeakPyramid:
+        """Return a min/max peak pyramid with *levels* zoom levels.
+
+        Level ``k`` has ``num_points * PEAK_LEVEL_FACTOR ** k`` points.
+        Levels finer than one sub-bucket per point are left out.
+
+        Raises:
+            ValueError: If *num_points* or *levels* is less than 1.
+        """
+        if num_points < 1 or levels < 1:
+            raise ValueError("num_points and levels must be at least 1")
+        sub_buckets = -(-self.frames // self.bucket_frames)
+        counts = [num_points * PEAK_LEVEL_FACTOR ** k for k in range(levels)]
+        counts = [n for n in counts if n <= sub_buckets] or counts[:1]
+        with stage("waveform_reduce"):
+            return PeakPyramid(
+                self.sample_rate, self.frames, [self._reduce(n) for n in counts]
+            )
+
+    def peaks(self, num_points: int = 200, levels: int = PEAK_LEVELS, bits: int = 8) -> bytes:
+        """Return :meth:`pyramid` in the binary format of :mod:`app.services.peaks`."""
+        return encode_peaks(self.pyramid(num_points, levels), bits)
+
+
+def analyse_file(audio_path: str) -> WaveformAccumulator:
+    """Decode *audio_path* block by block into a :class:`WaveformAccumulator`.
+
+    Raises:
+        FileNotFoundError: If *audio_path* does not exist.
+        ValueError: If the format is unsupported.
+        RuntimeError: If ffmpeg fails to decode the file.
+    """
+    info = probe_audio(audio_path)
+    accumulator = WaveformAccumulator(int(info.duration * info.sample_rate), info.sample_rate)
+
+    with (
+        stage("waveform_decode", nbytes=os.path.getsize(audio_path), audio_seconds=info.duration),
+        tempfile.TemporaryFile() as decode_err,
+    ):
+        decoder = open_pcm_decoder(audio_path, info, decode_err)
+        try:
+            for block in read_pcm_blocks(decoder.stdout, info.channels, WAVEFORM_BLOCK_FRAMES):
+                accumulator.add(block)
+            decoder.wait()
+            check_decoder(decoder, decode_err)
+        except BaseException:
+            decoder.kill()
+            decoder.wait()
+            raise
+        finally:
+            decoder.stdout.close()
+
+    return accumulator
+
 
 def generate_waveform(audio_path: str, num_points: int = 200) -> list[float]:
     """Generate a downsampled amplitude envelope from an audio file.
 
+    The file is decoded in ``WAVEFORM_BLOCK_FRAMES`` blocks and never held
+    in memory as a whole.
+
     Args:
-        audio_path: Path to the audio file (any format supported by librosa /
-            soundfile / ffmpeg).
+        audio_path: Path to the audio file (any format supported by ffmpeg
+            with an extension in ``SUPPORTED_FORMATS``).
         num_points: Number of data points in the returned envelope. The raw
             amplitude data is downsampled to this length. Defaults to 200.
 
@@ -25,39 +290,67 @@ def generate_waveform(audio_path: str, num_points: int = 200) -> list[float]:
 
     Raises:
         FileNotFoundError: If *audio_path* does not exist.
-        ValueError: If *num_points* is less than 1.
+        ValueError: If *num_points* is less than 1 or the format is
+            unsupported.
+        RuntimeError: If ffmpeg fails to decode the file.
     """
-    if not os.path.isfile(audio_path):
-        raise FileNotFoundError(f"Audio file not found: {audio_path}")
-
     if num_points < 1:
         raise ValueError("num_points must be at least 1")
+    return analyse_file(audio_path).envelope(num_points)
 
-    # Load audio as mono, at the native sample rate
-    y, _sr = librosa.load(audio_path, sr=None, mono=True)
 
-    # Take absolute values to get the amplitude envelope
-    amplitude = np.abs(y)
+def generate_waveform_peaks(
+    audio_path: str,
+    num_points: int = 200,
+    levels: int = PEAK_LEVELS,
+    bits: int = 8,
+) -> bytes:
+    """Generate an encoded min/max peak pyramid from an audio file.
 
-    # Downsample to the requested number of points by splitting into equal
-    # chunks and taking the mean of each chunk.
-    if len(amplitude) == 0:
-        return [0.0] * num_points
+    Args:
+        audio_path: Path to the audio file.
+        num_points: Points in the coarsest level.
+        levels: Number of zoom levels.
+        bits: Quantisation, 8 or 16.
 
-    # Trim or pad so we can split evenly
-    chunk_size = max(1, len(amplitude) // num_points)
-    trimmed_length = chunk_size * num_points
-    amplitude = amplitude[:trimmed_length]
+    Returns:
+        The pyramid in the binary format of :mod:`app.services.peaks`.
 
-    chunks = np.array_split(amplitude, num_points)
-    downsampled = np.array([chunk.mean() for chunk in chunks])
+    Raises:
+        FileNotFoundError: If *audio_path* does not exist.
+        ValueError: If an argument is out of range or the format is
+            unsupported.
+        RuntimeError: If ffmpeg fails to decode the file.
+    """
+    if bits not in (8, 16):
+        raise ValueError("bits must be 8 or 16")
+    return analyse_file(audio_path).peaks(num_points, levels, bits)
+
+
+def waveform_from_samples(samples: np.ndarray, num_points: int = 200) -> list[float]:
+    """Downsample already-decoded samples into an amplitude envelope.
+
+    Args:
+        samples: 1-D mono samples or a ``(frames, channels)`` array, e.g.
+            from :func:`app.services.audio.sample_view`.
+        num_points: Number of data points in the returned envelope.
+
+    Returns:
+        A list of *num_points* floats in the range [0.0, 1.0].
 
-    # Normalise to 0.0 - 1.0
-    max_val = downsampled.max()
-    if max_val > 0:
-        normalised = downsampled / max_val
-    else:
-        normalised = downsampled
+    Raises:
+        ValueError: If *num_points* is less than 1.
+    """
+    return accumulate_samples(samples).envelope(num_points)
 
-    # Convert to plain Python floats for JSON serialisation
-    return [round(float(v), 4) for v in normalised]
+
+def accumulate_samples(samples: np.ndarray, sample_rate: int = 0) -> WaveformAccumulator:
+    """Fold already-decoded samples into a :class:`WaveformAccumulator`.
+
+    Samples are added blockwise, so temporaries stay small even for a long
+    in-memory track.
+    """
+    accumulator = WaveformAccumulator(len(samples), sample_rate)
+    for start in range(0, len(samples), WAVEFORM_BLOCK_FRAMES):
+        accumulator.add(samples[start:start + WAVEFORM_BLOCK_FRAMES])
+    return accumulator
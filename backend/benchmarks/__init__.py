@@ -0,0 +1,31 @@
+"""Reproducible benchmarks for the audio and chat search hot paths.
+
+Everything is synthesized locally from a fixed seed: audio files (mono or
+stereo, 44.1 or 48 kHz, 30 s to 60 min, MP3/WAV/FLAC, encoded with the
+same ffmpeg the services use), the voice tag, and track catalogues of 1k to
+100k rows for chat search. There are no fixtures to download.
+
+Three groups of cases are measured:
+
+* ``audio``: :func:`~app.services.watermark.create_full_preview`,
+  :func:`~app.services.watermark.create_clip_preview`,
+  :func:`~app.services.waveform.generate_waveform` and the whole upload
+  pipeline, each called in a fresh single-worker process pool so peak RSS
+  is per call and includes native buffers.
+* ``chat``: the reference :func:`~app.services.search.score_track` scan,
+  keyword and semantic index builds, and per-query search latency.
+* ``e2e``: requests through the FastAPI app (routing, multipart parsing,
+  the audio pool, the artifact cache and ``/chat/query``).
+
+Each case reports latency percentiles, throughput (audio seconds per wall
+second, or queries per second), peak memory and, for pool jobs, the mean
+time per instrumented stage. Results are written as JSON and can be
+compared against an earlier run::
+
+    cd backend
+    python -m benchmarks run --output results.json
+    python -m benchmarks run --suite full --output full.json --baseline results.json
+    python -m benchmarks compare results.json full.json --threshold 0.15
+
+Synthesized inputs are cached under ``--workdir`` so reruns only measure.
+"""
@@ -0,0 +1,198 @@
+"""Command-line entry point: ``python -m benchmarks run|compare``."""
+
+import argparse
+import itertools
+import os
+import shutil
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from typing import Any
+
+from benchmarks import synth
+from benchmarks.harness import (
+    compare,
+    environment,
+    format_comparison,
+    format_results,
+    load_results,
+    write_results,
+)
+
+GROUPS = ("audio", "chat", "e2e")
+
+# Default matrices. "quick" runs in a few minutes and suits a pre-merge
+# check; "full" covers every format and size, up to 60-minute files and
+# 100k-track catalogues.
+SUITES: dict[str, dict[str, Any]] = {
+    "quick": {
+        "formats": ["mp3", "wav"],
+        "channels": [1, 2],
+        "rates": [44100],
+        "durations": [30],
+        "catalogue_sizes": [1000, 10000],
+        "queries": 200,
+        "repeat": 3,
+        "e2e_durations": [30],
+    },
+    "full": {
+        "formats": list(synth.AUDIO_FORMATS),
+        "channels": [1, 2],
+        "rates": [44100, 48000],
+        "durations": [30, 300, 3600],
+        "catalogue_sizes": [1000, 10000, 100000],
+        "queries": 500,
+        "repeat": 5,
+        "e2e_durations": [30, 300],
+    },
+}
+
+DEFAULT_WORKDIR = os.path.join(tempfile.gettempdir(), "featune-bench")
+
+
+def _int_list(text: str) -> list[int]:
+    return [int(value) for value in text.split(",") if value]
+
+
+def _str_list(text: str) -> list[str]:
+    return [value.strip() for value in text.split(",") if value.strip()]
+
+
+def _prepare_environment(workdir: str, tag_path: str) -> str:
+    """Point the app at scratch directories and the synthetic voice tag.
+
+    Returns the scratch directory, removed when the run ends.
+    """
+    scratch = tempfile.mkdtemp(prefix="run-", dir=workdir)
+    os.environ["VOICE_TAG_PATH"] = tag_path
+    os.environ["ARTIFACT_CACHE_DIR"] = os.path.join(scratch, "cache")
+    os.environ["ARTIFACT_STORE_DIR"] = os.path.join(scratch, "store")
+    os.environ["JOBS_DIR"] = os.path.join(scratch, "jobs")
+    # Never talk to a real database: the catalogue is loaded by the e2e cases
+    os.environ.pop("NEXT_PUBLIC_SUPABASE_URL", None)
+    os.environ.pop("SUPABASE_SERVICE_ROLE_KEY", None)
+    return scratch
+
+
+def run(args: argparse.Namespace) -> int:
+    options = dict(SUITES[args.suite])
+    for name in options:
+        value = getattr(args, name, None)
+        if value is not None:
+            options[name] = value
+    groups = args.groups or list(GROUPS)
+
+    audio_dir = os.path.join(args.workdir, "audio")
+    tag_path = synth.voice_tag(args.workdir)
+    scratch = _prepare_environment(args.workdir, tag_path)
+    # Imported only now, so the app reads the environment set above
+    from benchmarks import suites
+
+    specs = [
+        synth.AudioSpec(fmt, channels, rate, duration, args.seed)
+        for fmt, channels, rate, duration in itertools.product(
+            options["formats"], options["channels"], options["rates"], options["durations"]
+        )
+    ]
+    results = []
+    try:
+        unknown = sorted(set(args.functions or ()) - set(suites.AUDIO_FUNCTIONS))
+        if unknown:
+            print(f"Unknown audio function(s): {', '.join(unknown)}", file=sys.stderr)
+            return 2
+        if "audio" in groups:
+            results += suites.audio_cases(
+                audio_dir, tag_path, specs, args.functions or list(suites.AUDIO_FUNCTIONS),
+                options["repeat"],
+            )
+        if "chat" in groups:
+            results += suites.chat_cases(
+                options["catalogue_sizes"], options["queries"], options["repeat"], args.seed
+            )
+        if "e2e" in groups:
+            e2e_specs = [synth.AudioSpec("mp3", 2, 44100, d, args.seed) for d in options["e2e_durations"]]
+            # In a fresh process, so its peak RSS is not inflated by the
+            # catalogues and indexes built by the chat cases
+            with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+                results += pool.submit(
+                    suites.e2e_cases, audio_dir, e2e_specs,
+                    max(options["catalogue_sizes"], default=0),
+                    options["queries"], options["repeat"], args.seed,
+                ).result()
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    write_results(args.output, environment(args.suite, {**options, "groups": groups}), results)
+    print(format_results(results))
+    print(f"results: {args.output}", file=sys.stderr)
+
+    if args.baseline:
+        rows, regressions = compare(load_results(args.baseline), load_results(args.output), args.threshold)
+        print(format_comparison(rows, args.threshold))
+        return 1 if regressions else 0
+    return 0
+
+
+def compare_files(args: argparse.Namespace) -> int:
+    rows, regressions = compare(load_results(args.baseline), load_results(args.current), args.threshold)
+    print(format_comparison(rows, args.threshold))
+    print(f"{len(regressions)} regression(s) above {args.threshold:.0%}", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks",
+        description="Benchmark the audio and chat search hot paths.",
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Run benchmarks and write a result file")
+    run_parser.add_argument("--suite", choices=sorted(SUITES), default="quick",
+                            help="Default input matrix (default: quick)")
+    run_parser.add_argument("--groups", type=_str_list,
+                            help=f"Comma-separated groups to run (default: {','.join(GROUPS)})")
+    run_parser.add_argument("--functions", type=_str_list,
+                            help="Comma-separated audio functions (default: all)")
+    run_parser.add_argument("--formats", type=_str_list, help="e.g. mp3,wav,flac")
+    run_parser.add_argument("--channels", type=_int_list, help="e.g. 1,2")
+    run_parser.add_argument("--rates", type=_int_list, help="e.g. 44100,48000")
+    run_parser.add_argument("--durations", type=_int_list, help="Seconds, e.g. 30,300,3600")
+    run_parser.add_argument("--e2e-durations", type=_int_list, help="Seconds, for e2e uploads")
+    run_parser.add_argument("--catalogue-sizes", type=_int_list, help="e.g. 1000,10000,100000")
+    run_parser.add_argument("--queries", type=int, help="Chat queries per case")
+    run_parser.add_argument("--repeat", type=int, help="Timed iterations per case")
+    run_parser.add_argument("--seed", type=int, default=0, help="Seed for synthetic inputs")
+    run_parser.add_argument("--workdir", default=DEFAULT_WORKDIR,
+                            help="Where synthesized inputs are cached")
+    run_parser.add_argument("--output", "-o", default="benchmark-results.json",
+                            help="Result file (default: benchmark-results.json)")
+    run_parser.add_argument("--baseline", help="Result file to compare against")
+    run_parser.add_argument("--threshold", type=float, default=0.10,
+                            help="Relative slowdown counted as a regression (default: 0.10)")
+
+    compare_parser = commands.add_parser("compare", help="Compare two result files")
+    compare_parser.add_argument("baseline", help="Reference result file")
+    compare_parser.add_argument("current", help="Result file under test")
+    compare_parser.add_argument("--threshold", type=float, default=0.10,
+                                help="Relative slowdown counted as a regression (default: 0.10)")
+
+    args = parser.parse_args(argv)
+    if args.command == "compare":
+        return compare_files(args)
+
+    for name in args.groups or ():
+        if name not in GROUPS:
+            parser.error(f"Unknown group: {name}")
+    for fmt in args.formats or ():
+        if fmt not in synth.AUDIO_FORMATS:
+            parser.error(f"Unsupported format: {fmt}")
+    if args.repeat is not None and args.repeat < 1:
+        parser.error("--repeat must be at least 1")
+    os.makedirs(args.workdir, exist_ok=True)
+    return run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
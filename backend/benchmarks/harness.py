@@ -0,0 +1,232 @@
+"""Measurement, result files and baseline comparison.
+
+A result file is JSON::
+
+    {
+      "meta": {"created_at": ..., "git_commit": ..., "python": ..., ...},
+      "results": [
+        {
+          "name": "audio/generate_waveform/mp3-2ch-44100-30s",
+          "group": "audio",
+          "params": {...},
+          "iterations": 5,
+          "latency_seconds": {"mean": ..., "min": ..., "p50": ..., "p90": ...,
+                              "p99": ..., "max": ...},
+          "throughput": {"value": 412.5, "unit": "audio_s/s"},
+          "peak_memory_bytes": 98566144,
+          "memory_kind": "rss",
+          "stages": {"waveform_decode": 0.061, ...}
+        },
+        ...
+      ]
+    }
+
+Results are matched by ``name`` when comparing, so a case keeps its name
+for as long as it measures the same thing.
+"""
+
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from typing import Any, Iterable
+
+import numpy as np
+from pydub import AudioSegment
+
+# Metrics compared against a baseline: (path in the result, label).
+COMPARED = (
+    (("latency_seconds", "p50"), "p50"),
+    (("latency_seconds", "p90"), "p90"),
+    (("peak_memory_bytes",), "peak memory"),
+)
+
+
+def latency_summary(samples: Iterable[float]) -> dict[str, float]:
+    """Return the mean, min, max and p50/p90/p99 of *samples* (seconds)."""
+    values = np.asarray(list(samples), dtype=np.float64)
+    p50, p90, p99 = np.percentile(values, (50, 90, 99))
+    return {
+        "mean": float(values.mean()),
+        "min": float(values.min()),
+        "p50": float(p50),
+        "p90": float(p90),
+        "p99": float(p99),
+        "max": float(values.max()),
+    }
+
+
+def result(
+    name: str,
+    group: str,
+    params: dict[str, Any],
+    samples: list[float],
+    work: float,
+    unit: str,
+    peak_memory: int | None = None,
+    memory_kind: str = "rss",
+    stages: dict[str, float] | None = None,
+) -> dict[str, Any]:
+    """Build one result entry.
+
+    Args:
+        name: Unique case name, ``<group>/<function>/<variant>``.
+        group: ``audio``, ``chat`` or ``e2e``.
+        params: Inputs of the case.
+        samples: Wall time of each timed call, in seconds.
+        work: Units of work done by one call (audio seconds, queries...);
+            throughput is ``work`` per mean second.
+        unit: Throughput unit.
+        peak_memory: Peak memory in bytes, if measured.
+        memory_kind: ``rss`` (resident set of the process that did the
+            work) or ``heap`` (traced Python and NumPy allocations).
+        stages: Mean seconds per instrumented stage.
+    """
+    latency = latency_summary(samples)
+    entry: dict[str, Any] = {
+        "name": name,
+        "group": group,
+        "params": params,
+        "iterations": len(samples),
+        "latency_seconds": latency,
+        "throughput": {"value": work / latency["mean"] if latency["mean"] else 0.0, "unit": unit},
+        "peak_memory_bytes": peak_memory,
+        "memory_kind": memory_kind if peak_memory is not None else None,
+    }
+    if stages:
+        entry["stages"] = stages
+    return entry
+
+
+def _command_output(command: list[str]) -> str | None:
+    try:
+        completed = subprocess.run(command, capture_output=True, text=True, timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    if completed.returncode != 0:
+        return None
+    return completed.stdout.splitlines()[0].strip() if completed.stdout else None
+
+
+def environment(suite: str, options: dict[str, Any]) -> dict[str, Any]:
+    """Describe the machine and code a run was made on."""
+    return {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "suite": suite,
+        "options": options,
+        "git_commit": _command_output(["git", "rev-parse", "HEAD"]),
+        "python": sys.version.split()[0],
+        "numpy": np.__version__,
+        "ffmpeg": _command_output([AudioSegment.converter, "-version"]),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def write_results(path: str, meta: dict[str, Any], results: list[dict[str, Any]]) -> None:
+    """Write a result file atomically."""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    partial = f"{path}.partial"
+    with open(partial, "w") as f:
+        json.dump({"meta": meta, "results": results}, f, indent=2)
+        f.write("\n")
+    os.replace(partial, path)
+
+
+def load_results(path: str) -> dict[str, Any]:
+    """Read a result file written by :func:`write_results`."""
+    with open(path) as f:
+        data = json.load(f)
+    if not isinstance(data, dict) or not isinstance(data.get("results"), list):
+        raise ValueError(f"{path} is not a benchmark result file")
+    return data
+
+
+def _lookup(entry: dict[str, Any], path: tuple[str, ...]) -> float | None:
+    value: Any = entry
+    for key in path:
+        if not isinstance(value, dict):
+            return None
+        value = value.get(key)
+    return float(value) if isinstance(value, (int, float)) else None
+
+
+def compare(
+    baseline: dict[str, Any],
+    current: dict[str, Any],
+    threshold: float = 0.10,
+) -> tuple[list[dict[str, Any]], list[dict[str, Any]]]:
+    """Compare two result files case by case.
+
+    Args:
+        baseline: The reference run.
+        current: The run under test.
+        threshold: Relative increase (0.10 = 10%) counted as a regression.
+
+    Returns:
+        ``(rows, regressions)``: one row per metric of every case present in
+        both runs, with ``baseline``, ``current`` and ``change`` (relative),
+        and the subset of rows that got worse by more than *threshold*.
+    """
+    previous = {entry["name"]: entry for entry in baseline["results"]}
+    rows = []
+    for entry in current["results"]:
+        before = previous.get(entry["name"])
+        if before is None:
+            continue
+        for path, label in COMPARED:
+            old, new = _lookup(before, path), _lookup(entry, path)
+            if old is None or new is None or old <= 0:
+                continue
+            rows.append({
+                "name": entry["name"],
+                "metric": label,
+                "baseline": old,
+                "current": new,
+                "change": new / old - 1.0,
+            })
+    regressions = [row for row in rows if row["change"] > threshold]
+    return rows, regressions
+
+
+def _format_metric(metric: str, value: float) -> str:
+    if metric == "peak memory":
+        return f"{value / (1024 * 1024):.1f} MiB"
+    return f"{value * 1000:.2f} ms"
+
+
+def format_comparison(rows: list[dict[str, Any]], threshold: float) -> str:
+    """Render comparison rows as a plain-text table."""
+    if not rows:
+        return "No cases in common with the baseline."
+    width = max(len(row["name"]) for row in rows)
+    lines = []
+    for row in rows:
+        flag = "  REGRESSION" if row["change"] > threshold else ""
+        lines.append(
+            f"{row['name']:<{width}}  {row['metric']:<11}  "
+            f"{_format_metric(row['metric'], row['baseline']):>12} -> "
+            f"{_format_metric(row['metric'], row['current']):>12}  "
+            f"{row['change'] * 100:+7.1f}%{flag}"
+        )
+    return "\n".join(lines)
+
+
+def format_results(results: list[dict[str, Any]]) -> str:
+    """Render results as a plain-text summary, one line per case."""
+    width = max((len(entry["name"]) for entry in results), default=0)
+    lines = []
+    for entry in results:
+        latency = entry["latency_seconds"]
+        memory = entry["peak_memory_bytes"]
+        lines.append(
+            f"{entry['name']:<{width}}  "
+            f"p50 {latency['p50'] * 1000:10.2f} ms  p90 {latency['p90'] * 1000:10.2f} ms  "
+            f"{entry['throughput']['value']:10.1f} {entry['throughput']['unit']:<10}"
+            + (f"  {memory / (1024 * 1024):8.1f} MiB {entry['memory_kind']}" if memory else "")
+        )
+    return "\n".join(lines)
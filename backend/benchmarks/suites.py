@@ -0,0 +1,279 @@
+"""Benchmark cases: audio functions, chat search and the app end to end.
+
+Import this module only after the environment is set up (see
+:func:`benchmarks.__main__.run`): the app modules read their
+configuration, including ``VOICE_TAG_PATH`` and the artifact directories,
+at import time.
+"""
+
+import os
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from typing import Any, Callable
+
+from app.services.catalogue import CatalogueSnapshot
+from app.services.metrics import peak_rss_bytes, reset_peak_rss, run_job
+from app.services.pipeline import process_upload_audio
+from app.services.search import KeywordIndex, score_track, tokenize
+from app.services.semantic import SemanticIndex
+from app.services.store import remove_path
+from app.services.watermark import create_clip_preview, create_full_preview
+from app.services.waveform import generate_waveform
+from benchmarks import synth
+from benchmarks.harness import result
+
+# Track scores computed per reference-scan case; bounds its run time on
+# large catalogues.
+SCAN_BUDGET = 2_000_000
+
+_MIME_TYPES = {"mp3": "audio/mpeg", "wav": "audio/wav", "flac": "audio/flac"}
+
+
+def _log(message: str) -> None:
+    print(message, file=sys.stderr, flush=True)
+
+
+def _clip_start(duration: int) -> int:
+    # Somewhere past the intro, as creators usually pick
+    return max(0, min(60, duration - 30))
+
+
+# ---------------------------------------------------------------------------
+# Audio functions
+# ---------------------------------------------------------------------------
+
+# name -> builds (fn, args, kwargs) from the input path, tag path and spec.
+AUDIO_FUNCTIONS: dict[str, Callable[[str, str, synth.AudioSpec], tuple]] = {
+    "create_full_preview": lambda path, tag, spec: (create_full_preview, (path, tag), {}),
+    "create_clip_preview": lambda path, tag, spec: (
+        create_clip_preview, (path, tag, _clip_start(spec.duration)), {},
+    ),
+    "generate_waveform": lambda path, tag, spec: (generate_waveform, (path,), {}),
+    "process_upload_audio": lambda path, tag, spec: (
+        process_upload_audio, (path, tag), {"preview_clip_start": _clip_start(spec.duration)},
+    ),
+}
+
+
+def _discard_outputs(output: Any) -> None:
+    """Delete the files a benchmarked call produced."""
+    if isinstance(output, str):
+        remove_path(output)
+    elif isinstance(output, dict):
+        for name, value in output.items():
+            if name.endswith("_path") and isinstance(value, str):
+                remove_path(value)
+
+
+def audio_cases(
+    audio_dir: str,
+    tag_path: str,
+    specs: list[synth.AudioSpec],
+    functions: list[str],
+    repeat: int,
+) -> list[dict[str, Any]]:
+    """Time each of *functions* on each input, in a fresh one-worker pool per case.
+
+    One untimed call warms the worker (imports, voice tag cache) first.
+    Latency is the job's wall time inside the worker; peak memory is the
+    worker's peak RSS over the timed calls.
+    """
+    results = []
+    for spec in specs:
+        _log(f"synthesizing {spec.label}")
+        path = synth.audio_file(audio_dir, spec)
+        params = {**spec._asdict(), "bytes": os.path.getsize(path)}
+        for name in functions:
+            fn, args, kwargs = AUDIO_FUNCTIONS[name](path, tag_path, spec)
+            with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+                output, _report = pool.submit(run_job, fn, args, kwargs).result()
+                _discard_outputs(output)
+                samples, peaks = [], []
+                stages: dict[str, float] = {}
+                for _ in range(repeat):
+                    output, report = pool.submit(run_job, fn, args, kwargs).result()
+                    _discard_outputs(output)
+                    samples.append(report.seconds)
+                    peaks.append(report.peak_rss)
+                    for stage, seconds, _nbytes, _audio_seconds in report.stages:
+                        stages[stage] = stages.get(stage, 0.0) + seconds / repeat
+            # A clip preview only handles its 30-second window
+            work = min(30, spec.duration) if name == "create_clip_preview" else spec.duration
+            entry = result(
+                f"audio/{name}/{spec.label}", "audio", params, samples,
+                work=work, unit="audio_s/s", peak_memory=max(peaks), stages=stages,
+            )
+            _log(f"  {entry['name']}: p50 {entry['latency_seconds']['p50']:.3f}s")
+            results.append(entry)
+    return results
+
+
+# ---------------------------------------------------------------------------
+# Chat search
+# ---------------------------------------------------------------------------
+
+def _scan(query_tokens: list[str], tracks: tuple[dict[str, Any], ...]) -> list:
+    """Rank by scoring every track, as ``/chat/query`` did before the index."""
+    scored = [(score_track(query_tokens, track), track) for track in tracks]
+    scored = [item for item in scored if item[0] > 0]
+    scored.sort(key=lambda item: item[0], reverse=True)
+    return scored[:5]
+
+
+def _build(factory: Callable[[], Any], repeat: int) -> tuple[list[float], int]:
+    """Time *repeat* calls of *factory*; trace the heap peak of one more."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        factory()
+        samples.append(time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        factory()
+        _current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return samples, peak
+
+
+def _per_query(search: Callable[[list[str]], Any], token_lists: list[list[str]]) -> list[float]:
+    samples = []
+    for tokens in token_lists:
+        start = time.perf_counter()
+        search(tokens)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def chat_cases(sizes: list[int], query_count: int, repeat: int, seed: int) -> list[dict[str, Any]]:
+    """Benchmark index builds and per-query search over synthetic catalogues.
+
+    The reference scan runs on a prefix of the queries sized to
+    ``SCAN_BUDGET`` scores, so 100k-track catalogues stay tractable.
+    """
+    token_lists = [tokenize(query) for query in synth.queries(query_count, seed)]
+    results = []
+    for size in sizes:
+        _log(f"building a {size}-track catalogue")
+        snapshot = CatalogueSnapshot(1, tuple(synth.catalogue(size, seed)), time.time())
+        params = {"tracks": size, "queries": query_count}
+
+        scan_queries = token_lists[:max(1, min(len(token_lists), SCAN_BUDGET // max(size, 1)))]
+        samples = _per_query(lambda tokens: _scan(tokens, snapshot.tracks), scan_queries)
+        results.append(result(
+            f"chat/score_track_scan/{size}", "chat", {**params, "queries": len(scan_queries)},
+            samples, work=1, unit="queries/s",
+        ))
+
+        for name, factory, search in (
+            ("keyword", lambda: KeywordIndex(snapshot),
+             lambda index: lambda tokens: index.search(tokens, limit=5)),
+            ("semantic", lambda: SemanticIndex(snapshot, directory=None),
+             lambda index: lambda tokens: index.search(" ".join(tokens), limit=5)),
+        ):
+            samples, peak = _build(factory, repeat)
+            results.append(result(
+                f"chat/{name}_index_build/{size}", "chat", params, samples,
+                work=size, unit="tracks/s", peak_memory=peak, memory_kind="heap",
+            ))
+            samples = _per_query(search(factory()), token_lists)
+            results.append(result(
+                f"chat/{name}_search/{size}", "chat", params, samples, work=1, unit="queries/s",
+            ))
+        for entry in results[-5:]:
+            _log(f"  {entry['name']}: p50 {entry['latency_seconds']['p50'] * 1000:.3f}ms")
+    return results
+
+
+# ---------------------------------------------------------------------------
+# End to end
+# ---------------------------------------------------------------------------
+
+def _post_file(client: Any, endpoint: str, field: str, path: str) -> float:
+    extension = os.path.splitext(path)[1].lstrip(".")
+    start = time.perf_counter()
+    with open(path, "rb") as f:
+        response = client.post(
+            endpoint, files={field: (os.path.basename(path), f, _MIME_TYPES[extension])},
+        )
+    elapsed = time.perf_counter() - start
+    response.raise_for_status()
+    return elapsed
+
+
+def e2e_cases(
+    audio_dir: str,
+    specs: list[synth.AudioSpec],
+    catalogue_size: int,
+    query_count: int,
+    repeat: int,
+    seed: int,
+) -> list[dict[str, Any]]:
+    """Time requests through the FastAPI app, lifespan and audio pool included.
+
+    Uploads use a distinct input per request so the artifact cache misses;
+    ``upload_cached`` repeats an input to measure the cached path. Chat
+    queries are run twice over the same query stream: ``chat_query`` is the
+    first pass (mostly cache misses), ``chat_query_cached`` the second.
+    Peak memory is the RSS of this process, which runs the app; pool
+    workers are measured by the ``audio`` cases.
+    """
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+    from app.services.catalogue import track_catalogue
+
+    results = []
+    with TestClient(app) as client:
+        for spec in specs:
+            _log(f"synthesizing {repeat + 1} inputs like {spec.label}")
+            paths = [synth.audio_file(audio_dir, spec._replace(seed=seed + i + 1)) for i in range(repeat + 1)]
+            params = spec._asdict()
+            for name, endpoint, field in (
+                ("waveform", "/process/waveform", "audio_file"),
+                ("upload", "/process/upload", "listening_file"),
+            ):
+                _post_file(client, endpoint, field, paths[0])
+                reset_peak_rss()
+                samples = [_post_file(client, endpoint, field, path) for path in paths[1:]]
+                results.append(result(
+                    f"e2e/{name}/{spec.label}", "e2e", params, samples,
+                    work=spec.duration, unit="audio_s/s", peak_memory=peak_rss_bytes(),
+                ))
+            reset_peak_rss()
+            samples = [
+                _post_file(client, "/process/upload", "listening_file", paths[1]) for _ in range(repeat)
+            ]
+            results.append(result(
+                f"e2e/upload_cached/{spec.label}", "e2e", params, samples,
+                work=spec.duration, unit="audio_s/s", peak_memory=peak_rss_bytes(),
+            ))
+
+        if catalogue_size:
+            _log(f"loading a {catalogue_size}-track catalogue into the app")
+            # There is no database here: load the rows the way a full
+            # reload would, which also rebuilds the subscribed indexes.
+            track_catalogue._apply(synth.catalogue(catalogue_size, seed), replace=True)
+            query_stream = synth.queries(query_count, seed)
+            params = {"tracks": catalogue_size, "queries": query_count}
+            for mode in ("keyword", "semantic"):
+                client.post("/chat/query", json={"query": "warm up", "mode": mode}).raise_for_status()
+                for name in ("chat_query", "chat_query_cached"):
+                    reset_peak_rss()
+                    samples = []
+                    for query in query_stream:
+                        start = time.perf_counter()
+                        response = client.post("/chat/query", json={"query": query, "mode": mode})
+                        samples.append(time.perf_counter() - start)
+                        response.raise_for_status()
+                    results.append(result(
+                        f"e2e/{name}/{mode}/{catalogue_size}", "e2e", params, samples,
+                        work=1, unit="queries/s", peak_memory=peak_rss_bytes(),
+                    ))
+
+    for entry in results:
+        _log(f"  {entry['name']}: p50 {entry['latency_seconds']['p50'] * 1000:.1f}ms")
+    return results
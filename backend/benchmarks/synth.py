@@ -0,0 +1,182 @@
+"""Deterministic synthetic inputs: audio files, a voice tag and catalogues.
+
+Audio is a chord pad with a 120 bpm kick and a little noise, generated in
+blocks so a 60-minute stereo file never has to fit in memory, written as
+WAV and transcoded to MP3 or FLAC with the ffmpeg used by pydub. The same
+arguments always produce the same samples, and finished files are reused.
+"""
+
+import os
+import subprocess
+import uuid
+import wave
+from datetime import datetime, timedelta, timezone
+from typing import Any, NamedTuple
+
+import numpy as np
+from pydub import AudioSegment
+
+# Frames synthesized per block.
+_BLOCK_FRAMES = 10 * 48000
+
+# Encoder arguments per output format (WAV is written directly).
+_ENCODERS = {
+    "mp3": ["-c:a", "libmp3lame", "-b:a", "192k"],
+    "flac": ["-c:a", "flac"],
+}
+AUDIO_FORMATS = ("mp3", "wav", "flac")
+
+
+class AudioSpec(NamedTuple):
+    """Shape of a synthetic audio file."""
+
+    format: str
+    channels: int
+    sample_rate: int
+    duration: int
+    seed: int = 0
+
+    @property
+    def label(self) -> str:
+        """A short name used in case names, e.g. ``mp3-2ch-44100-30s``."""
+        return f"{self.format}-{self.channels}ch-{self.sample_rate}-{self.duration}s"
+
+
+def _signal(start: int, frames: int, spec: AudioSpec, rng: np.random.Generator) -> np.ndarray:
+    t = np.arange(start, start + frames, dtype=np.float64) / spec.sample_rate
+    pad = sum(np.sin(2 * np.pi * f * t) for f in (220.0, 277.18, 329.63)) * 0.12
+    beat = (t * 2.0) % 1.0
+    kick = np.exp(-beat * 30.0) * np.sin(2 * np.pi * 55.0 * t) * 0.4
+    left = pad + kick + rng.normal(0.0, 0.02, frames)
+    if spec.channels == 1:
+        return left[:, None]
+    # Detune the right channel so the two sides differ
+    right = np.sin(2 * np.pi * 221.0 * t) * 0.12 + kick + rng.normal(0.0, 0.02, frames)
+    return np.column_stack((left, right))
+
+
+def write_wav(path: str, spec: AudioSpec) -> None:
+    """Write the 16-bit PCM WAV described by *spec* to *path*."""
+    rng = np.random.default_rng(spec.seed)
+    total = spec.duration * spec.sample_rate
+    with wave.open(path, "wb") as out:
+        out.setnchannels(spec.channels)
+        out.setsampwidth(2)
+        out.setframerate(spec.sample_rate)
+        for start in range(0, total, _BLOCK_FRAMES):
+            block = _signal(start, min(_BLOCK_FRAMES, total - start), spec, rng)
+            out.writeframes((np.clip(block, -1.0, 1.0) * 32767).astype("<i2").tobytes())
+
+
+def audio_file(directory: str, spec: AudioSpec) -> str:
+    """Return the path of the file for *spec* under *directory*, creating it if needed."""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{spec.label}-s{spec.seed}.{spec.format}")
+    if os.path.isfile(path):
+        return path
+    partial = f"{path}.partial.wav"
+    write_wav(partial, spec)
+    if spec.format == "wav":
+        os.replace(partial, path)
+        return path
+    encoded = f"{path}.partial.{spec.format}"
+    try:
+        subprocess.run(
+            [AudioSegment.converter, "-v", "error", "-y", "-i", partial,
+             *_ENCODERS[spec.format], encoded],
+            check=True,
+        )
+        os.replace(encoded, path)
+    finally:
+        for leftover in (partial, encoded):
+            if os.path.exists(leftover):
+                os.unlink(leftover)
+    return path
+
+
+def voice_tag(directory: str) -> str:
+    """Return the path of a 2-second synthetic voice tag (a rising sweep)."""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, "voice-tag.wav")
+    if os.path.isfile(path):
+        return path
+    sample_rate = 44100
+    t = np.arange(2 * sample_rate) / sample_rate
+    sweep = np.sin(2 * np.pi * (300.0 * t + 400.0 * t ** 2)) * np.minimum(1.0, 4 * (2.0 - t)) * 0.5
+    partial = f"{path}.partial"
+    with wave.open(partial, "wb") as out:
+        out.setnchannels(2)
+        out.setsampwidth(2)
+        out.setframerate(sample_rate)
+        out.writeframes((np.repeat(sweep[:, None], 2, axis=1) * 32767).astype("<i2").tobytes())
+    os.replace(partial, path)
+    return path
+
+
+# ---------------------------------------------------------------------------
+# Catalogues
+# ---------------------------------------------------------------------------
+
+# Metadata vocabularies, matching the options offered by the upload form.
+GENRES = ("Pop", "R&B", "Hip-Hop", "EDM", "Afrobeats", "Latin", "Rock", "Country", "Other")
+MOODS = ("Happy", "Sad", "Energetic", "Chill", "Romantic", "Dark", "Uplifting", "Aggressive")
+VOCALIST_TYPES = ("male", "female")
+KEYS = tuple(
+    f"{note} {scale}"
+    for note in ("C", "C#", "D", "D#", "E", "F", "F#", "G", "G#", "A", "A#", "B")
+    for scale in ("Major", "Minor")
+)
+TITLE_WORDS = (
+    "midnight", "summer", "neon", "heart", "city", "lights", "golden", "river",
+    "fire", "dream", "echo", "velvet", "storm", "paradise", "shadow", "sunset",
+    "crystal", "wild", "ocean", "electric", "silver", "moon", "highway", "gravity",
+    "love", "rain", "island", "signal", "bloom", "horizon", "static", "lullaby",
+)
+# Words that match no track, so some queries exercise the miss path.
+_UNKNOWN_WORDS = ("xylophone", "bagpipes", "polka", "zydeco", "kazoo")
+_FILLERS = ("something", "for my video", "i need a", "looking for", "with", "really")
+
+
+def catalogue(size: int, seed: int = 0) -> list[dict[str, Any]]:
+    """Return *size* approved track rows shaped like the ``tracks`` table."""
+    rng = np.random.default_rng(seed)
+    created = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    rows = []
+    for i in range(size):
+        words = rng.choice(TITLE_WORDS, size=int(rng.integers(1, 4)), replace=False)
+        stamp = (created + timedelta(minutes=i)).isoformat()
+        rows.append({
+            "id": str(uuid.UUID(bytes=rng.bytes(16), version=4)),
+            "title": " ".join(word.capitalize() for word in words),
+            "genre": GENRES[int(rng.integers(len(GENRES)))],
+            "mood": MOODS[int(rng.integers(len(MOODS)))],
+            "bpm": int(rng.integers(70, 170)),
+            "key": KEYS[int(rng.integers(len(KEYS)))],
+            "vocalist_type": VOCALIST_TYPES[int(rng.integers(len(VOCALIST_TYPES)))],
+            "is_ai_generated": bool(rng.random() < 0.3),
+            "status": "approved",
+            "created_at": stamp,
+            "updated_at": stamp,
+            "approved_at": stamp,
+        })
+    return rows
+
+
+def queries(count: int, seed: int = 0) -> list[str]:
+    """Return *count* chat queries mixing metadata words, fillers and misses."""
+    rng = np.random.default_rng(seed)
+    pools = (
+        [g.lower() for g in GENRES], [m.lower() for m in MOODS],
+        TITLE_WORDS, VOCALIST_TYPES, ("ai", "human"), _UNKNOWN_WORDS,
+    )
+    # Genre and mood words are the most common, unknown words the rarest
+    weights = np.array([4, 4, 2, 1, 1, 0.5])
+    weights = weights / weights.sum()
+    result = []
+    for _ in range(count):
+        words = [_FILLERS[int(rng.integers(len(_FILLERS)))]]
+        for _ in range(int(rng.integers(1, 4))):
+            pool = pools[int(rng.choice(len(pools), p=weights))]
+            words.append(pool[int(rng.integers(len(pool)))])
+        result.append(" ".join(words))
+    return result
@@ -0,0 +1,56 @@
+"""``KeywordIndex.search`` ranks exactly like scoring every track with ``score_track``."""
+
+import random
+
+import pytest
+
+from app.services.catalogue import CatalogueSnapshot
+from app.services.search import KeywordIndex, score_track, tokenize
+
+WORDS = [
+    "piano", "pianos", "lofi", "lo-fi", "chill", "chillhop", "night", "drive",
+    "sad", "happy", "dark", "trap", "soul", "rnb", "ai", "human", "love",
+    "summer", "rain", "x", "ab", "abc", "abcd",
+]
+GENRES = ["Lo-Fi", "Hip Hop", "Trap", "R&B", "Soul", "House", "Pop", ""]
+MOODS = ["Chill", "Sad", "Happy", "Dark", "Energetic", "Romantic", None]
+VOCALISTS = ["female", "male", "duet", None]
+
+
+def _catalogue(rng: random.Random, size: int) -> CatalogueSnapshot:
+    tracks = tuple(
+        {
+            "id": str(i),
+            "title": " ".join(rng.choices(WORDS, k=rng.randint(1, 4))).title(),
+            "genre": rng.choice(GENRES),
+            "mood": rng.choice(MOODS),
+            "vocalist_type": rng.choice(VOCALISTS),
+            "is_ai_generated": rng.random() < 0.3,
+        }
+        for i in range(size)
+    )
+    return CatalogueSnapshot(1, tracks, 0.0)
+
+
+def _reference(snapshot: CatalogueSnapshot, tokens: list[str], limit: int) -> list[tuple[str, float]]:
+    scored = [(score_track(tokens, track), position) for position, track in enumerate(snapshot.tracks)]
+    ranked = sorted((item for item in scored if item[0] > 0), key=lambda item: (-item[0], item[1]))
+    return [(snapshot.tracks[position]["id"], score) for score, position in ranked[:limit]]
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_search_matches_score_track(seed):
+    rng = random.Random(seed)
+    snapshot = _catalogue(rng, 400)
+    index = KeywordIndex(snapshot)
+    vocabulary = [*WORDS, "hop", "oul", "energ", "female", "nothing", "lo", "o", "the"]
+
+    for _ in range(300):
+        tokens = tokenize(" ".join(rng.choices(vocabulary, k=rng.randint(1, 4))))
+        limit = rng.choice([1, 5, 50])
+        found = [(track["id"], score) for track, score in index.search(tokens, limit)]
+        assert found == _reference(snapshot, tokens, limit), tokens
+
+
+def test_empty_query_returns_nothing():
+    assert KeywordIndex(_catalogue(random.Random(0), 10)).search([]) == []
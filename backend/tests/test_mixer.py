@@ -0,0 +1,55 @@
+"""The NumPy mixer produces the same bytes as pydub's ``overlay``."""
+
+import numpy as np
+import pytest
+from pydub import AudioSegment
+
+from app.services.audio import to_sample_array
+from app.services.mixer import Placement, mix_into, overlay_tag
+
+
+def _segment(rng: np.random.Generator, ms: int, frame_rate: int, channels: int) -> AudioSegment:
+    frames = ms * frame_rate // 1000
+    # Full-scale noise, so overlapping sums saturate
+    samples = rng.integers(-32768, 32768, size=(frames, channels), dtype=np.int16)
+    return AudioSegment(
+        samples.tobytes(), sample_width=2, frame_rate=frame_rate, channels=channels
+    )
+
+
+def _pydub_overlay(audio: AudioSegment, tag: AudioSegment, positions_ms: list[int]) -> AudioSegment:
+    for position in positions_ms:
+        if position < len(audio):
+            audio = audio.overlay(tag, position=position)
+    return audio
+
+
+# Placements at the start, overlapping each other, running past the end and
+# starting past the end.
+POSITIONS_MS = [0, 130, 250, 1700, 1950, 2500]
+
+
+@pytest.mark.parametrize("frame_rate", [8000, 44100])
+@pytest.mark.parametrize("channels", [1, 2])
+def test_overlay_matches_pydub(frame_rate, channels):
+    rng = np.random.default_rng(frame_rate + channels)
+    audio = _segment(rng, 2000, frame_rate, channels)
+    tag = _segment(rng, 300, frame_rate, channels)
+
+    mixed = overlay_tag(audio, tag, [Placement(p) for p in POSITIONS_MS])
+
+    assert mixed.raw_data == _pydub_overlay(audio, tag, POSITIONS_MS).raw_data
+
+
+def test_mixing_block_by_block_matches_mixing_whole():
+    rng = np.random.default_rng(0)
+    audio = _segment(rng, 2000, 8000, 2)
+    tag = to_sample_array(_segment(rng, 300, 8000, 2))
+    placements = [Placement(p) for p in POSITIONS_MS]
+
+    whole = mix_into(to_sample_array(audio), tag, placements, 8000)
+    blocks = to_sample_array(audio)
+    for offset in range(0, len(blocks), 1000):
+        mix_into(blocks[offset:offset + 1000], tag, placements, 8000, offset=offset)
+
+    assert np.array_equal(whole, blocks)
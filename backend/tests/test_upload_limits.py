@@ -0,0 +1,106 @@
+"""Upload size limits are enforced before or while the body is received."""
+
+import asyncio
+
+import pytest
+
+from app.main import app
+from app.routers import process
+from app.services.executor import audio_pool
+from app.services.store import artifact_store
+
+CHUNK = 64 * 1024
+LIMIT = 1024 * 1024
+BOUNDARY = "featune"
+_HEAD = (
+    f"--{BOUNDARY}\r\n"
+    'Content-Disposition: form-data; name="audio_file"; filename="a.mp3"\r\n'
+    "Content-Type: audio/mpeg\r\n\r\n"
+).encode()
+_TAIL = f"\r\n--{BOUNDARY}--\r\n".encode()
+
+
+class _Body:
+    """An ASGI ``receive`` streaming a multipart upload of a *size*-byte file.
+
+    Counts the body bytes handed to the app in ``read``.
+    """
+
+    def __init__(self, size: int) -> None:
+        self.total = len(_HEAD) + size + len(_TAIL)
+        self.read = 0
+
+    def _bytes(self, start: int, end: int) -> bytes:
+        file_end = self.total - len(_TAIL)
+        filler = max(0, min(end, file_end) - max(start, len(_HEAD)))
+        tail = _TAIL[max(0, start - file_end):max(0, end - file_end)]
+        return _HEAD[start:end] + b"x" * filler + tail
+
+    async def __call__(self) -> dict:
+        if self.read >= self.total:
+            # Body exhausted: like a server, wait for the client to go away
+            await asyncio.sleep(3600)
+        end = min(self.read + CHUNK, self.total)
+        body = self._bytes(self.read, end)
+        self.read = end
+        return {"type": "http.request", "body": body, "more_body": end < self.total}
+
+
+def _post(path: str, body: _Body, content_length: int | None) -> int:
+    headers = [(b"content-type", f"multipart/form-data; boundary={BOUNDARY}".encode())]
+    if content_length is not None:
+        headers.append((b"content-length", str(content_length).encode()))
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": b"",
+        "headers": headers,
+        "client": ("127.0.0.1", 50000),
+        "server": ("testserver", 80),
+        "state": {},
+    }
+    messages = []
+
+    async def send(message: dict) -> None:
+        messages.append(message)
+
+    asyncio.run(app(scope, body, send))
+    return next(m["status"] for m in messages if m["type"] == "http.response.start")
+
+
+@pytest.fixture(autouse=True)
+def small_limit(monkeypatch):
+    monkeypatch.setattr(process, "MAX_UPLOAD_BYTES", LIMIT)
+    # The pool and store are not started here: admit every request
+    monkeypatch.setattr(audio_pool, "ensure_capacity", lambda lane=None: None)
+    monkeypatch.setattr(artifact_store, "ensure_capacity", lambda: None)
+
+
+@pytest.mark.parametrize("path", ["/process/upload", "/process/waveform", "/process/jobs"])
+def test_declared_length_over_limit_is_rejected_unread(path):
+    body = _Body(20 * LIMIT)
+    assert _post(path, body, content_length=body.total) == 413
+    assert body.read == 0
+
+
+def test_streamed_body_is_cut_off_at_the_limit():
+    body = _Body(20 * LIMIT)
+    assert _post("/process/waveform", body, content_length=None) == 413
+    assert body.read <= LIMIT + process._FORM_OVERHEAD_BYTES + CHUNK
+
+
+def test_body_within_limit_is_read(monkeypatch):
+    async def saved(upload, suffix=".mp3", max_bytes=LIMIT):
+        # Stop the request here: the body has been received and parsed
+        raise process.HTTPException(status_code=418)
+
+    monkeypatch.setattr(process, "_save_upload_to_temp", saved)
+    body = _Body(LIMIT)
+    assert _post("/process/waveform", body, content_length=body.total) == 418
+    assert body.read == body.total
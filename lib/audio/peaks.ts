@@ -0,0 +1,88 @@
+/**
+ * Decoder for the FastAPI peak pyramid format (`waveform_peaks`).
+ *
+ * A pyramid holds several zoom levels of min/max peaks plus a mean-amplitude
+ * envelope per point, quantised to 8 or 16 bits behind a small header. See
+ * `backend/app/services/peaks.py` for the byte layout. Level 0 carries the
+ * classic 200-point `waveform_data` list, so `peaksToWaveform` can stand in
+ * for it.
+ */
+
+export interface PeakLevel {
+  /** Minimum sample per point, in [-1, 1]. */
+  mins: Float32Array
+  /** Maximum sample per point, in [-1, 1]. */
+  maxs: Float32Array
+  /** Mean absolute amplitude per point, normalised to the level's loudest point. */
+  envelope: Float32Array
+}
+
+export interface PeakPyramid {
+  sampleRate: number
+  frames: number
+  /** Coarsest level first. */
+  levels: PeakLevel[]
+}
+
+const MAGIC = 'FTPK'
+const VERSION = 1
+
+function base64ToBytes(encoded: string): Uint8Array {
+  const binary = atob(encoded)
+  const bytes = new Uint8Array(binary.length)
+  for (let i = 0; i < binary.length; i++) bytes[i] = binary.charCodeAt(i)
+  return bytes
+}
+
+/** Decode a peak pyramid from its binary form or its base64 JSON form. */
+export function decodePeaks(data: ArrayBuffer | Uint8Array | string): PeakPyramid {
+  const bytes =
+    typeof data === 'string'
+      ? base64ToBytes(data)
+      : data instanceof Uint8Array
+        ? data
+        : new Uint8Array(data)
+  const view = new DataView(bytes.buffer, bytes.byteOffset, bytes.byteLength)
+
+  const magic = String.fromCharCode(...bytes.subarray(0, 4))
+  const version = view.getUint8(4)
+  const bits = view.getUint8(5)
+  if (magic !== MAGIC || version !== VERSION || (bits !== 8 && bits !== 16)) {
+    throw new Error('Not a supported peaks payload')
+  }
+  const levelCount = view.getUint16(6, true)
+  const sampleRate = view.getUint32(8, true)
+  const frames = Number(view.getBigUint64(12, true))
+
+  const width = bits / 8
+  const fullScale = 2 ** (bits - 1) - 1
+  const unsignedMax = 2 ** bits - 1
+  const readSigned = (offset: number) =>
+    bits === 8 ? view.getInt8(offset) : view.getInt16(offset, true)
+  const readUnsigned = (offset: number) =>
+    bits === 8 ? view.getUint8(offset) : view.getUint16(offset, true)
+
+  const levels: PeakLevel[] = []
+  let offset = 20
+  for (let level = 0; level < levelCount; level++) {
+    const points = view.getUint32(offset, true)
+    offset += 8 // points + f32 envelope scale
+    const mins = new Float32Array(points)
+    const maxs = new Float32Array(points)
+    const envelope = new Float32Array(points)
+    for (let i = 0; i < points; i++) {
+      mins[i] = readSigned(offset + i * width) / fullScale
+      maxs[i] = readSigned(offset + (points + i) * width) / fullScale
+      envelope[i] = readUnsigned(offset + (2 * points + i) * width) / unsignedMax
+    }
+    levels.push({ mins, maxs, envelope })
+    offset += 3 * points * width
+  }
+
+  return { sampleRate, frames, levels }
+}
+
+/** The coarsest level's envelope as a `waveform_data`-style list. */
+export function peaksToWaveform(pyramid: PeakPyramid): number[] {
+  return Array.from(pyramid.levels[0]?.envelope ?? [], (v) => Math.round(v * 10000) / 10000)
+}
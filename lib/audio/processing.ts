@@ -0,0 +1,85 @@
+/**
+ * Client for the FastAPI background processing jobs.
+ *
+ * Uploads are queued with `POST /process/jobs`, which returns immediately.
+ * We then poll the job until it finishes instead of holding one request open
+ * for the whole decode → watermark → encode → waveform chain (long requests
+ * get dropped by proxy timeouts).
+ */
+
+export interface ProcessingResult {
+  waveform_data?: number[] | null
+  /** Base64 peak pyramid; decode with `decodePeaks` from `./peaks`. */
+  waveform_peaks?: string | null
+  preview_clip_url?: string | null
+  full_preview_url?: string | null
+  [key: string]: unknown
+}
+
+interface JobStatus {
+  job_id: string
+  status: 'queued' | 'running' | 'succeeded' | 'failed'
+  stage: string | null
+  progress: number
+  error: string | null
+}
+
+const STAGE_LABELS: Record<string, string> = {
+  decode: 'Decoding audio',
+  full_preview: 'Watermarking full preview',
+  clip_preview: 'Creating preview clip',
+  waveform: 'Generating waveform',
+}
+
+const POLL_INTERVAL_MS = 1500
+const MAX_WAIT_MS = 15 * 60 * 1000
+
+function sleep(ms: number): Promise<void> {
+  return new Promise((resolve) => setTimeout(resolve, ms))
+}
+
+/**
+ * Queue `formData` for processing and resolve with the job result.
+ * `onProgress` receives a human-readable status line on every poll.
+ */
+export async function processAudioUpload(
+  fastapiUrl: string,
+  formData: FormData,
+  onProgress?: (message: string) => void
+): Promise<ProcessingResult> {
+  const createRes = await fetch(`${fastapiUrl}/process/jobs`, {
+    method: 'POST',
+    body: formData,
+  })
+  if (!createRes.ok) {
+    throw new Error(`Could not queue audio processing (${createRes.status})`)
+  }
+  const { job_id: jobId } = (await createRes.json()) as JobStatus
+
+  const deadline = Date.now() + MAX_WAIT_MS
+  while (Date.now() < deadline) {
+    await sleep(POLL_INTERVAL_MS)
+
+    const statusRes = await fetch(`${fastapiUrl}/process/jobs/${jobId}`)
+    if (!statusRes.ok) {
+      throw new Error(`Could not read processing status (${statusRes.status})`)
+    }
+    const job = (await statusRes.json()) as JobStatus
+
+    if (job.status === 'failed') {
+      throw new Error(job.error ?? 'Audio processing failed')
+    }
+    if (job.status === 'succeeded') {
+      const resultRes = await fetch(`${fastapiUrl}/process/jobs/${jobId}/result`)
+      if (!resultRes.ok) {
+        throw new Error(`Could not fetch processing result (${resultRes.status})`)
+      }
+      return (await resultRes.json()) as ProcessingResult
+    }
+
+    const label = job.stage ? STAGE_LABELS[job.stage] ?? job.stage : 'Waiting in queue'
+    onProgress?.(`Processing audio: ${label}... (${Math.round(job.progress * 100)}%)`)
+  }
+
+  throw new Error('Audio processing timed out')
+}
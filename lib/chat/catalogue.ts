@@ -0,0 +1,33 @@
+/**
+ * Tell the FastAPI chat service that tracks changed.
+ *
+ * `/chat/query` answers from an in-memory copy of the approved catalogue
+ * that refreshes itself every few seconds. Calling this after approving,
+ * rejecting, removing or editing a track makes the change visible to chat
+ * immediately. Failures are logged and otherwise ignored: the background
+ * refresh picks the change up anyway.
+ *
+ * The endpoint requires the Supabase service-role key, so this must only
+ * run server-side. With several FastAPI workers only the one receiving the
+ * call refreshes at once; the others catch up on their next refresh.
+ */
+
+const FASTAPI_URL = process.env.NEXT_PUBLIC_FASTAPI_URL || 'http://localhost:8000'
+
+export async function invalidateChatCatalogue(trackIds: string[]): Promise<void> {
+  try {
+    const res = await fetch(`${FASTAPI_URL}/chat/catalogue/invalidate`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+        Authorization: `Bearer ${process.env.SUPABASE_SERVICE_ROLE_KEY}`,
+      },
+      body: JSON.stringify({ track_ids: trackIds }),
+    })
+    if (!res.ok) {
+      console.error('Chat catalogue invalidation failed:', res.status)
+    }
+  } catch (err) {
+    console.error('Chat catalogue invalidation error:', err)
+  }
+}